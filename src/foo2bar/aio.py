@@ -0,0 +1,160 @@
+"""
+This module provides async counterparts of the analysis and substitution of scripts, for asyncio applications.
+
+Parsing a script with libcst is CPU-bound, and would block the event loop for the whole parse if run in a coroutine.
+`AsyncWorkerPool` runs it in a pool of worker processes instead, with a bounded number of jobs submitted at once:
+
+```python
+async with AsyncWorkerPool(max_workers=4) as pool:
+    code, remaining = await pool.substitute_file_global("script.py", {"x": "100"})
+    analysis = await pool.analyze_file("script.py")
+    variants = await pool.render_many(analysis.compile_template(), [{"x": "1"}, {"x": "2"}])
+```
+
+Results are sent back from worker processes, hence they are plain data: code, mappings, or a `ScriptAnalysis` holding
+the assignments of a script as records, rather than a `CodeWrapper` and its libcst module.
+
+Cancelling a coroutine waiting for its turn leaves the pool untouched, and cancelling a job that is queued in the pool
+removes it from the queue. A job that already started in a worker process runs to completion, its result being discarded.
+"""
+
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Self, TypeVar
+
+from .cache import AnalysisCache, ScriptAnalysis, analyze_file
+from .scanner import substitute_global
+from .template import SubstitutionTemplate
+
+T = TypeVar("T")
+
+GLOBAL_SCOPE = ""
+
+
+def _analyze_file(file_path: str | Path, cache_dir: str | Path | None) -> ScriptAnalysis:
+    cache = None if cache_dir is None else AnalysisCache(cache_dir)
+    return analyze_file(file_path, cache=cache)
+
+
+def _substitute(code: str, mapping: dict[str, str], scope_name: str | None) -> tuple[str, dict[str, str]]:
+    if scope_name == GLOBAL_SCOPE:
+        return substitute_global(code, mapping)
+
+    from .wrapper import CodeWrapper
+
+    wrapper = CodeWrapper(code)
+    remaining = wrapper.substitute_assign_values(mapping, scope_name)
+    return wrapper.code, remaining
+
+
+def _substitute_file(script: str | Path, mapping: dict[str, str], scope_name: str | None) -> tuple[str, dict[str, str]]:
+    return _substitute(Path(script).read_text(), mapping, scope_name)
+
+
+def _render_chunk(template: SubstitutionTemplate, mappings: list[dict[str, str]]) -> list[str]:
+    return list(template.render_many(mappings))
+
+
+class AsyncWorkerPool:
+    """Analyze and substitute scripts in worker processes, without blocking the event loop.
+
+    The pool is started on first use, and shut down by `close`, or on exit when used as an async context manager.
+
+    Args:
+        max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        max_concurrency (int, optional): Number of jobs submitted to the workers at once, other coroutines waiting
+            for their turn. Defaults to the number of workers.
+        executor (Executor, optional): Executor to run jobs in instead of a pool of worker processes, which is not
+            shut down by `close`. Jobs are sent to it pickled if it is a `ProcessPoolExecutor`.
+    """
+
+    def __init__(self, max_workers: int = None, max_concurrency: int = None, executor: Executor = None) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.max_workers
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut the worker processes down, cancelling queued jobs, unless the executor was given."""
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.max_workers)
+        return self._executor
+
+    async def run(self, function: Callable[..., T], *args) -> T:
+        """Run `function(*args)` in the pool once a slot is free. The function and its arguments must be picklable."""
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), function, *args)
+
+    async def analyze_file(self, file_path: str | Path, cache: AnalysisCache = None) -> ScriptAnalysis:
+        """Analyze a script, like `CodeWrapper.from_file` followed by `analyze_records`.
+
+        Args:
+            file_path (str | Path): The script to analyze.
+            cache (AnalysisCache, optional): Cache of analyses on disk, read and written by the worker. Defaults to None.
+
+        Returns:
+            ScriptAnalysis: The source of the script and its substitutable assignments.
+        """
+        return await self.run(_analyze_file, file_path, None if cache is None else cache.directory)
+
+    async def substitute_assign_values(
+        self, code: str, mapping: dict[str, str], scope_name: str = None
+    ) -> tuple[str, dict[str, str]]:
+        """Substitute values in `code`, like `CodeWrapper.substitute_assign_values`.
+
+        Args:
+            code (str): The code to substitute values in.
+            mapping (dict[str, str]): Variable names mapped to the source of their new values.
+            scope_name (str, optional): Scope in which to substitute. Defaults to every scope.
+
+        Returns:
+            tuple[str, dict[str, str]]: The substituted code and the items of `mapping` that were not substituted.
+        """
+        return await self.run(_substitute, code, mapping, scope_name)
+
+    async def substitute_assign_values_global(self, code: str, mapping: dict[str, str]) -> tuple[str, dict[str, str]]:
+        """Like `substitute_assign_values`, in the global scope."""
+        return await self.substitute_assign_values(code, mapping, GLOBAL_SCOPE)
+
+    async def substitute_file_global(self, script: str | Path, mapping: dict[str, str]) -> tuple[str, dict[str, str]]:
+        """Like `substitute_assign_values_global`, reading the code from `script` in the worker."""
+        return await self.run(_substitute_file, script, mapping, GLOBAL_SCOPE)
+
+    async def render_many(
+        self, template: SubstitutionTemplate, mappings: Iterable[dict[str, str]], chunksize: int = None
+    ) -> list[str]:
+        """Render one variant of `template` per mapping, like `CodeWrapper.render_many`.
+
+        Mappings are sent to the workers in chunks. If rendering a chunk fails, or if the coroutine is cancelled,
+        the chunks that are not rendered yet are cancelled.
+
+        Args:
+            template (SubstitutionTemplate): Template of the script to render.
+            mappings (Iterable[dict[str, str]]): Variable names mapped to the source of their new values, one per variant.
+            chunksize (int, optional): Number of variants rendered per job. Defaults to a quarter of the variants per worker.
+
+        Returns:
+            list[str]: The code of every variant, in the order of `mappings`.
+        """
+        mappings = list(mappings)
+        chunksize = chunksize or max(1, len(mappings) // (4 * self.max_workers))
+        async with asyncio.TaskGroup() as group:
+            tasks = [
+                group.create_task(self.run(_render_chunk, template, mappings[start:start + chunksize]))
+                for start in range(0, len(mappings), chunksize)
+            ]
+        return [code for task in tasks for code in task.result()]
@@ -0,0 +1,229 @@
+"""
+This module substitutes values in many scripts at once, spreading the work over a pool of worker processes.
+
+A parameter grid maps variable names to the list of values to sweep, and is expanded into its cartesian product:
+one script is written per combination, along with a manifest mapping every written file to its parameters.
+
+A collection of scripts, given as a directory or a glob pattern, can also be substituted with the same mapping.
+"""
+
+import glob
+import io
+import itertools
+import json
+import os
+import tokenize
+from pathlib import Path
+from typing import Iterable
+
+from .edits import OUTPUT_SUFFIXES, format_edits
+from .records import is_qualified_name
+from .template import SubstitutionTemplate
+
+MANIFEST_NAME = "manifest.json"
+
+
+class GridError(ValueError):
+    pass
+
+
+def split_values(text: str) -> list[str]:
+    """Split a comma-separated list of expressions, ignoring the commas nested in brackets or strings.
+
+    Example:
+        `split_values("1, (2, 3), 'a,b'")` returns `["1", "(2, 3)", "'a,b'"]`
+    """
+    values = []
+    depth = 0
+    start = 0
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(text).readline):
+            if token.type != tokenize.OP:
+                continue
+            if token.string in "([{":
+                depth += 1
+            elif token.string in ")]}":
+                depth -= 1
+            elif token.string == "," and depth == 0:
+                values.append(text[start:token.start[1]].strip())
+                start = token.end[1]
+    except (tokenize.TokenError, SyntaxError) as e:
+        raise GridError(f"Cannot split values {text!r}: {e}") from e
+    values.append(text[start:].strip())
+    if not all(values):
+        raise GridError(f"Empty value in {text!r}")
+    return values
+
+
+def parse_grid_option(option: str) -> tuple[str, list[str]]:
+    """Parse a `NAME=VALUE1,VALUE2,...` grid option into the variable name and its values."""
+    name, separator, values = option.partition("=")
+    name = name.strip()
+    if not separator or not is_qualified_name(name):
+        raise GridError(f"Grid options must look like 'NAME=VALUE1,VALUE2,...', not {option!r}")
+    return name, split_values(values)
+
+
+def expand_grid(grid: dict[str, list[str]]) -> list[dict[str, str]]:
+    """Expand a parameter grid into the list of all combinations of its values."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def variant_file_names(script: Path, count: int, suffix: str = "") -> list[str]:
+    """Name the variants of a script after it, numbered with a constant width so they sort naturally."""
+    width = len(str(max(count - 1, 0)))
+    return [f"{script.stem}_{index:0{width}d}{script.suffix}{suffix}" for index in range(count)]
+
+
+_worker_template: SubstitutionTemplate = None
+_worker_output_format: str = "full"
+_worker_script: Path = None
+
+
+def _init_worker(template: SubstitutionTemplate, output_format: str = "full", script: Path = None) -> None:
+    global _worker_template, _worker_output_format, _worker_script
+    _worker_template = template
+    _worker_output_format = output_format
+    _worker_script = script
+
+
+def _write_variant(output: Path, mapping: dict[str, str]) -> None:
+    if _worker_output_format == "full":
+        code, _ = _worker_template.render(mapping)
+    else:
+        edits, _ = _worker_template.render_edits(mapping)
+        code = format_edits(_worker_template.source, edits, _worker_output_format, _worker_script)
+    output.write_text(code)
+
+
+def sweep(
+    template: SubstitutionTemplate,
+    mappings: Iterable[dict[str, str]],
+    output_dir: str | Path,
+    script: str | Path,
+    max_workers: int = None,
+    output_format: str = "full",
+) -> dict[str, dict[str, str]]:
+    """Render one variant of `template` per mapping into `output_dir`, using a pool of worker processes.
+
+    Variants are named after `script` and numbered in the order of `mappings`, with a suffix for other formats
+    than `full`, e.g. `job_0.py.diff`. A manifest mapping every file name to its parameters is written alongside them.
+
+    Args:
+        template (SubstitutionTemplate): Template of the script to render.
+        mappings (Iterable[dict[str, str]]): Variable names mapped to the source of their new values, one per variant.
+        output_dir (str | Path): Directory to write the variants and the manifest to. Created if needed.
+        script (str | Path): Path of the original script, used to name the variants.
+        max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs. With 1, variants are rendered in this process.
+        output_format (str, optional): How to write every variant, one of `foo2bar.edits.OUTPUT_FORMATS`: the full code,
+            or the edits made to the script only. Defaults to "full".
+
+    Returns:
+        dict[str, dict[str, str]]: The manifest, mapping every variant file name to its parameters.
+    """
+    if output_format not in OUTPUT_SUFFIXES:
+        raise ValueError(f"output_format must be one of {tuple(OUTPUT_SUFFIXES)!r}, not {output_format!r}")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    mappings = list(mappings)
+    manifest = dict(zip(variant_file_names(Path(script), len(mappings), OUTPUT_SUFFIXES[output_format]), mappings))
+    outputs = [output_dir / file_name for file_name in manifest]
+    initargs = (template, output_format, Path(script))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        _init_worker(*initargs)
+        for output, mapping in zip(outputs, mappings):
+            _write_variant(output, mapping)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=initargs) as executor:
+            chunksize = max(1, len(mappings) // (4 * max_workers))
+            # consume the results to surface worker exceptions
+            for _ in executor.map(_write_variant, outputs, mappings, chunksize=chunksize):
+                pass
+
+    (output_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=4))
+    return manifest
+
+
+def is_glob_pattern(pattern: str | Path) -> bool:
+    return any(char in str(pattern) for char in "*?[")
+
+
+def is_script_collection(path: str | Path) -> bool:
+    """Whether `path` designates several scripts, i.e. is a directory or a glob pattern."""
+    return is_glob_pattern(path) or Path(path).is_dir()
+
+
+def collect_scripts(path: str | Path) -> tuple[Path, list[Path]]:
+    """List the scripts designated by a directory or a glob pattern.
+
+    Directories are searched recursively for `*.py` files, and glob patterns support `**`.
+
+    Returns:
+        tuple[Path, list[Path]]: The base directory of the scripts, i.e. the directory or the non-magic prefix of the pattern, and the sorted scripts.
+    """
+    if not is_glob_pattern(path):
+        base_dir = Path(path)
+        return base_dir, sorted(base_dir.rglob("*.py"))
+
+    parts = Path(path).parts
+    base_parts = list(itertools.takewhile(lambda part: not is_glob_pattern(part), parts[:-1]))
+    base_dir = Path(*base_parts) if base_parts else Path(".")
+    scripts = sorted(Path(match) for match in glob.glob(str(path), recursive=True))
+    return base_dir, [script for script in scripts if script.is_file()]
+
+
+def substitute_file(script: Path, output: Path, mapping: dict[str, str]) -> dict[str, str]:
+    """Substitute values in the global scope of `script` and write the result to `output`.
+
+    Returns:
+        dict[str, str]: The items of `mapping` that were not substituted.
+    """
+    from .scanner import substitute_global
+
+    code, remaining = substitute_global(Path(script).read_text(), mapping)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(code)
+    return remaining
+
+
+def substitute_files(
+    scripts: Iterable[Path],
+    mapping: dict[str, str],
+    output_dir: str | Path,
+    base_dir: str | Path = ".",
+    max_workers: int = None,
+) -> dict[Path, dict[str, str]]:
+    """Substitute the same values in the global scope of many scripts, using a pool of worker processes.
+
+    Every script is written to `output_dir`, at its path relative to `base_dir`.
+
+    Args:
+        scripts (Iterable[Path]): Scripts to substitute values in.
+        mapping (dict[str, str]): Variable names mapped to the source of their new values.
+        output_dir (str | Path): Directory to write the substituted scripts to.
+        base_dir (str | Path, optional): Directory the scripts are relative to. Defaults to the current directory.
+        max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs. With 1, scripts are substituted in this process.
+
+    Returns:
+        dict[Path, dict[str, str]]: Every script mapped to the items of `mapping` that were not substituted in it.
+    """
+    scripts = list(scripts)
+    outputs = [Path(output_dir) / script.relative_to(base_dir) for script in scripts]
+    mappings = [mapping] * len(scripts)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        remainings = list(map(substitute_file, scripts, outputs, mappings))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers) as executor:
+            chunksize = max(1, len(scripts) // (4 * max_workers))
+            remainings = list(executor.map(substitute_file, scripts, outputs, mappings, chunksize=chunksize))
+
+    return dict(zip(scripts, remainings))
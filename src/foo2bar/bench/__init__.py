@@ -0,0 +1,61 @@
+"""
+This package holds benchmarks of foo2bar on synthetic scripts, to compare implementations of the same step.
+"""
+
+import time
+from typing import Callable
+
+
+def synthetic_script(lines: int) -> str:
+    """Generate a script of about `lines` lines, mixing substitutable assignments with classes, functions and statements
+    that are not substituted, like the configuration section of a real script followed by code using it.
+
+    Args:
+        lines (int): Approximate number of lines of the script.
+
+    Returns:
+        str: The source of the script.
+    """
+    chunks = []
+    count = 0
+    block = 0
+    while count < lines:
+        chunks.append(
+            f"# block {block}\n"
+            f"learning_rate_{block} = 0.001  # learning rate\n"
+            f"epochs_{block}: int = 10\n"
+            f"layers_{block} = [64, 128, (256, 512)]\n"
+            f"name_{block} = 'run-{block}'  # no param\n"
+            f"options_{block}: dict[str, int] = {{'a': 1, 'b': 2}}\n"
+            f"\n"
+            f"class Model{block}:\n"
+            f"    depth = {block}\n"
+            f"    activation: str = 'relu'  # activation function\n"
+            f"\n"
+            f"    def forward(self, x):\n"
+            f"        scale = 2\n"
+            f"        return [scale * value for value in x if value > epochs_{block}]\n"
+            f"\n"
+            f"def train_{block}(model=None):\n"
+            f"    for epoch in range(epochs_{block}):\n"
+            f"        loss = learning_rate_{block} * epoch; print(loss)\n"
+            f"    return lambda: layers_{block}\n"
+            f"\n"
+        )
+        count += 20
+        block += 1
+    return "".join(chunks)
+
+
+def best_time(function: Callable[..., object], repeat: int = 5, setup: Callable[[], object] = None) -> float:
+    """Best wall-clock time of `repeat` calls of `function`, in seconds.
+
+    If `setup` is given, it is called before every call of `function`, untimed, and its result is passed to `function`.
+    """
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
@@ -0,0 +1,58 @@
+"""
+Benchmark the evaluation of parameter defaults by `safe_eval`, compiling every expression against caching compiled code.
+
+Like the command line, every expression is evaluated twice: once for its help message and once to infer its type.
+The warm timing keeps compiled expressions from one run to the next, as a server answering the same script again does.
+Run with `python -m foo2bar.bench.evaluation [PARAMETERS ...]`.
+"""
+
+import sys
+
+from ..evallib import eval_cache_clear, safe_eval
+from . import best_time
+
+
+def expressions(count: int) -> list[str]:
+    """Parameter defaults that are not literals, hence evaluated with RestrictedPython."""
+    return [f"[{index} * 2, abs(-{index}), round({index} / 3, 2) + len('abc')]" for index in range(count)]
+
+
+def eval_uncached(expr: str):
+    """`safe_eval` as done before caching compiled expressions."""
+    from RestrictedPython import compile_restricted_eval, limited_builtins, safe_builtins, utility_builtins
+
+    compiled = compile_restricted_eval(expr)
+    return eval(compiled.code, {"__builtins__": {**safe_builtins, **limited_builtins, **utility_builtins}})
+
+
+def evaluate(exprs: list[str]) -> None:
+    for expr in exprs + exprs:
+        safe_eval(expr)
+
+
+def evaluate_cold(exprs: list[str]) -> None:
+    eval_cache_clear()
+    evaluate(exprs)
+
+
+def benchmark(count: int, repeat: int = 3) -> dict[str, float]:
+    exprs = expressions(count)
+    return {
+        "uncached": best_time(lambda: [eval_uncached(expr) for expr in exprs + exprs], repeat),
+        "cached": best_time(lambda: evaluate_cold(exprs), repeat),
+        "warm": best_time(lambda: evaluate(exprs), repeat),
+    }
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    for count in map(int, argv or ["100", "1000"]):
+        times = benchmark(count)
+        print(
+            f"{count:>6} parameters: uncached {times['uncached']:.3f}s, cached {times['cached']:.3f}s "
+            f"({times['uncached'] / times['cached']:.1f}x), warm {times['warm']:.3f}s ({times['uncached'] / times['warm']:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark the extraction of substitutable assignments: `statement_matcher` against `AssignementExtractor`.
+
+Run with `python -m foo2bar.bench.extraction [LINES ...]`.
+"""
+
+import sys
+
+import libcst as cst
+from libcst import matchers as m, metadata
+
+from ..extractors import extract_assignements
+from ..matchers import statement_matcher
+from ..wrapper import resolve_metadata
+from . import best_time, synthetic_script
+
+
+def extract_with_matcher(metadata_wrapper: metadata.MetadataWrapper) -> list:
+    """Extraction as done before `AssignementExtractor`: find matching lines, then extract each one again."""
+    return [
+        (node, m.extract(node, statement_matcher, metadata_resolver=metadata_wrapper))
+        for node in m.findall(metadata_wrapper, statement_matcher)
+    ]
+
+
+def benchmark(lines: int, repeat: int = 3) -> dict[str, float]:
+    """Time both extractions on a synthetic script, once its metadata is resolved."""
+    metadata_wrapper = metadata.MetadataWrapper(cst.parse_module(synthetic_script(lines)), unsafe_skip_copy=True)
+    resolve_metadata(metadata_wrapper)
+    if len(extract_with_matcher(metadata_wrapper)) != len(extract_assignements(metadata_wrapper)):
+        raise AssertionError("Both extractions should find the same assignments")
+    return {
+        "matcher": best_time(lambda: extract_with_matcher(metadata_wrapper), repeat),
+        "extractor": best_time(lambda: extract_assignements(metadata_wrapper), repeat),
+    }
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    for lines in map(int, argv or ["1000", "10000"]):
+        times = benchmark(lines)
+        print(
+            f"{lines:>7} lines: matcher {times['matcher']:.3f}s, extractor {times['extractor']:.3f}s "
+            f"({times['matcher'] / times['extractor']:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
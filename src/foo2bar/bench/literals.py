@@ -0,0 +1,59 @@
+"""
+Benchmark inferring the type of literal parameter values: from their code with RestrictedPython or `ast.literal_eval`,
+against evaluating their nodes directly with `literal_eval_node`.
+
+Run with `python -m foo2bar.bench.literals [LINES ...]`.
+"""
+
+import sys
+
+from ..evallib import eval_cache_clear, try_safe_type_eval
+from ..wrapper import CodeWrapper
+from . import best_time, synthetic_script
+
+
+def restricted_type_eval(code: str) -> type:
+    """Type inference as done before literals were evaluated with `ast.literal_eval`."""
+    from RestrictedPython import compile_restricted_eval, limited_builtins, safe_builtins, utility_builtins
+
+    compiled = compile_restricted_eval(code)
+    return type(eval(compiled.code, {"__builtins__": {**safe_builtins, **limited_builtins, **utility_builtins}}))
+
+
+def benchmark(lines: int, repeat: int = 3) -> dict[str, float]:
+    """Time type inference for every assignment of a synthetic script, once analyzed."""
+    # fresh wrappers, so that value strings are not cached yet
+    assignements = lambda: CodeWrapper(code).analyze_assigns()
+    code = synthetic_script(lines)
+
+    def from_code_restricted(assigns):
+        eval_cache_clear()
+        return [restricted_type_eval(assignement.value_as_string()) for assignement in assigns]
+
+    def from_code(assigns):
+        eval_cache_clear()
+        return [try_safe_type_eval(assignement.value_as_string()) for assignement in assigns]
+
+    def from_nodes(assigns):
+        eval_cache_clear()
+        return [try_safe_type_eval(assignement.value) for assignement in assigns]
+
+    times = {}
+    for name, function in [("restricted", from_code_restricted), ("code", from_code), ("nodes", from_nodes)]:
+        assigns_per_run = [assignements() for _ in range(repeat)]
+        times[name] = best_time(lambda: function(assigns_per_run.pop()), repeat)
+    return times
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    for lines in map(int, argv or ["1000", "10000"]):
+        times = benchmark(lines)
+        print(
+            f"{lines:>7} lines: restricted {times['restricted']:.3f}s, literal_eval {times['code']:.3f}s, "
+            f"nodes {times['nodes']:.3f}s ({times['restricted'] / times['nodes']:.1f}x, {times['code'] / times['nodes']:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Benchmark substituting values in the global scope of a script with libcst, parsing it and resolving its scopes, against
+the tokenizer-based scanner.
+
+Run with `python -m foo2bar.bench.scanner [LINES ...]`.
+"""
+
+import sys
+
+from ..scanner import scan_global_assignements, try_substitute_global
+from ..wrapper import CodeWrapper
+from . import best_time, synthetic_script
+
+
+def _substitute_with_libcst(source: str, mapping: dict[str, str]) -> tuple[str, dict[str, str]]:
+    wrapper = CodeWrapper(source)
+    remaining = wrapper.substitute_assign_values_global(mapping)
+    return wrapper.code, remaining
+
+
+def benchmark(lines: int, repeat: int = 3) -> dict[str, float]:
+    """Time the substitution of every other global parameter of a script, from its source to the substituted code."""
+    source = synthetic_script(lines)
+    mapping = {record.name: "None" for record in scan_global_assignements(source)[::2]}
+    if try_substitute_global(source, mapping) != _substitute_with_libcst(source, mapping):
+        raise AssertionError("Both engines should produce the same code")
+    return {
+        "libcst": best_time(lambda: _substitute_with_libcst(source, mapping), repeat),
+        "scanner": best_time(lambda: try_substitute_global(source, mapping), repeat),
+    }
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    for lines in map(int, argv or ["1000", "10000"]):
+        times = benchmark(lines)
+        print(
+            f"{lines:>7} lines: libcst {times['libcst']:.3f}s, scanner {times['scanner']:.4f}s "
+            f"({times['libcst'] / times['scanner']:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark substituting global parameters with `Substitutor`, visiting every statement of the module against skipping
+the bodies of functions and classes, and stopping once every parameter is substituted.
+
+Run with `python -m foo2bar.bench.substitution [LINES ...]`.
+"""
+
+import sys
+
+import libcst as cst
+from libcst import metadata
+
+from ..providers import ScopeNestingProvider
+from ..transformers import Substitutor
+from ..wrapper import resolve_metadata
+from . import best_time
+
+PARAMETERS = 10
+
+
+def parameters_then_functions(lines: int) -> str:
+    """Generate a script of about `lines` lines: a few parameters at the top, followed by functions and classes using them.
+
+    Args:
+        lines (int): Approximate number of lines of the script.
+
+    Returns:
+        str: The source of the script.
+    """
+    chunks = [f"param_{index} = {index}  # parameter {index}\n" for index in range(PARAMETERS)]
+    count = PARAMETERS
+    block = 0
+    while count < lines:
+        chunks.append(
+            f"\n"
+            f"def step_{block}(values, factor=param_{block % PARAMETERS}):\n"
+            f"    total = 0\n"
+            f"    for value in values:\n"
+            f"        scaled = value * factor\n"
+            f"        total += scaled\n"
+            f"    return total\n"
+            f"\n"
+            f"class Stage{block}:\n"
+            f"    size = param_{(block + 1) % PARAMETERS}\n"
+            f"\n"
+            f"    def run(self, values):\n"
+            f"        result = step_{block}(values)\n"
+            f"        return result / self.size\n"
+        )
+        count += 14
+        block += 1
+    return "".join(chunks)
+
+
+class UnprunedSubstitutor(Substitutor):
+    """Substitution as done before pruning: every statement of the module is inspected."""
+
+    def _is_done(self) -> bool:
+        return False
+
+    def _may_contain_scope(self) -> bool:
+        return True
+
+
+def benchmark(lines: int, repeat: int = 3) -> dict[str, float]:
+    """Time the substitution of every global parameter of a script, once its metadata is resolved."""
+    metadata_wrapper = metadata.MetadataWrapper(cst.parse_module(parameters_then_functions(lines)), unsafe_skip_copy=True)
+    resolve_metadata(metadata_wrapper)
+    global_scope = metadata_wrapper.resolve(ScopeNestingProvider)[metadata_wrapper.module]
+    mapping = {f"param_{index}": repr(-index) for index in range(PARAMETERS)}
+    expected = metadata_wrapper.visit(UnprunedSubstitutor(mapping, global_scope)).code
+    if metadata_wrapper.visit(Substitutor(mapping, global_scope)).code != expected:
+        raise AssertionError("Both substitutions should produce the same code")
+    return {
+        "full": best_time(lambda: metadata_wrapper.visit(UnprunedSubstitutor(mapping, global_scope)), repeat),
+        "pruned": best_time(lambda: metadata_wrapper.visit(Substitutor(mapping, global_scope)), repeat),
+    }
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    for lines in map(int, argv or ["1000", "10000"]):
+        times = benchmark(lines)
+        print(
+            f"{lines:>7} lines: full {times['full']:.3f}s, pruned {times['pruned']:.4f}s "
+            f"({times['full'] / times['pruned']:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Time the main steps of foo2bar on synthetic scripts of increasing size, from 100 to 100k lines, and compare the
+results against a baseline.
+
+The suite times parsing a script with `CodeWrapper.from_file`, `analyze_assigns`, `list_scope_names`,
+`substitute_assign_values_global`, generating the substituted code, `cli.parse_arguments`, and the startup of the
+`foo2bar` command in a new process. Results are written as JSON, so that the results of a new version of foo2bar
+can be compared against the ones stored for a previous version:
+
+```sh
+python -m foo2bar.bench --output baseline.json
+python -m foo2bar.bench --baseline baseline.json
+```
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from importlib import metadata
+from pathlib import Path
+from typing import NamedTuple
+
+from .. import cli
+from ..server import SOCKET_ENV
+from ..wrapper import CodeWrapper
+from . import best_time
+
+SIZES = (100, 1_000, 10_000, 100_000)
+# steps are run once on scripts of at least this many lines, which take minutes to go through the suite even then
+SINGLE_RUN_LINES = 100_000
+# differences below this duration, in seconds, are considered noise
+MIN_DURATION = 0.001
+
+
+def templated_script(lines: int, parameters: int = None, scopes: int = None) -> str:
+    """Generate a script of about `lines` lines: global parameters of various kinds, some of them commented or marked
+    as "no param", followed by classes holding their own parameters, and functions filling the rest of the script.
+
+    Args:
+        lines (int): Approximate number of lines of the script.
+        parameters (int, optional): Number of global assignments. Defaults to one every 50 lines, and at least 5.
+        scopes (int, optional): Number of classes, each with a method. Defaults to one every 200 lines, and at least 1.
+
+    Returns:
+        str: The source of the script.
+    """
+    parameters = max(5, lines // 50) if parameters is None else parameters
+    scopes = max(1, lines // 200) if scopes is None else scopes
+
+    chunks = []
+    for index in range(parameters):
+        comment = "  # no param" if index % 10 == 9 else f"  # parameter {index}" if index % 2 == 0 else ""
+        value = [f"{index}", f"{index}.5", f"[{index}, {index + 1}]", f"'value-{index}'"][index % 4]
+        annotation = ["", ": float", ": list[int]", ": str"][index % 4] if index % 3 == 0 else ""
+        chunks.append(f"param_{index}{annotation} = {value}{comment}\n")
+    for index in range(scopes):
+        chunks.append(
+            f"\n"
+            f"class Scope{index}:\n"
+            f"    size = {index}  # size of the scope\n"
+            f"    name: str = 'scope-{index}'\n"
+            f"\n"
+            f"    def run(self, values):\n"
+            f"        factor = {f'param_{index % parameters}' if parameters else 1}\n"
+            f"        return [value * factor for value in values]\n"
+        )
+    count = parameters + 8 * scopes
+    index = 0
+    while count < lines:
+        chunks.append(
+            f"\n"
+            f"def step_{index}(values):\n"
+            f"    total = 0  # no param\n"
+            f"    for value in values:\n"
+            f"        total += value\n"
+            f"    return total\n"
+        )
+        count += 6
+        index += 1
+    return "".join(chunks)
+
+
+def _parameter_mapping(wrapper: CodeWrapper) -> dict[str, str]:
+    """New values for half of the global parameters of a script."""
+    return {assignement.name: "None" for assignement in wrapper.analyze_assigns(CodeWrapper.GLOBAL_SCOPE)[::2]}
+
+
+def _run_command(argv: list[str]) -> None:
+    """Run the `foo2bar` command in a new process, locally rather than through a server."""
+    env = {key: value for key, value in os.environ.items() if key != SOCKET_ENV}
+    # the package may not be installed, in which case it is imported from where this module is
+    source_dir = str(Path(__file__).parents[2])
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [source_dir, env.get("PYTHONPATH")]))
+    subprocess.run(
+        [sys.executable, "-c", "import sys; from foo2bar.cli import main; sys.exit(main())", *argv],
+        env=env, check=True, capture_output=True,
+    )
+
+
+def benchmark(lines: int, repeat: int = 3, startup: bool = True) -> dict[str, float]:
+    """Time every step of the suite on a script of about `lines` lines.
+
+    Args:
+        lines (int): Approximate number of lines of the script.
+        repeat (int, optional): Number of runs of each step, the best one being kept. Defaults to 3.
+        startup (bool, optional): Whether to time the startup of the command in a new process. Defaults to True.
+
+    Returns:
+        dict[str, float]: The best time of every step, in seconds.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        script = Path(directory) / "script.py"
+        script.write_text(templated_script(lines))
+        mapping = _parameter_mapping(CodeWrapper.from_file(script))
+        load = lambda: CodeWrapper.from_file(script)
+
+        def substituted():
+            wrapper = load()
+            wrapper.substitute_assign_values_global(mapping)
+            return wrapper
+
+        argv = [str(script), "raw", "--no-cache", *(f"--{name}={value}" for name, value in mapping.items())]
+        times = {
+            "from_file": best_time(load, repeat),
+            "analyze_assigns": best_time(lambda wrapper: wrapper.analyze_assigns(), repeat, setup=load),
+            "list_scope_names": best_time(lambda wrapper: wrapper.list_scope_names(), repeat, setup=load),
+            "substitute_assign_values_global": best_time(
+                lambda wrapper: wrapper.substitute_assign_values_global(mapping), repeat, setup=load
+            ),
+            "code": best_time(lambda wrapper: wrapper.code, repeat, setup=substituted),
+            "parse_arguments": best_time(lambda: cli.parse_arguments(argv), repeat),
+        }
+        if startup:
+            output = Path(directory) / "output.py"
+            times["startup"] = best_time(lambda: _run_command([*argv, "--output", str(output)]), repeat)
+    return times
+
+
+def run_suite(sizes: list[int] = SIZES, repeat: int = 3, startup: bool = True) -> dict:
+    """Run the suite on scripts of every given size, returning results that can be dumped as JSON.
+
+    Steps are run `repeat` times, except on scripts of at least `SINGLE_RUN_LINES` lines, where they are run once.
+    """
+    try:
+        version = metadata.version("foo2bar")
+    except metadata.PackageNotFoundError:
+        version = None
+    return {
+        "foo2bar": version,
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "results": {
+            str(lines): benchmark(lines, 1 if lines >= SINGLE_RUN_LINES else repeat, startup) for lines in sizes
+        },
+    }
+
+
+class Regression(NamedTuple):
+    lines: str
+    step: str
+    baseline: float
+    current: float
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.25) -> list[Regression]:
+    """List the steps that are slower than in the baseline by more than `tolerance`, a fraction of the baseline time.
+
+    Only sizes and steps present in both results are compared.
+    """
+    regressions = []
+    for lines, times in results["results"].items():
+        for step, current in times.items():
+            previous = baseline["results"].get(lines, {}).get(step)
+            if previous is None:
+                continue
+            if current > previous * (1 + tolerance) and current - previous > MIN_DURATION:
+                regressions.append(Regression(lines, step, previous, current))
+    return regressions
+
+
+def format_results(results: dict, baseline: dict = None) -> str:
+    """Format results as a table, with the ratio to the baseline time if given."""
+    rows = []
+    for lines, times in results["results"].items():
+        for step, current in times.items():
+            row = f"{lines:>7} lines  {step:<32} {current:>9.4f}s"
+            previous = None if baseline is None else baseline["results"].get(lines, {}).get(step)
+            if previous:
+                row += f"  ({current / previous:.2f}x baseline)"
+            rows.append(row)
+    return "\n".join(rows)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = ArgumentParser(prog="python -m foo2bar.bench", description="Time foo2bar on synthetic scripts of increasing size.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), metavar="LINES", help="sizes of the scripts, in lines.")
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help=f"number of runs of each step, the best one being kept, or one on scripts of {SINGLE_RUN_LINES} lines or more.",
+    )
+    parser.add_argument("--no-startup", action="store_true", help="do not time the startup of the command in a new process.")
+    parser.add_argument("--output", "-o", type=Path, help="file to write the JSON results to. Defaults to the standard output.")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare against, failing if a step got slower.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown tolerated against the baseline, as a fraction.")
+    args = parser.parse_args(argv)
+
+    baseline = None if args.baseline is None else json.loads(args.baseline.read_text())
+    results = run_suite(args.sizes, args.repeat, not args.no_startup)
+    print(format_results(results, baseline), file=sys.stderr)
+
+    dumped = json.dumps(results, indent=2)
+    if args.output is None:
+        print(dumped)
+    else:
+        args.output.write_text(dumped + "\n")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(
+                f"Regression: {regression.step} on {regression.lines} lines took {regression.current:.4f}s, "
+                f"against {regression.baseline:.4f}s in the baseline",
+                file=sys.stderr,
+            )
+        if regressions:
+            return 1
+    return 0
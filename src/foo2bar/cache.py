@@ -0,0 +1,201 @@
+"""
+This module caches the analysis of scripts on disk, so that unchanged scripts are not parsed again.
+
+The analysis of a script holds an `AssignementRecord` for every assignment that can be substituted, i.e. its name, scope,
+annotation, value and comment as source strings, along with the span of its value in the source, and the names of the classes of the script. This is all that is needed to build the command line options
+of a script and to render it with a `SubstitutionTemplate`, without libcst.
+
+Cache entries are keyed by a hash of the script content and of the foo2bar and libcst versions, since a new version may analyze
+the same script differently. Long-running processes can keep analyses in memory as well, keyed by path and modification time.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from functools import cache
+from pathlib import Path
+from typing import Iterable
+
+from foo2bar.logging import logger
+from .profiling import phase
+from .records import AssignementRecord
+from .template import SubstitutionTemplate, TemplateSlot
+
+# bump when the layout of cache entries changes
+CACHE_FORMAT = 3
+
+
+class ScriptAnalysis:
+    """Analysis of a script that does not depend on libcst, i.e. its source and its substitutable assignments.
+
+    Args:
+        source (str): The source of the script.
+        assignements (list[AssignementRecord]): The substitutable assignments of the script, in code order.
+        class_scopes (Iterable[str], optional): Names of the classes nested in classes only, e.g. `Outer.Inner`,
+            see `CodeWrapper.list_class_scope_names`. Defaults to none.
+    """
+
+    # same as CodeWrapper, which is not imported to keep libcst out of the command line startup
+    GLOBAL_SCOPE = ""
+    ANY_SCOPE = None
+
+    def __init__(self, source: str, assignements: list[AssignementRecord], class_scopes: Iterable[str] = ()) -> None:
+        self.source = source
+        self.assignements = assignements
+        self.class_scopes = list(class_scopes)
+
+    @classmethod
+    def from_wrapper(cls, wrapper: "CodeWrapper") -> "ScriptAnalysis":
+        return cls(wrapper.code, wrapper.analyze_records(wrapper.ANY_SCOPE), wrapper.list_class_scope_names())
+
+    def analyze_assigns(self, scope_name: str = None) -> list[AssignementRecord]:
+        return [
+            assignement for assignement in self.assignements
+            if scope_name is self.ANY_SCOPE or assignement.scope == scope_name
+        ]
+
+    def compile_template(self, scope_name: str = GLOBAL_SCOPE) -> SubstitutionTemplate:
+        return SubstitutionTemplate(self.source, [
+            TemplateSlot(assignement.name, assignement.start, assignement.end, assignement.indent)
+            for assignement in self.analyze_assigns(scope_name)
+        ])
+
+    def compile_scoped_template(self) -> SubstitutionTemplate:
+        """Like `compile_template`, for the named scopes all at once, each slot being named after the qualified name of
+        its variable, e.g. `MyClass.X`, or after its name in the global scope."""
+        return SubstitutionTemplate(self.source, [
+            TemplateSlot(assignement.qualified_name, assignement.start, assignement.end, assignement.indent)
+            for assignement in self.assignements
+            if assignement.scope is not None
+        ])
+
+
+def default_cache_dir() -> Path:
+    """`$FOO2BAR_CACHE_DIR`, or `foo2bar` in the user cache directory (`$XDG_CACHE_HOME`, defaulting to `~/.cache`)."""
+    if cache_dir := os.environ.get("FOO2BAR_CACHE_DIR"):
+        return Path(cache_dir)
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "foo2bar"
+
+
+@cache
+def _versions() -> str:
+    from importlib import metadata
+
+    versions = []
+    for distribution in ["foo2bar", "libcst"]:
+        try:
+            versions.append(metadata.version(distribution))
+        except metadata.PackageNotFoundError:
+            versions.append("unknown")
+    return "\0".join(versions)
+
+
+class AnalysisCache:
+    def __init__(self, directory: str | Path = None) -> None:
+        self.directory = Path(directory) if directory is not None else default_cache_dir()
+
+    @staticmethod
+    def key(source: str) -> str:
+        digest = hashlib.sha256(f"{CACHE_FORMAT}\0{_versions()}\0".encode())
+        digest.update(source.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, source: str) -> ScriptAnalysis | None:
+        """Return the cached analysis of `source`, or None if it is not cached or the entry is unreadable."""
+        with phase("cache.get"):
+            return self._get(source)
+
+    def _get(self, source: str) -> ScriptAnalysis | None:
+        try:
+            entry = json.loads(self._entry_path(self.key(source)).read_text())
+            return ScriptAnalysis(
+                source,
+                [AssignementRecord(*assignement) for assignement in entry["assignements"]],
+                entry["class_scopes"],
+            )
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug(f"Ignoring unreadable analysis cache entry: {e}")
+            return None
+
+    def put(self, analysis: ScriptAnalysis) -> None:
+        """Store an analysis. Failures are logged and otherwise ignored, since the cache is only an optimization."""
+        entry = json.dumps({
+            "assignements": [list(assignement) for assignement in analysis.assignements],
+            "class_scopes": analysis.class_scopes,
+        })
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first so that concurrent readers never see a partial entry
+            with tempfile.NamedTemporaryFile("w", dir=self.directory, suffix=".tmp", delete=False) as file:
+                file.write(entry)
+            os.replace(file.name, self._entry_path(self.key(analysis.source)))
+        except OSError as e:
+            logger.debug(f"Unable to write analysis cache entry: {e}")
+
+    def analyze(self, source: str) -> ScriptAnalysis:
+        """Return the analysis of `source`, from the cache if possible, otherwise parsing it and caching the result."""
+        analysis = self.get(source)
+        if analysis is None:
+            with phase("import"):
+                from .wrapper import CodeWrapper
+
+            analysis = ScriptAnalysis.from_wrapper(CodeWrapper(source))
+            self.put(analysis)
+        return analysis
+
+    def analyze_file(self, file_path: str | Path) -> ScriptAnalysis:
+        with phase("read"):
+            source = Path(file_path).read_text()
+        return self.analyze(source)
+
+
+class MemoryAnalysisCache:
+    """Least recently used analyses kept in memory, keyed by path and modification time, in front of an optional `AnalysisCache`."""
+
+    def __init__(self, maxsize: int = 128, fallback: AnalysisCache = None) -> None:
+        self.maxsize = maxsize
+        self.fallback = fallback
+        # analyses are keyed by path, and stored along with the modification time and size of the file they were computed from
+        self._analyses = OrderedDict[Path, tuple[tuple[int, int], ScriptAnalysis]]()
+
+    def __len__(self) -> int:
+        return len(self._analyses)
+
+    def clear(self) -> None:
+        self._analyses.clear()
+
+    def analyze_file(self, file_path: str | Path) -> ScriptAnalysis:
+        file_path = Path(file_path).resolve()
+        stat = file_path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        if file_path in self._analyses:
+            cached_version, analysis = self._analyses[file_path]
+            if cached_version == version:
+                self._analyses.move_to_end(file_path)
+                return analysis
+
+        analysis = analyze_file(file_path, self.fallback)
+        self._analyses[file_path] = (version, analysis)
+        self._analyses.move_to_end(file_path)
+        if len(self._analyses) > self.maxsize:
+            self._analyses.popitem(last=False)
+        return analysis
+
+
+def analyze_file(file_path: str | Path, cache: AnalysisCache | MemoryAnalysisCache = None) -> ScriptAnalysis:
+    """Analyze a script, through `cache` if provided."""
+    if cache is not None:
+        return cache.analyze_file(file_path)
+
+    with phase("import"):
+        from .wrapper import CodeWrapper
+
+    return ScriptAnalysis.from_wrapper(CodeWrapper.from_file(file_path))
@@ -1,15 +1,30 @@
+import json
 import logging
+import os
+import sys
 import types
 import typing
-from argparse import ArgumentParser
+from argparse import ArgumentError, ArgumentParser, ArgumentTypeError
 from pathlib import Path
 from typing import Literal, Type
 
 
 import foo2bar.logging as logging
 from foo2bar.logging import logger
-from .wrapper import AssignementWrapper, CodeWrapper
-from .evallib import safe_eval, try_annotation_eval, try_safe_type_eval
+from .cache import AnalysisCache, MemoryAnalysisCache, ScriptAnalysis, analyze_file
+from .edits import OUTPUT_FORMATS, format_edits
+from .profiling import phase, profile
+from .records import AssignementRecord, qualified_name
+from .server import SOCKET_ENV, forward, serve
+from .batch import (
+    GridError,
+    collect_scripts,
+    expand_grid,
+    is_script_collection,
+    parse_grid_option,
+    substitute_files,
+    sweep,
+)
 
 
 class RawExpr(str):
@@ -29,7 +44,7 @@ DtypeInference = Literal["none", "value", "annotation", "both"]
 
 
 def interpret_dtype(
-    assignement: AssignementWrapper,
+    assignement: "AssignementWrapper | AssignementRecord",
     dtype_inference: DtypeInference,
     default_type: type,
     nargs_classes: list[Type] = None,
@@ -44,11 +59,14 @@ def interpret_dtype(
             f"dtype_inference must be one of {DtypeInference.__args__!r}, not {dtype_inference!r}"
         )
 
+    from .evallib import try_annotation_eval, try_safe_type_eval
+
     dtype: Type | None = None
     if dtype_inference in ["annotation", "both"]:
-        dtype = try_annotation_eval(assignement.annotation_as_string())
+        dtype = try_annotation_eval(assignement.annotation)
     if dtype_inference in ["value", "both"] and dtype is None:
-        dtype = try_safe_type_eval(assignement.value_as_string())
+        # nodes of literal values are evaluated without generating their code
+        dtype = try_safe_type_eval(assignement.value)
     if dtype is None or dtype_inference in ["none", None]:
         dtype = default_type
 
@@ -63,13 +81,15 @@ def interpret_dtype(
         }
 
 
-def build_argument_help(assignement: AssignementWrapper) -> str:
+def build_argument_help(assignement: "AssignementWrapper | AssignementRecord") -> str:
+    from .evallib import safe_eval
+
     comment: str = assignement.comment
     if comment is not None:
         comment = comment.lstrip("# ").strip()
 
     try:
-        default_value = safe_eval(assignement.value_as_string())
+        default_value = safe_eval(assignement.value)
         default_comment = f"Defaults to {default_value!r}"
     except Exception:
         default_comment = None
@@ -82,12 +102,14 @@ def build_argument_help(assignement: AssignementWrapper) -> str:
 
 
 def assignement_to_args(
-    assignement: AssignementWrapper,
+    assignement: "AssignementWrapper | AssignementRecord",
     dtype_inference: DtypeInference,
     default_type: Type[str] | Type[RawExpr],
     nargs_classes: list[Type],
+    with_help: bool = True,
 ) -> tuple[list[str], dict]:
-    args = ["--{}".format(assignement.name)]
+    # variables of other scopes than the global one are named after their scope, e.g. --MyClass.X
+    args = ["--{}".format(qualified_name(assignement.scope_as_string(), assignement.name))]
 
     kwargs = {
         "default": UNSET,
@@ -103,94 +125,364 @@ def assignement_to_args(
         )
     )
 
-    kwargs["help"] = build_argument_help(assignement)
+    # evaluating default values is only worth it to display them
+    kwargs["help"] = build_argument_help(assignement) if with_help else None
 
     return args, kwargs
 
 
+def help_requested(argv: list[str]) -> bool:
+    """Whether argv may request the help message, including abbreviations of `--help`."""
+    return any(arg == "-h" or (arg.startswith("--h") and "--help".startswith(arg)) for arg in argv)
+
+
+def profiling_requested(argv: list[str]) -> tuple[bool, bool]:
+    """Whether argv requests profiling, and whether it requests measuring memory, as parsed by the base parser.
+
+    Values of script options, e.g. `--name --profile`, do not request profiling.
+    """
+    base_args, _ = build_base_parser().parse_known_args(args=argv)
+    return base_args.profile or base_args.profile_memory, base_args.profile_memory
+
+
+def grid_option(option: str) -> tuple[str, list[str]]:
+    try:
+        return parse_grid_option(option)
+    except GridError as e:
+        raise ArgumentTypeError(str(e)) from e
+
+
+def parse_free_arguments(argv: list[str]) -> dict[str, str]:
+    """Parse `--name value` and `--name=value` pairs, for options that are not known in advance."""
+    arguments = {}
+    argv = list(argv)
+    while argv:
+        option = argv.pop(0)
+        if not option.startswith("--"):
+            raise ValueError(f"Expected an option starting with '--', got {option!r}")
+        name, separator, value = option[2:].partition("=")
+        if not separator:
+            if not argv or argv[0].startswith("--"):
+                raise ValueError(f"Missing value for option {option!r}")
+            value = argv.pop(0)
+        if not name.isidentifier():
+            raise ValueError(f"Invalid variable name in option {option!r}")
+        arguments[name] = value
+    return arguments
+
+
+def build_base_parser() -> ArgumentParser:
+    """Parser of the options that do not depend on the script, ignoring errors since script options are not known yet.
+
+    Abbreviations are disabled, so that the options of script variables are not taken for abbreviated foo2bar options, e.g. `--g` for `--grid`.
+    """
+    parser = ArgumentParser(add_help=False, allow_abbrev=False)
+
+    parser.add_argument("script", type=Path, help="path to the script to parse.")
+    parser.add_argument("mode", type=str, choices=["raw", "typed", "sweep"], default="raw", help="argument type interpretation mode. See readme for more information.")
+    parser.add_argument(
+        "--output", "-o", type=Path, help="path to the output file."
+    )
+    parser.add_argument(
+        "--format", type=str, choices=OUTPUT_FORMATS, default="full",
+        help="output the full script, or only the edits made to it: a unified diff, a patch with a/ and b/ prefixes, or a JSON list of [start, end, replacement] character spans. Defaults to full."
+    )
+    parser.add_argument(
+        "--grid", type=grid_option, action="append", default=[], metavar="NAME=VALUE1,VALUE2,...",
+        help="sweep mode only: values of a variable to sweep. Can be repeated to sweep the cartesian product of several variables."
+    )
+    parser.add_argument(
+        "--output-dir", "--out-dir", type=Path,
+        help="directory to write the scripts to, in sweep mode or when substituting several scripts."
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, help="number of worker processes, in sweep mode or when substituting several scripts. Defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="do not read nor write the analysis of the script from the cache directory, set by $FOO2BAR_CACHE_DIR."
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="print the time spent in every phase of foo2bar to the standard error, as JSON."
+    )
+    parser.add_argument(
+        "--profile-memory", action="store_true",
+        help="like --profile, measuring the peak memory allocated during every phase as well."
+    )
+
+    # ignore errors. exit_on_errors=False doesn't work for some reason
+    parser.error = lambda s: None
+    return parser
+
+
 def parse_arguments(
-    argv: list = None
+    argv: list = None,
+    cache: AnalysisCache | MemoryAnalysisCache = None,
 ) -> dict:
     """Parse arguments from a script file.
 
-    Every gobal assignement in the script file will be parsed as an argument, unless the comment contains "NO PARAM" or "no param".
+    Every gobal assignement in the script file will be parsed as an argument, unless the comment contains "NO PARAM" or "no param",
+    or its option is already taken by foo2bar, e.g. `--jobs`, in which case a warning is logged.
+    Assignments of classes, nested in classes only, are parsed as arguments named after their scope, e.g. `--MyClass.X`.
     Depending on the dtype_inference, the type of the argument will be inferred from the annotation, the value, or both.
 
+    When the script is a directory or a glob pattern, every `--name value` pair is parsed as a raw argument, without analyzing the scripts.
+
     Args:
         argv (list, optional): List of command-line arguments. Defaults to `sys.argv`.
+        cache (AnalysisCache | MemoryAnalysisCache, optional): Cache of script analyses. Defaults to an `AnalysisCache` in the default cache directory.
         dtype_inference (Literal["none", "annotation", "value", "both"], optional): How to infer the data type of the arguments. Defaults to None.
 
     Returns:
-        dict: A dictionary containing the script path, the output path, and the parsed arguments.
+        dict: A dictionary containing the script path, the output path, the sweep options, the analyzed script or the list of scripts, and the parsed arguments.
     """
-    base_parser = ArgumentParser(add_help=False)
+    if argv is None:
+        argv = sys.argv[1:]
 
-    base_parser.add_argument("script", type=Path, help="path to the script to parse.")
-    base_parser.add_argument("mode", type=str, choices=["raw", "typed"], default="raw", help="argument type interpretation mode. See readme for more information.")
-    base_parser.add_argument(
-        "--output", "-o", type=Path, help="path to the output file."
-    )
-    
-    # ignore errors. exit_on_errors=False doesn't work for some reason
-    base_parser.error = lambda s: None
-    base_args, other_argv = base_parser.parse_known_args(args=argv)
-    dtype_inference = "none" if base_args.mode == "raw" else "both"
+    with phase("argparse"):
+        base_parser = build_base_parser()
+        base_args, other_argv = base_parser.parse_known_args(args=argv)
+    dtype_inference = "both" if base_args.mode == "typed" else "none"
     
     script_parser = ArgumentParser(
         add_help=False,
         exit_on_error=False,
+        allow_abbrev=False,
     )
+    with phase("argparse"):
+        # script options are added to both parsers, the full parser rejecting the options already taken by foo2bar
+        full_parser = ArgumentParser(
+            parents=[base_parser],
+            add_help=True,
+            exit_on_error=True,
+            allow_abbrev=False,
+        )
 
-    if getattr(base_args, "script", None) is not None and Path(base_args.script).exists():
-        argument_group = script_parser.add_argument_group("script options")
-
-        wrapper = CodeWrapper.from_file(base_args.script)
-        assignements = wrapper.analyze_assigns(wrapper.GLOBAL_SCOPE)
-
+    multiple_scripts = getattr(base_args, "script", None) is not None and is_script_collection(base_args.script)
+
+    analysis = None
+    if not multiple_scripts and getattr(base_args, "script", None) is not None and Path(base_args.script).exists():
+        if base_args.no_cache:
+            cache = None
+        elif cache is None:
+            cache = AnalysisCache()
+        with phase("analyze"):
+            analysis = analyze_file(base_args.script, cache=cache)
+        # global options first, then the options of every class in code order, locals of functions are no options
+        class_scopes = set(analysis.class_scopes)
+        assignements = analysis.analyze_assigns(analysis.GLOBAL_SCOPE) + [
+            assignement for assignement in analysis.analyze_assigns(analysis.ANY_SCOPE)
+            if assignement.scope in class_scopes
+        ]
+        # classes of the same name, e.g. defined in both branches of an if statement, share the options of their first one
+        options = {}
         for assignement in assignements:
-            args, kwargs = assignement_to_args(
-                assignement,
-                dtype_inference=dtype_inference,
-                default_type=RawExpr,
-                nargs_classes=[list],
-            )
-            argument_group.add_argument(*args, **kwargs)
-
-    full_parser = ArgumentParser(
-        parents=[base_parser, script_parser],
-        add_help=True,
-        exit_on_error=True,
-    )
+            options.setdefault(assignement.qualified_name, assignement)
+        argument_groups = {}
+
+        with phase("options"):
+            for assignement in options.values():
+                args, kwargs = assignement_to_args(
+                    assignement,
+                    dtype_inference=dtype_inference,
+                    default_type=RawExpr,
+                    nargs_classes=[list],
+                    with_help=help_requested(argv),
+                )
+                if assignement.scope not in argument_groups:
+                    title = "script options" if assignement.scope == analysis.GLOBAL_SCOPE else f"{assignement.scope} options"
+                    argument_groups[assignement.scope] = (
+                        full_parser.add_argument_group(title), script_parser.add_argument_group(title)
+                    )
+                full_group, script_group = argument_groups[assignement.scope]
+                try:
+                    full_group.add_argument(*args, **kwargs)
+                except ArgumentError:
+                    logger.warning(f"Variable {args[0][2:]!r} of the script cannot be substituted, since foo2bar uses the option {args[0]}")
+                    continue
+                script_group.add_argument(*args, **kwargs)
+
+    if multiple_scripts:
+        # display help message if needed, script options are unknown
+        _, free_argv = full_parser.parse_known_args(args=argv)
+        if base_args.mode != "raw":
+            full_parser.error("only raw mode is supported when substituting several scripts")
+        if base_args.output_dir is None:
+            full_parser.error("substituting several scripts requires --output-dir")
+        if base_args.format != "full":
+            full_parser.error("only the full format is supported when substituting several scripts")
+        try:
+            arguments = parse_free_arguments(free_argv)
+        except ValueError as e:
+            full_parser.error(str(e))
+        return {
+            **vars(base_args),
+            "analysis": None,
+            "scripts": collect_scripts(base_args.script), # base directory and scripts
+            "arguments": arguments,
+        }
     
     # display help message if needed
-    full_parser.parse_args(args=argv)
-    
+    with phase("argparse"):
+        full_parser.parse_args(args=argv)
+
+    if base_args.mode == "sweep" and base_args.output_dir is None:
+        full_parser.error("sweep mode requires --output-dir")
+
     return {
-        **vars(base_args), # "mode", "script", "output"
+        **vars(base_args), # "mode", "script", "output", "format", "grid", "output_dir", "jobs"
+        "analysis": analysis, # analyzed script, to avoid parsing it again
+        "scripts": None,
         "arguments": vars(script_parser.parse_args(other_argv)), # all other arguments
     }
 
-def substitute_global(script: Path, mapping: dict) -> tuple[str, dict[str, str]]:
-    wrapper = CodeWrapper.from_file(script)
-    
-    remaining = wrapper.substitute_assign_values_global(mapping)
-    
-    return wrapper.code, remaining
+def substitute_global(script: Path, mapping: dict, analysis: ScriptAnalysis = None) -> tuple[str, dict[str, str]]:
+    """Substitute values in the global scope of a script, from its analysis if given, otherwise with the scanner.
+
+    The command line analyzes a single script to build its options, including the options of classes, which the
+    scanner does not find, so it renders the script from that analysis and only uses the scanner for several scripts.
+    """
+    if analysis is not None:
+        return analysis.compile_template(analysis.GLOBAL_SCOPE).render(mapping)
+
+    from .scanner import substitute_global
+
+    with phase("read"):
+        code = Path(script).read_text()
+    # the tokenizer-based scanner falls back to libcst on the scripts it does not support
+    return substitute_global(code, mapping)
+
 
+def substitute_scopes(script: Path, mapping: dict, analysis: ScriptAnalysis = None) -> tuple[str, dict[str, str]]:
+    """Substitute values in every scope of a script in a single pass, `mapping` being keyed by qualified names, e.g. `MyClass.X`."""
+    if not any("." in name for name in mapping):
+        return substitute_global(script, mapping, analysis)
+    if analysis is None:
+        analysis = analyze_file(script)
+    return analysis.compile_scoped_template().render(mapping)
 
-def main():
-    args = parse_arguments()
+
+def substitute_edits(
+    script: Path, mapping: dict, analysis: ScriptAnalysis = None, output_format: str = "diff"
+) -> tuple[str, dict[str, str]]:
+    """Like `substitute_scopes`, formatting the edits made to the script instead of the substituted code, see `foo2bar.edits`."""
+    if analysis is None:
+        analysis = analyze_file(script)
+    edits, remaining = analysis.compile_scoped_template().render_edits(mapping)
+    return format_edits(analysis.source, edits, output_format, script), remaining
+
+
+def sweep_global(
+    script: Path, grid: dict[str, list[str]], output_dir: Path, mapping: dict = None, analysis: ScriptAnalysis = None, max_workers: int = None,
+    output_format: str = "full",
+) -> dict[str, dict[str, str]]:
+    if analysis is None:
+        analysis = analyze_file(script)
+    # swept variables and other script options may belong to other scopes, e.g. MyClass.X
+    template = analysis.compile_scoped_template()
+
+    unknown = [name for name in grid if name not in template.names()]
+    if unknown:
+        logger.warning("Some swept variables are not substitutable: " + ", ".join(unknown))
+
+    mappings = [{**(mapping or {}), **combination} for combination in expand_grid(grid)]
+    return sweep(template, mappings, output_dir, script, max_workers=max_workers, output_format=output_format)
+
+
+def main(argv: list = None) -> int | None:
+    """Entry point of the `foo2bar` command.
+
+    `foo2bar serve` starts a server, see `foo2bar.server`. Other command lines are forwarded to the server listening on `$FOO2BAR_SOCKET` if set,
+    and run in this process otherwise or if the server cannot be reached.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv[:1] == ["serve"]:
+        return serve(argv[1:])
+
+    if socket_path := os.environ.get(SOCKET_ENV):
+        try:
+            return forward(argv, socket_path)
+        except OSError as e:
+            logger.debug(f"Unable to reach the server on {socket_path}, running locally: {e}")
+
+    return run(argv)
+
+
+def run(argv: list = None, cache: AnalysisCache | MemoryAnalysisCache = None) -> None:
+    """Run a command line in this process.
+
+    With `--profile` or `--profile-memory`, the phases of the run are printed to the standard error as JSON, see `foo2bar.profiling`.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    profiling, memory = profiling_requested(argv)
+    if not profiling:
+        return _run(argv, cache)
+    # unbound if profiling fails to start, in which case there is nothing to print
+    profiled_run = None
+    try:
+        with profile(memory=memory) as profiled_run:
+            return _run(argv, cache)
+    finally:
+        # printed even if the run fails, or exits after printing help
+        if profiled_run is not None:
+            print(json.dumps(profiled_run.to_dict(), indent=2), file=sys.stderr)
+
+
+def _run(argv: list, cache: AnalysisCache | MemoryAnalysisCache = None) -> None:
+    args = parse_arguments(argv, cache)
     logger.setLevel(logging.INFO)
     
     mapping = {k: v for k, v in args["arguments"].items() if v is not UNSET}
     
     if args["mode"] == "typed":
         mapping = {k: repr(v) for k, v in mapping.items()}
+
+    if args["scripts"] is not None:
+        base_dir, scripts = args["scripts"]
+        remainings = substitute_files(
+            scripts,
+            mapping=mapping,
+            output_dir=args["output_dir"],
+            base_dir=base_dir,
+            max_workers=args["jobs"],
+        )
+        for script, remaining in remainings.items():
+            if remaining:
+                logger.warning(f"{script}: Some variables were not substituted: " + ", ".join(remaining.keys()))
+        logger.info(f"{len(remainings)} scripts written to {args['output_dir']}")
+        return
+
+    if args["mode"] == "sweep":
+        manifest = sweep_global(
+            script=args["script"],
+            grid=dict(args["grid"]),
+            output_dir=args["output_dir"],
+            mapping=mapping,
+            analysis=args["analysis"],
+            max_workers=args["jobs"],
+            output_format=args["format"],
+        )
+        logger.info(f"{len(manifest)} scripts written to {args['output_dir']}")
+        return
     
-    new_script, remaining = substitute_global(
-        script=args["script"], 
-        mapping=mapping
-    )
+    if args["format"] == "full":
+        new_script, remaining = substitute_scopes(
+            script=args["script"], 
+            mapping=mapping,
+            analysis=args["analysis"],
+        )
+    else:
+        new_script, remaining = substitute_edits(
+            script=args["script"],
+            mapping=mapping,
+            analysis=args["analysis"],
+            output_format=args["format"],
+        )
     
     if remaining:
         logger.warning("Some variables were not substituted:" + ", ".join(remaining.keys()))
@@ -199,7 +491,8 @@ def main():
         args["output"].write_text(new_script)
         logger.info(f"Script written to {args['output']}")
     else:
-        print(new_script)
+        # diffs and edits end with a newline, unlike some scripts
+        print(new_script, end="" if args["format"] != "full" else "\n")
 
 def _test():
     args = parse_arguments(dtype_inference="both")
@@ -0,0 +1,191 @@
+"""
+This module formats the result of a substitution as the edits it makes to the source, rather than as the whole
+substituted code, which is much smaller when only a few values of a large script change.
+
+The output formats are:
+- `full`: the substituted code,
+- `diff`: a unified diff of the source and the substituted code, with 3 lines of context, like `diff -u`,
+- `patch`: the same diff, with `a/` and `b/` path prefixes, to be applied with `git apply` or `patch -p1`,
+- `json-edits`: a JSON list of `[start, end, replacement]` edits, spans being character offsets in the source.
+
+Diffs are built from the edits of a `SubstitutionTemplate`: only the lines holding edits are compared, so that the cost
+of a diff does not grow with the size of the script, unlike comparing both versions with `difflib.unified_diff`.
+"""
+
+import json
+from bisect import bisect_right
+from pathlib import Path
+from typing import Iterator
+
+from .template import NEWLINE_RE, TextEdit, apply_edits, line_offsets
+
+OUTPUT_FORMATS = ("full", "diff", "patch", "json-edits")
+
+# suffix appended to the name of the files holding each format
+OUTPUT_SUFFIXES = {"full": "", "diff": ".diff", "patch": ".patch", "json-edits": ".json"}
+
+# lines of context around changes, as in difflib and diff -u
+DIFF_CONTEXT = 3
+
+NO_NEWLINE_MARKER = "\\ No newline at end of file\n"
+
+
+def split_lines(text: str) -> list[str]:
+    """Split `text` into lines, line separators included, on the same separators as `line_offsets`."""
+    lines, position = [], 0
+    for match in NEWLINE_RE.finditer(text):
+        lines.append(text[position:match.end()])
+        position = match.end()
+    if position < len(text):
+        lines.append(text[position:])
+    return lines
+
+
+def _opcodes(source: str, edits: list[TextEdit], offsets: list[int]) -> Iterator[tuple[str, int, int, list[str], list[str]]]:
+    """Compare the lines of `source` before and after the edits, like `SequenceMatcher.get_opcodes`.
+
+    Edits on the same or on consecutive lines are grouped, and only the lines of each group are compared, the lines
+    between groups being equal. Unlike `get_opcodes`, changed ranges come with their old and new lines.
+    `offsets` are the line offsets of `source`.
+
+    Yields:
+        tuple[str, int, int, list[str], list[str]]: The tag, the start and end of the range in the lines of the source,
+            and the old and new lines of the range, which are only given for changed ranges.
+    """
+    # difflib is only needed for diffs, not at the startup of the command line
+    from difflib import SequenceMatcher
+
+    line_count = len(offsets) - 1 if offsets[-1] == len(source) else len(offsets)
+
+    def line_offset(line: int) -> int:
+        return offsets[line] if line < len(offsets) else len(source)
+
+    def group_opcodes(first: int, end: int, group: list[TextEdit]) -> Iterator[tuple]:
+        start = line_offset(first)
+        old_text = source[start:line_offset(end)]
+        new_text = apply_edits(old_text, [TextEdit(s - start, e - start, replacement) for s, e, replacement in group])
+        old_lines, new_lines = split_lines(old_text), split_lines(new_text)
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+            yield tag, first + i1, first + i2, old_lines[i1:i2], new_lines[j1:j2]
+
+    groups: list[tuple[int, int, list[TextEdit]]] = []
+    for edit in edits:
+        first = bisect_right(offsets, edit.start) - 1
+        end = max(bisect_right(offsets, edit.end - 1), first + 1)
+        if groups and first <= groups[-1][1]:
+            groups[-1] = (groups[-1][0], max(end, groups[-1][1]), groups[-1][2] + [edit])
+        else:
+            groups.append((first, end, [edit]))
+
+    line = 0
+    for first, end, group in groups:
+        if first > line:
+            yield "equal", line, first, [], []
+        yield from group_opcodes(first, end, group)
+        line = end
+    if line < line_count:
+        yield "equal", line, line_count, [], []
+
+
+def _format_range(start: int, stop: int) -> str:
+    """Range of lines in a hunk header, like `difflib.unified_diff`."""
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f"{start if length == 0 else start + 1},{length}"
+
+
+def unified_diff(source: str, edits: list[TextEdit], fromfile: str = "", tofile: str = "", context: int = DIFF_CONTEXT) -> str:
+    """Unified diff of `source` and of the code obtained by applying `edits` to it.
+
+    The diff is formatted like `difflib.unified_diff` on the lines of both versions, and usually identical, lines
+    being only compared around the edits. A `\\ No newline at end of file` marker follows the last line of the
+    source if needed, so that the diff can be applied as a patch.
+
+    Args:
+        source (str): The source the edits apply to.
+        edits (list[TextEdit]): The edits, sorted by start and without overlapping.
+        fromfile (str, optional): Name of the source in the header. Defaults to "".
+        tofile (str, optional): Name of the edited code in the header. Defaults to "".
+        context (int, optional): Number of unchanged lines around every change. Defaults to 3.
+
+    Returns:
+        str: The diff, empty if the edits change nothing.
+    """
+    offsets = line_offsets(source)
+    opcodes = []
+    for opcode in _opcodes(source, edits, offsets):
+        if opcode[1] == opcode[2] and not opcode[4]:
+            continue
+        # lines around and between groups of edits are a single equal range
+        if opcode[0] == "equal" and opcodes and opcodes[-1][0] == "equal":
+            opcodes[-1] = ("equal", opcodes[-1][1], opcode[2], [], [])
+        else:
+            opcodes.append(opcode)
+    if all(tag == "equal" for tag, *_ in opcodes):
+        return ""
+
+    def source_lines(start: int, stop: int) -> list[str]:
+        return split_lines(source[offsets[start]:offsets[stop] if stop < len(offsets) else len(source)])
+
+    # split opcodes into hunks around the changes, like SequenceMatcher.get_grouped_opcodes
+    if opcodes[0][0] == "equal":
+        tag, i1, i2, _, _ = opcodes[0]
+        opcodes[0] = tag, max(i1, i2 - context), i2, [], []
+    if opcodes[-1][0] == "equal":
+        tag, i1, i2, _, _ = opcodes[-1]
+        opcodes[-1] = tag, i1, min(i2, i1 + context), [], []
+    hunks, hunk = [], []
+    for tag, i1, i2, old_lines, new_lines in opcodes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            hunk.append((tag, i1, i1 + context, [], []))
+            hunks.append(hunk)
+            hunk = []
+            i1 = i2 - context
+        hunk.append((tag, i1, i2, old_lines, new_lines))
+    if hunk and not (len(hunk) == 1 and hunk[0][0] == "equal"):
+        hunks.append(hunk)
+
+    lines = [f"--- {fromfile}\n", f"+++ {tofile}\n"]
+    # position in the new lines, shifted by the changes before the current hunk
+    shift = 0
+    for hunk in hunks:
+        start, stop = hunk[0][1], hunk[-1][2]
+        new_length = sum(len(new_lines) if tag != "equal" else i2 - i1 for tag, i1, i2, _, new_lines in hunk)
+        lines.append(f"@@ -{_format_range(start, stop)} +{_format_range(start + shift, start + shift + new_length)} @@\n")
+        for tag, i1, i2, old_lines, new_lines in hunk:
+            if tag == "equal":
+                lines.extend(" " + line for line in source_lines(i1, i2))
+                continue
+            lines.extend("-" + line for line in old_lines)
+            lines.extend("+" + line for line in new_lines)
+        shift += new_length - (stop - start)
+    return "".join(line if line.endswith(("\n", "\r")) else line + "\n" + NO_NEWLINE_MARKER for line in lines)
+
+
+def format_edits(source: str, edits: list[TextEdit], output_format: str = "full", path: str | Path = "") -> str:
+    """Format the edits made to `source` by a substitution.
+
+    Args:
+        source (str): The source the edits apply to.
+        edits (list[TextEdit]): The edits, sorted by start and without overlapping, e.g. from `SubstitutionTemplate.render_edits`.
+        output_format (str, optional): One of `OUTPUT_FORMATS`. Defaults to "full".
+        path (str | Path, optional): Path of the script, named in the headers of diffs. Defaults to "".
+
+    Raises:
+        ValueError: Unknown output format.
+
+    Returns:
+        str: The substituted code, a diff or patch of the source, or the edits as JSON.
+    """
+    if output_format == "full":
+        return apply_edits(source, edits)
+    if output_format == "json-edits":
+        return json.dumps([list(edit) for edit in edits]) + "\n"
+    path = Path(path).as_posix() if path else ""
+    if output_format == "diff":
+        return unified_diff(source, edits, path, path)
+    if output_format == "patch":
+        path = path.lstrip("/")
+        return unified_diff(source, edits, f"a/{path}", f"b/{path}")
+    raise ValueError(f"output_format must be one of {OUTPUT_FORMATS!r}, not {output_format!r}")
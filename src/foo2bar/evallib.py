@@ -1,16 +1,32 @@
 
+import ast
 import builtins
 import logging
-from functools import wraps
-from typing import Any, Type
+from functools import cache, lru_cache, wraps
+from typing import Any, Callable, NamedTuple, Type
 
-import libcst as cst
-from libcst import matchers as m
-from RestrictedPython import compile_restricted_eval, safe_builtins, limited_builtins, utility_builtins
+from .profiling import profiled
 
+# libcst and RestrictedPython are imported when first needed, since they are slow to import
+
+# number of compiled expressions kept by safe_eval
+EVAL_CACHE_SIZE = 1024
+# number of evaluated annotations kept by annotation_eval
+ANNOTATION_CACHE_SIZE = 256
+
+
+@cache
+def _type_builtins() -> dict[str, Type]:
+    return {k:v for k,v in dict[str].items(builtins.__dict__) if isinstance(v, Type)}
+
+
+def __getattr__(name: str):
+    # type_builtins is built on first access
+    # this constant is not allcaps for naming consistency with RestrictedPython
+    if name == "type_builtins":
+        return _type_builtins()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# this constant is not allcaps for naming consistency with RestrictedPython
-type_builtins = {k:v for k,v in dict[str].items(builtins.__dict__) if isinstance(v, Type)}
 
 class SafeEvaluationError(Exception):
     def __init__(self, expression: str, *args, **kwargs):
@@ -26,49 +42,289 @@ def _concat_globals(*dicts: dict[str, Any]) -> dict[str, Any]:
     return {'__builtins__': concat}
 
 
+def node_contains_call(node) -> bool:
+    """Whether a libcst node contains a call, the node itself included."""
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if type(node).__name__ == "Call":
+            return True
+        nodes.extend(node.children)
+    return False
+
+
 def expression_contains_call(expr: str) -> bool:
-    return bool(m.findall(cst.parse_expression(expr), m.Call()))
+    import libcst as cst
+
+    return node_contains_call(cst.parse_expression(expr))
+
+
+def _eval_annotation(annotation: str, locals: dict[str] = None) -> Type:
+    return eval(annotation, _concat_globals(_type_builtins()), locals)
 
 
-def annotation_eval(annotation: str, locals: dict[str] = None) -> Type:
-    if expression_contains_call(annotation):
+def _check_no_call(node) -> None:
+    if node_contains_call(node):
         raise ValueError("Calls inside annotations are not supported for security reasons.")
-    return eval(annotation, _concat_globals(type_builtins), locals)
 
 
-def safe_eval(expr: str, locals: dict[str] = None):
-    """Safely evaluate an expression."""
+class _Failure(NamedTuple):
+    """An error reduced as for pickling, i.e. without its traceback and the frames it holds, to raise a new error
+    each time."""
+
+    reconstruct: Callable[..., Exception]
+    args: tuple
+    state: dict | None = None
+
+    @classmethod
+    def from_error(cls, error: Exception) -> "_Failure":
+        return cls(*error.__reduce_ex__(2)[:3])
+
+    def error(self) -> Exception:
+        error = self.reconstruct(*self.args)
+        if self.state:
+            error.__dict__.update(self.state)
+        return error
+
+
+def _outcome(function, *args) -> tuple[Any, _Failure | None]:
+    try:
+        return function(*args), None
+    except Exception as e:
+        return None, _Failure.from_error(e)
+
+
+def _parse_and_eval_annotation(annotation: str, locals: dict[str] = None) -> Type:
+    import libcst as cst
+
+    _check_no_call(cst.parse_expression(annotation))
+    return _eval_annotation(annotation, locals)
+
+
+# outcomes are cached, be it a type or a failure, since unresolvable annotations repeat as well
+
+@lru_cache(maxsize=ANNOTATION_CACHE_SIZE)
+def _resolve_annotation_code(annotation: str) -> tuple[Type | None, _Failure | None]:
+    return _outcome(_parse_and_eval_annotation, annotation)
+
+
+@lru_cache(maxsize=ANNOTATION_CACHE_SIZE)
+def _resolve_checked_annotation(annotation: str) -> tuple[Type | None, _Failure | None]:
+    """Evaluate an annotation whose node was already checked for calls."""
+    return _outcome(_eval_annotation, annotation)
+
+
+def annotation_cache_info() -> dict[str, Any]:
+    """Statistics of the caches of `annotation_eval`, for annotations given as code and as nodes, as returned by `functools.lru_cache`."""
+    return {"code": _resolve_annotation_code.cache_info(), "nodes": _resolve_checked_annotation.cache_info()}
+
+
+def annotation_cache_clear() -> None:
+    """Empty the caches of `annotation_eval`."""
+    _resolve_annotation_code.cache_clear()
+    _resolve_checked_annotation.cache_clear()
+
+
+def annotation_eval(annotation, locals: dict[str] = None) -> Type:
+    """Evaluate a type annotation, given as source code or as a libcst expression node, with builtin types only.
+
+    Annotations containing calls are rejected. Without `locals`, the outcome is cached per annotation, so that
+    annotations repeated across parameters and scripts are parsed and evaluated once. Nodes are checked for calls
+    as they are, without parsing their code again.
+
+    Raises:
+        ValueError: The annotation contains a call.
+    """
+    if isinstance(annotation, str):
+        if locals is not None:
+            return _parse_and_eval_annotation(annotation, locals)
+        dtype, failure = _resolve_annotation_code(annotation)
+    else:
+        from .node_converter import node_to_string
+
+        _check_no_call(annotation)
+        if locals is not None:
+            return _eval_annotation(node_to_string(annotation), locals)
+        dtype, failure = _resolve_checked_annotation(node_to_string(annotation))
+    if failure is not None:
+        raise failure.error()
+    return dtype
+
+
+@cache
+def _restricted_builtins() -> dict[str, Any]:
+    from RestrictedPython import safe_builtins, limited_builtins, utility_builtins
+
+    return _concat_globals(safe_builtins, limited_builtins, utility_builtins)["__builtins__"]
+
+
+@lru_cache(maxsize=EVAL_CACHE_SIZE)
+def _compile_restricted_eval(expr: str):
+    """Compile an expression with RestrictedPython, caching the result, be it code or errors."""
+    from RestrictedPython import compile_restricted_eval
+
+    return compile_restricted_eval(expr)
+
+
+def eval_cache_info():
+    """Statistics of the cache of expressions compiled by `safe_eval`, as returned by `functools.lru_cache`."""
+    return _compile_restricted_eval.cache_info()
+
+
+def eval_cache_clear() -> None:
+    """Empty the cache of expressions compiled by `safe_eval`."""
+    _compile_restricted_eval.cache_clear()
+
+
+def _literal_elements(node) -> list:
+    values = []
+    for element in node.elements:
+        if type(element).__name__ != "Element":
+            raise ValueError(f"Not a literal element: {type(element).__name__}")
+        values.append(literal_eval_node(element.value))
+    return values
+
+
+def _literal_dict(node) -> dict:
+    values = {}
+    for element in node.elements:
+        if type(element).__name__ != "DictElement":
+            raise ValueError(f"Not a literal element: {type(element).__name__}")
+        values[literal_eval_node(element.key)] = literal_eval_node(element.value)
+    return values
+
+
+def _literal_number(node) -> int | float | complex:
+    if type(node).__name__ not in ("Integer", "Float", "Imaginary"):
+        raise ValueError(f"Not a number: {type(node).__name__}")
+    return node.evaluated_value
+
+
+def _literal_signed_number(node) -> int | float | complex:
+    if type(node).__name__ == "UnaryOperation":
+        return _literal_unary_operation(node)
+    return _literal_number(node)
+
+
+def _literal_unary_operation(node) -> int | float | complex:
+    operator = type(node.operator).__name__
+    if operator == "Minus":
+        return -_literal_number(node.expression)
+    if operator == "Plus":
+        return +_literal_number(node.expression)
+    raise ValueError(f"Not a literal operator: {operator}")
+
+
+def _literal_binary_operation(node) -> complex:
+    # like ast.literal_eval, only complex numbers such as `1 + 2j` are literal binary operations
+    operator = type(node.operator).__name__
+    left, right = _literal_signed_number(node.left), _literal_number(node.right)
+    if type(left) not in (int, float) or type(right) is not complex:
+        raise ValueError("Only complex numbers are literal binary operations")
+    if operator == "Add":
+        return left + right
+    if operator == "Subtract":
+        return left - right
+    raise ValueError(f"Not a literal operator: {operator}")
+
+
+def _literal_name(node):
+    constants = {"None": None, "True": True, "False": False}
+    if node.value not in constants:
+        raise ValueError(f"Not a literal name: {node.value}")
+    return constants[node.value]
+
+
+def _literal_concatenated_string(node) -> str | bytes:
+    try:
+        return literal_eval_node(node.left) + literal_eval_node(node.right)
+    except TypeError as e:
+        # bytes concatenated with str
+        raise ValueError(str(e)) from e
+
+
+# libcst node types are matched by name, so that libcst does not need to be imported
+_LITERAL_EVALUATORS = {
+    "Integer": lambda node: node.evaluated_value,
+    "Float": lambda node: node.evaluated_value,
+    "Imaginary": lambda node: node.evaluated_value,
+    "SimpleString": lambda node: node.evaluated_value,
+    "ConcatenatedString": _literal_concatenated_string,
+    "Name": _literal_name,
+    "UnaryOperation": _literal_unary_operation,
+    "BinaryOperation": _literal_binary_operation,
+    "List": _literal_elements,
+    "Tuple": lambda node: tuple(_literal_elements(node)),
+    "Set": lambda node: set(_literal_elements(node)),
+    "Dict": _literal_dict,
+}
+
+
+def literal_eval_node(node):
+    """Evaluate a libcst expression node made of literals, like `ast.literal_eval` does for source strings.
+
+    Numbers, strings, bytes, booleans, None, and lists, tuples, sets and dicts of literals are evaluated
+    directly from the node, without generating its code.
+
+    Raises:
+        ValueError: The node is not a literal.
+    """
+    evaluator = _LITERAL_EVALUATORS.get(type(node).__name__)
+    if evaluator is None:
+        raise ValueError(f"Not a literal: {type(node).__name__}")
+    return evaluator(node)
+
+
+@profiled("safe_eval")
+def safe_eval(expr, locals: dict[str] = None):
+    """Safely evaluate an expression, given as source code or as a libcst expression node.
+
+    Literals are evaluated with `ast.literal_eval`, or `literal_eval_node` for nodes, which are safe and do not require
+    RestrictedPython. Other expressions are compiled with RestrictedPython once, and the compiled code is cached.
+    """
+    if not isinstance(expr, str):
+        try:
+            return literal_eval_node(expr)
+        except (ValueError, TypeError, RecursionError):
+            pass
+        from .node_converter import node_to_string
+
+        expr = node_to_string(expr)
+
+    try:
+        return ast.literal_eval(expr)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        pass
+
     try:
-        compiled = compile_restricted_eval(expr)
+        compiled = _compile_restricted_eval(expr)
         if compiled.errors:
             raise SyntaxError(compiled.errors)
-        return eval(
-            compiled.code, 
-            _concat_globals(safe_builtins, limited_builtins, utility_builtins),
-            locals
-        )
+        # a new globals dictionary per call, since assignment expressions write to it
+        return eval(compiled.code, {"__builtins__": _restricted_builtins()}, locals)
     except Exception as e:
         raise SafeEvaluationError(expr) from e
     
 
-def safe_type_eval(expr: str, locals: dict[str] = None) -> Type:
-    """Safely evaluate the data type of a given expression."""
+def safe_type_eval(expr, locals: dict[str] = None) -> Type:
+    """Safely evaluate the data type of a given expression, given as source code or as a libcst expression node."""
     return type(safe_eval(expr, locals))
 
 
-def try_safe_type_eval(expr: str, locals: dict[str] = None) -> Type | None:
+def try_safe_type_eval(expr, locals: dict[str] = None) -> Type | None:
     try:
         return safe_type_eval(expr, locals=locals)
     except Exception as e:
-        logging.debug(f"Unable to evaluate dtype from '{expr}': {e}")
+        # expr may be a node, whose representation is only worth building when debugging
+        logging.debug("Unable to evaluate dtype from %r: %s", expr, e)
         return None
 
 
-def try_annotation_eval(expr: str, locals: dict[str]=None) -> Type | None:
+def try_annotation_eval(expr, locals: dict[str]=None) -> Type | None:
     try:
         return annotation_eval(expr, locals=locals)
     except Exception as e:
-        logging.debug(f"Unable to evaluate dtype from annotation '{expr}': {e}")
+        logging.debug("Unable to evaluate dtype from annotation %r: %s", expr, e)
         return None
 
 
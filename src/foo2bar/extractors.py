@@ -0,0 +1,88 @@
+"""
+This module extracts substitutable assignments with plain attribute checks, following the semantics of `statement_matcher`.
+
+Matchers are interpreted node by node each time they are evaluated, which dominates the analysis of large scripts.
+`extract_assignement` decides in one go whether a statement line is a substitutable assignment, and returns its name,
+annotation, value and comment. `AssignementExtractor` collects them from a module without visiting expressions.
+"""
+
+from typing import Mapping, NamedTuple
+
+import libcst as cst
+from libcst import metadata
+
+from .matchers import NO_PARAM_PATTERN
+from .profiling import phase
+from .providers import FirstAssignInScopeProvider, SkipExpressionsMixin
+
+
+class AssignementData(NamedTuple):
+    """What `statement_matcher` saves from a matching statement line."""
+
+    name: str
+    annotation: cst.BaseExpression | None
+    value: cst.BaseExpression | None
+    comment: str | None
+
+
+def extract_assignement(
+    node: cst.SimpleStatementLine, first_assigns: Mapping[cst.CSTNode, bool]
+) -> AssignementData | None:
+    """Extract the data of a substitutable assignment, like `m.extract(node, statement_matcher)`.
+
+    Args:
+        node (cst.SimpleStatementLine): The statement line to extract data from.
+        first_assigns (Mapping[cst.CSTNode, bool]): The metadata computed by `FirstAssignInScopeProvider`.
+
+    Returns:
+        AssignementData | None: The data of the assignment, or None if the statement line does not match.
+    """
+    if len(node.body) != 1:
+        return None
+    statement = node.body[0]
+    if isinstance(statement, cst.Assign):
+        if len(statement.targets) != 1:
+            return None
+        target = statement.targets[0].target
+        annotation = None
+    elif isinstance(statement, cst.AnnAssign):
+        target = statement.target
+        annotation = statement.annotation.annotation
+    else:
+        return None
+    if not isinstance(target, cst.Name) or first_assigns.get(target) is not True:
+        return None
+
+    comment = node.trailing_whitespace.comment
+    if comment is not None:
+        if NO_PARAM_PATTERN.fullmatch(comment.value):
+            return None
+        comment = comment.value
+    return AssignementData(target.value, annotation, statement.value, comment)
+
+
+class AssignementExtractor(SkipExpressionsMixin, cst.CSTVisitor):
+    """Collect every substitutable assignment of a module, in code order, along with its statement line."""
+
+    METADATA_DEPENDENCIES = (FirstAssignInScopeProvider,)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.assignements: list[tuple[cst.SimpleStatementLine, AssignementData]] = []
+
+    def visit_SimpleStatementLine(self, node: cst.SimpleStatementLine) -> bool:
+        data = extract_assignement(node, self.metadata[FirstAssignInScopeProvider])
+        if data is not None:
+            self.assignements.append((node, data))
+        # simple statements do not contain other statements
+        return False
+
+
+def extract_assignements(
+    metadata_wrapper: metadata.MetadataWrapper,
+) -> list[tuple[cst.SimpleStatementLine, AssignementData]]:
+    """Extract every substitutable assignment of a module, like `m.extractall(metadata_wrapper, statement_matcher)`."""
+    extractor = AssignementExtractor()
+    with phase("extract"):
+        metadata_wrapper.visit(extractor)
+    return extractor.assignements
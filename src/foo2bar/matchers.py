@@ -10,53 +10,83 @@ However, if the trailing line comment contains the phrase "no param", the full s
 """
 
 import re
-from libcst import matchers as m, metadata
-from .providers import FirstAssignInScopeProvider
+from functools import cache
 
-assign_name = m.Name(
-    # Save the name of the variable
-    value=m.SaveMatchedNode(m.DoNotCare(), "name"),
-    # We care only about first occurence of a variable name in a given scope
-    metadata=m.MatchMetadata(FirstAssignInScopeProvider, True),
-)
+# A comment containing "no param" should not be saved
+NO_PARAM_PATTERN = re.compile(r".*no param.*", re.IGNORECASE)
 
-# Save the type of the variable when explicitly annotated
-assign_type = m.Annotation(annotation=m.SaveMatchedNode(m.DoNotCare(), "annotation"))
 
-# Save the value node assigned to the variable to replace it later
-assign_value = m.SaveMatchedNode(m.DoNotCare(), "value")
+@cache
+def _build_matchers() -> dict:
+    """Build the matchers on first use, since importing libcst.matchers is slow."""
+    from libcst import matchers as m
+    from .providers import FirstAssignInScopeProvider
+
+    assign_name = m.Name(
+        # Save the name of the variable
+        value=m.SaveMatchedNode(m.DoNotCare(), "name"),
+        # We care only about first occurence of a variable name in a given scope
+        metadata=m.MatchMetadata(FirstAssignInScopeProvider, True),
+    )
+
+    # Save the type of the variable when explicitly annotated
+    assign_type = m.Annotation(annotation=m.SaveMatchedNode(m.DoNotCare(), "annotation"))
+
+    # Save the value node assigned to the variable to replace it later
+    assign_value = m.SaveMatchedNode(m.DoNotCare(), "value")
+
+    no_param = m.MatchRegex(NO_PARAM_PATTERN)
+    # Save the comment if it does not contain "no param"
+    comment = m.Comment(value=m.SaveMatchedNode(m.DoesNotMatch(no_param), "comment"))
+    # If no comment is present, save None
+    no_comment = m.SaveMatchedNode(None, "comment")
+
+    # Match an assignment statement, be it annotated or not
+    assign_matcher = m.Assign(
+        targets=[m.AssignTarget(target=assign_name)], value=assign_value
+    )
+    ann_assign_matcher = m.AnnAssign(
+        target=assign_name, annotation=assign_type, value=assign_value
+    )
+
+    statement_matcher = m.SimpleStatementLine(
+        body=[m.OneOf(assign_matcher, ann_assign_matcher)],
+        trailing_whitespace=m.OneOf(
+            m.TrailingWhitespace(comment=comment),
+            m.TrailingWhitespace(comment=no_comment),
+        ),
+    )
+
+    return {
+        "assign_name": assign_name,
+        "assign_type": assign_type,
+        "assign_value": assign_value,
+        "no_param": no_param,
+        "comment": comment,
+        "no_comment": no_comment,
+        "assign_matcher": assign_matcher,
+        "ann_assign_matcher": ann_assign_matcher,
+        "statement_matcher": statement_matcher,
+    }
+
+
+def __getattr__(name: str):
+    # the matchers are module attributes, built on first access
+    matchers = _build_matchers()
+    if name in matchers:
+        return matchers[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# A comment containing "no param" should not be saved
-no_param = m.MatchRegex(re.compile(r".*no param.*", re.IGNORECASE))
-# Save the comment if it does not contain "no param"
-comment = m.Comment(value=m.SaveMatchedNode(m.DoesNotMatch(no_param), "comment"))
-# If no comment is present, save None
-no_comment = m.SaveMatchedNode(None, "comment")
-
-# Match an assignment statement, be it annotated or not
-assign_matcher = m.Assign(
-    targets=[m.AssignTarget(target=assign_name)], value=assign_value
-)
-ann_assign_matcher = m.AnnAssign(
-    target=assign_name, annotation=assign_type, value=assign_value
-)
-
-statement_matcher = m.SimpleStatementLine(
-    body=[m.OneOf(assign_matcher, ann_assign_matcher)],
-    trailing_whitespace=m.OneOf(
-        m.TrailingWhitespace(comment=comment),
-        m.TrailingWhitespace(comment=no_comment),
-    ),
-)
 
 def _test():
     import libcst as cst
+    from libcst import matchers as m, metadata
     from pathlib import Path
-    from node_converter import resolve_scope_name
     code = cst.parse_module(Path("test_data/test_script.py").read_text())
     wrapper = metadata.MetadataWrapper(code)
-    matches = m.extractall(wrapper, statement_matcher)
-    print([type(m["scope"]) for m in matches])
+    # module attributes built by __getattr__ are not globals of the module itself
+    matches = m.extractall(wrapper, _build_matchers()["statement_matcher"])
+    print([match["name"] for match in matches])
     
     
 if __name__ == "__main__":
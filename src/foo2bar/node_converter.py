@@ -1,7 +1,14 @@
-from functools import cache
+from typing import Iterable
 
 import libcst as cst
 from libcst import metadata
+from libcst._nodes.internal import CodegenState
+
+from .profiling import phase
+from .providers import NestedScope
+
+# scopes of libcst.metadata.ScopeProvider or ScopeNestingProvider
+AnyScope = metadata.Scope | NestedScope
 
 
 class UnnamedScopeError(ValueError):
@@ -12,6 +19,117 @@ def node_to_string(node: cst.CSTNode) -> str:
     return cst.Module(body=[node]).code
 
 
+def expression_to_string(expression: cst.BaseExpression, indent: str = "") -> str:
+    """Render an expression as in a statement indented by `indent`, whose lines continued within brackets libcst
+    indents as well, e.g. `[1,\n 2]` gives `[1,\n     2]` in the body of a class indented by 4 spaces."""
+    if not indent:
+        return node_to_string(expression)
+    header = "if _:\n"
+    statement = cst.SimpleStatementLine([cst.Expr(expression)])
+    module = cst.Module(body=[cst.If(test=cst.Name("_"), body=cst.IndentedBlock([statement], indent=indent))])
+    return module.code[len(header) + len(indent):-len(module.default_newline)]
+
+
+class _SpanRecordingCodegenState(CodegenState):
+    """Code generation state recording the character span of every node, whitespace owned by the node included.
+
+    This gives the same spans as `metadata.WhitespaceInclusivePositionProvider`, without building positions for every node.
+    It relies on the internal `CodegenState` of the pinned libcst version, and is tested against the provider.
+    """
+
+    def __init__(self, default_indent: str, default_newline: str) -> None:
+        super().__init__(default_indent, default_newline)
+        self.length = 0
+        self.starts: dict[cst.CSTNode, int] = {}
+        self.spans: dict[cst.CSTNode, tuple[int, int]] = {}
+
+    def add_indent_tokens(self) -> None:
+        self.tokens.extend(self.indent_tokens)
+        self.length += sum(map(len, self.indent_tokens))
+
+    def add_token(self, value: str) -> None:
+        self.tokens.append(value)
+        self.length += len(value)
+
+    def pop_trailing_newline(self) -> None:
+        if self.tokens:
+            end = self.length
+            self.length -= len(self.tokens.pop())
+            # the last nodes end with the popped newline, which is not part of the source
+            for node in reversed(self.spans):
+                start, node_end = self.spans[node]
+                if node_end != end:
+                    break
+                self.spans[node] = (min(start, self.length), self.length)
+
+    def before_codegen(self, node: cst.CSTNode) -> None:
+        self.starts[node] = self.length
+
+    def after_codegen(self, node: cst.CSTNode) -> None:
+        self.spans[node] = (self.starts.pop(node), self.length)
+
+
+class SourceRenderer:
+    """Render nodes of a module as strings, by slicing the source of the module instead of generating code.
+
+    Code is only generated for nodes that do not belong to the module, such as substituted values, and for statements
+    preceded by comments or empty lines, whose indentation differs. Statements are rendered like `node_to_string`
+    up to the indentation of their first line. Strings are cached per node.
+
+    The spans of all nodes are recorded in a single code generation pass, on first use.
+
+    Args:
+        module (cst.Module): The module whose nodes to render.
+        source (str, optional): The source of the module, if known. Defaults to generating it along with the spans.
+    """
+
+    def __init__(self, module: cst.Module, source: str = None) -> None:
+        self._module = module
+        self._source = source
+        self._spans: dict[cst.CSTNode, tuple[int, int]] | None = None
+        self._strings: dict[cst.CSTNode, str] = {}
+
+    @property
+    def source(self) -> str:
+        if self._source is None:
+            self._record_spans()
+        return self._source
+
+    def _record_spans(self) -> None:
+        state = _SpanRecordingCodegenState(self._module.default_indent, self._module.default_newline)
+        with phase("codegen.spans"):
+            self._module._codegen(state)
+        self._spans = state.spans
+        if self._source is None:
+            self._source = "".join(state.tokens)
+
+    def span(self, node: cst.CSTNode) -> tuple[int, int]:
+        """Character span of a node of the module in the source, whitespace owned by the node included.
+
+        Raises:
+            KeyError: The node does not belong to the module.
+        """
+        if self._spans is None:
+            self._record_spans()
+        return self._spans[node]
+
+    def __call__(self, node: cst.CSTNode) -> str:
+        string = self._strings.get(node)
+        if string is None:
+            string = self._strings[node] = self._render(node)
+        return string
+
+    def _render(self, node: cst.CSTNode) -> str:
+        if getattr(node, "leading_lines", None):
+            return node_to_string(node)
+        try:
+            start, end = self.span(node)
+        except KeyError:
+            # not a node of the module
+            return node_to_string(node)
+        return self.source[start:end]
+
+
 def scope_name_is_resolvable(scope):
     try:
         resolve_scope_name(scope)
@@ -26,8 +144,14 @@ def try_resolve_scope_name(scope) -> str | None:
     except UnnamedScopeError:
         return None
 
-@cache
-def resolve_scope_name(scope: metadata.Scope) -> str:
+
+def _is_global_scope(scope: AnyScope) -> bool:
+    if isinstance(scope, NestedScope):
+        return scope.kind == NestedScope.GLOBAL
+    return isinstance(scope, metadata.GlobalScope)
+
+
+def resolve_scope_name(scope: AnyScope) -> str:
     """Resolve scope path as a dot-separated chain of child scope names.
     
     This function differs from what `libcst.metadata.QualifiedNameProvider` can provide \
@@ -44,7 +168,7 @@ def resolve_scope_name(scope: metadata.Scope) -> str:
         resolving the scope name of `baz` returns `"Foo.bar.baz"`
     
     Args:
-        scope (metadata.Scope): The libcst.metadata.Scope object to be resolved.
+        scope (AnyScope): The scope to be resolved, given by `libcst.metadata.ScopeProvider` or `ScopeNestingProvider`.
         
     Raises:
         UnnamedScopeError: The provided scope or one of its parent scopes is not named, e.g. `lambda` function scopes.
@@ -55,14 +179,14 @@ def resolve_scope_name(scope: metadata.Scope) -> str:
     return _resolve_scope_name(scope)
 
 
-def _resolve_scope_name(scope: metadata.Scope, children: str = "") -> str:
+def _resolve_scope_name(scope: AnyScope, children: str = "") -> str:
     """Recursive implementation of resolve_scope_name"""
-    if isinstance(scope, metadata.GlobalScope):
+    if _is_global_scope(scope):
         return children
     elif getattr(scope, "name", None) is None:
         # if scope.name is undefined OR explicitly set to None
         raise UnnamedScopeError(
-            f"Cannot resolve name for unnamed scope: '{scope._name_prefix}'"
+            f"Cannot resolve name for unnamed scope of a {type(scope.node).__name__} node"
         )
     else:
         if not children:
@@ -70,3 +194,36 @@ def _resolve_scope_name(scope: metadata.Scope, children: str = "") -> str:
         else:
             new_children = f"{scope.name}.{children}"
         return _resolve_scope_name(scope.parent, new_children)
+
+
+def resolve_scope_names(scopes: Iterable[AnyScope]) -> dict[AnyScope, str | None]:
+    """Resolve the names of many scopes at once, like `try_resolve_scope_name`.
+
+    The name of each scope is built from the name of its parent, so that every scope of the tree is resolved only once,
+    from the global scope down. The table holds the given scopes and their ancestors, and lives as long as it is referenced.
+
+    Args:
+        scopes (Iterable[AnyScope]): The scopes to resolve.
+
+    Returns:
+        dict[AnyScope, str | None]: The name of every scope, or None if it or one of its parent scopes is not named.
+    """
+    names: dict[AnyScope, str | None] = {}
+
+    def resolve(scope: AnyScope) -> str | None:
+        if scope in names:
+            return names[scope]
+        if _is_global_scope(scope):
+            name = ""
+        elif getattr(scope, "name", None) is None:
+            name = None
+        elif (parent_name := resolve(scope.parent)) is None:
+            name = None
+        else:
+            name = f"{parent_name}.{scope.name}" if parent_name else scope.name
+        names[scope] = name
+        return name
+
+    for scope in scopes:
+        resolve(scope)
+    return names
@@ -0,0 +1,133 @@
+"""
+This module times the phases of foo2bar, e.g. reading a script, parsing it or resolving its metadata, and optionally
+measures the peak memory they allocate with `tracemalloc`.
+
+Phases are only recorded while a profile is collected in the current context, with `profile()`:
+
+```python
+with profile(memory=True) as collected:
+    CodeWrapper.from_file("script.py").analyze_assigns()
+print(collected.to_dict())
+```
+
+Profiles are held by a context variable, so that concurrent requests of a server, or tasks of an event loop, each collect
+their own. Phases run in worker processes are not collected. Outside of a profile, entering a phase only costs a lookup of
+the context variable.
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Iterator
+
+
+class Profile:
+    """Time spent in every phase, along with the number of times it was entered and, if measured, its peak memory.
+
+    Phases may be nested, e.g. `safe_eval` is called while building command line options, in which case the time and
+    memory of the inner phase are counted in the outer phase as well.
+
+    Args:
+        memory (bool, optional): Whether to measure the peak memory allocated during every phase. Defaults to False.
+    """
+
+    def __init__(self, memory: bool = False) -> None:
+        self.memory = memory
+        self.seconds: float | None = None
+        self.phases: dict[str, dict[str, int | float]] = {}
+        # traced memory when every open phase was entered, and peak memory of the phases it contains
+        self._memory_stack: list[list[int]] = []
+
+    def _enter(self) -> None:
+        if not self.memory:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        if self._memory_stack:
+            # the peak is reset for the inner phase, it is kept for the outer phase
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._memory_stack.append([current, current])
+
+    def _exit(self, name: str, seconds: float) -> None:
+        stats = self.phases.setdefault(name, {"calls": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        if not self.memory:
+            return
+        start, inner_peak = self._memory_stack.pop()
+        peak = max(tracemalloc.get_traced_memory()[1], inner_peak)
+        if self._memory_stack:
+            self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak)
+        stats["peak_memory"] = max(stats.get("peak_memory", 0), peak - start)
+
+    def to_dict(self) -> dict:
+        """Total time and statistics of every phase, in the order phases were first left, ready to be dumped as JSON.
+
+        Times are in seconds and peak memory, allocated above the memory in use when the phase was entered, in bytes.
+        """
+        return {
+            "seconds": self.seconds,
+            "phases": {name: dict(stats) for name, stats in self.phases.items()},
+        }
+
+
+_current_profile: ContextVar[Profile | None] = ContextVar("foo2bar_profile", default=None)
+
+
+def current_profile() -> Profile | None:
+    """The profile collected in the current context, if any."""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile(memory: bool = False) -> Iterator[Profile]:
+    """Collect the phases run in the current context.
+
+    Args:
+        memory (bool, optional): Whether to measure peak memory, tracing allocations if they are not traced yet.
+            Defaults to False.
+
+    Yields:
+        Profile: The profile, whose total time is set on exit.
+    """
+    collected = Profile(memory)
+    start_tracing = memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    token = _current_profile.set(collected)
+    start = time.perf_counter()
+    try:
+        yield collected
+    finally:
+        collected.seconds = time.perf_counter() - start
+        _current_profile.reset(token)
+        if start_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Record the time spent in the block as the phase `name` of the current profile, if any."""
+    collected = _current_profile.get()
+    if collected is None:
+        yield
+        return
+    collected._enter()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        collected._exit(name, time.perf_counter() - start)
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    """Decorator recording every call of a function as the phase `name` of the current profile, if any."""
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
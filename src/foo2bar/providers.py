@@ -1,26 +1,150 @@
 """
-This module defines a metadata provider that saves whether a name occurs for the first time in a given scope.
+This module defines the metadata providers used to analyze and substitute assignments.
+
+`ScopeNestingProvider` saves the scope of every statement and assignment target, tracking only how modules, classes
+and functions nest, unlike `libcst.metadata.ScopeProvider` which also records every assignment and access of a name.
+`FirstAssignInScopeProvider` saves whether a name occurs for the first time in a given scope.
+
+Both providers only visit statements, since expressions contain neither statements nor assignment targets, so that
+their cost does not grow with the size of the expressions of a module.
 """
 
 import libcst as cst
-from libcst.metadata import BatchableMetadataProvider, ScopeProvider, Scope
-
-class FirstAssignInScopeProvider(BatchableMetadataProvider):
-    METADATA_DEPENDENCIES = (ScopeProvider, )
-    
-    def visit_Module(self, module: cst.Module) -> None:
-        self._visited_names_in_scope = dict[Scope, set[cst.Name]]()
-    
-    def visit_AssignTarget_target(self, assign: cst.AssignTarget) -> None:
-        self._visit_assign_target(assign.target)
-        
-    def visit_AnnAssign_target(self, ann_assign: cst.AnnAssign) -> None:
-        self._visit_assign_target(ann_assign.target)
-    
-    def _visit_assign_target(self, name: cst.Name):
-        scope = self.get_metadata(ScopeProvider, name, None)
+from libcst.metadata import BaseMetadataProvider
+
+
+class NestedScope:
+    """Lightweight counterpart of `libcst.metadata.Scope`, which only knows its kind, name and parent.
+
+    Args:
+        kind (str): `GLOBAL`, `CLASS`, `FUNCTION`, or `ANNOTATION` for the type parameters of a generic class or function.
+        node (cst.CSTNode): The module, class or function defining the scope.
+        parent (NestedScope, optional): The enclosing scope, None for the global scope. Defaults to None.
+        name (str, optional): The name of the class or function, None for the global and annotation scopes. Defaults to None.
+    """
+
+    GLOBAL = "global"
+    CLASS = "class"
+    FUNCTION = "function"
+    ANNOTATION = "annotation"
+
+    __slots__ = ("kind", "node", "parent", "name", "__weakref__")
+
+    def __init__(self, kind: str, node: cst.CSTNode, parent: "NestedScope" = None, name: str = None) -> None:
+        self.kind = kind
+        self.node = node
+        self.parent = parent
+        self.name = name
+
+    def __repr__(self):
+        return f"<NestedScope {self.kind} {self.name!r}>"
+
+    def is_class_body(self) -> bool:
+        """Whether the scope is the body of a class nested in classes only, type parameters aside."""
+        if self.kind != self.CLASS:
+            return False
+        parent = self.parent
+        while parent.kind != self.GLOBAL:
+            if parent.kind == self.FUNCTION:
+                return False
+            parent = parent.parent
+        return True
+
+
+class SkipExpressionsMixin:
+    """Skip the expressions of a module in a visitor or transformer looking for statements, since expressions do not
+    contain statements. Expressions are left, as nodes whose visit returned False."""
+
+    def on_visit(self, node: cst.CSTNode) -> bool:
+        if isinstance(node, cst.BaseExpression):
+            return False
+        return super().on_visit(node)
+
+
+class _StatementVisitor(SkipExpressionsMixin, cst.CSTVisitor):
+    """Visit the statements of a module, skipping expressions, and the bodies of classes and functions in their own scope."""
+
+    def __init__(self, provider: BaseMetadataProvider) -> None:
+        super().__init__()
+        self.provider = provider
+        self.scope: NestedScope | None = None
+
+    def visit_Module(self, node: cst.Module) -> None:
+        self.scope = NestedScope(NestedScope.GLOBAL, node)
+
+    def visit_FunctionDef(self, node: cst.FunctionDef) -> bool:
+        self._visit_body(node, NestedScope.FUNCTION)
+        return False
+
+    def visit_ClassDef(self, node: cst.ClassDef) -> bool:
+        self._visit_body(node, NestedScope.CLASS)
+        return False
+
+    def _visit_body(self, node: cst.FunctionDef | cst.ClassDef, kind: str) -> None:
+        parent = self.scope
+        if node.type_parameters is not None:
+            self.scope = NestedScope(NestedScope.ANNOTATION, node, self.scope)
+        self.scope = NestedScope(kind, node, self.scope, node.name.value)
+        node.body.visit(self)
+        self.scope = parent
+
+
+class _ScopeNestingVisitor(_StatementVisitor):
+    def on_visit(self, node: cst.CSTNode) -> bool:
+        # the module is saved once its scope is created
+        if not isinstance(node, (cst.BaseExpression, cst.Module)):
+            # definitions belong to the scope they are defined in, not to the scope they define
+            self.provider.set_metadata(node, self.scope)
+        return super().on_visit(node)
+
+    def visit_Module(self, node: cst.Module) -> None:
+        super().visit_Module(node)
+        self.provider.set_metadata(node, self.scope)
+
+    def visit_AssignTarget(self, node: cst.AssignTarget) -> bool:
+        self.provider.set_metadata(node.target, self.scope)
+        return False
+
+    def visit_AnnAssign(self, node: cst.AnnAssign) -> bool:
+        self.provider.set_metadata(node.target, self.scope)
+        return False
+
+
+class ScopeNestingProvider(BaseMetadataProvider[NestedScope]):
+    """Save the `NestedScope` of statements and assignment targets, and of the other nodes that are not expressions.
+
+    Scopes are created in code order, and named like the scopes of `libcst.metadata.ScopeProvider`, so that
+    `resolve_scope_name` gives the same names for both. Lambdas and comprehensions, which define unnamed scopes
+    without statements, are not tracked.
+    """
+
+    def _gen_impl(self, module: cst.Module) -> None:
+        module.visit(_ScopeNestingVisitor(self))
+
+
+class _FirstAssignVisitor(_StatementVisitor):
+    def visit_Module(self, node: cst.Module) -> None:
+        super().visit_Module(node)
+        self._visited_names_in_scope: dict[NestedScope, set[str]] = {}
+
+    def visit_AssignTarget(self, node: cst.AssignTarget) -> bool:
+        self._visit_assign_target(node.target)
+        return False
+
+    def visit_AnnAssign(self, node: cst.AnnAssign) -> bool:
+        self._visit_assign_target(node.target)
+        return False
+
+    def _visit_assign_target(self, name: cst.Name) -> None:
+        scope = self.provider.get_metadata(ScopeNestingProvider, name, None)
         # add empty set if scope has not been visited yet
-        self._visited_names_in_scope.setdefault(scope, set())
-        visited_names = self._visited_names_in_scope[scope]
-        self.set_metadata(name, name.value not in visited_names)
-        visited_names.add(name.value)
\ No newline at end of file
+        visited_names = self._visited_names_in_scope.setdefault(scope, set())
+        self.provider.set_metadata(name, name.value not in visited_names)
+        visited_names.add(name.value)
+
+
+class FirstAssignInScopeProvider(BaseMetadataProvider[bool]):
+    METADATA_DEPENDENCIES = (ScopeNestingProvider,)
+
+    def _gen_impl(self, module: cst.Module) -> None:
+        module.visit(_FirstAssignVisitor(self))
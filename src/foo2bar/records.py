@@ -0,0 +1,64 @@
+"""
+This module defines `AssignementRecord`, a detached description of a substitutable assignment.
+
+Unlike `AssignementWrapper`, a record holds no libcst node nor metadata, only strings and the span of the value in the source,
+so it is small, immutable, picklable and cheap to send to worker processes or to store in the analysis cache.
+Records answer the same questions as wrappers (`name`, `comment`, `scope_as_string`, `value_as_string`...), so that
+building command line options does not depend on which of both is at hand.
+
+Variables of other scopes than the global one are designated by their qualified name, e.g. `MyClass.X`, as in the
+`--MyClass.X` command line options.
+"""
+
+from typing import NamedTuple
+
+
+def qualified_name(scope_name: str | None, name: str) -> str:
+    """Name of a variable prefixed with the name of its scope, e.g. `MyClass.X`. Variables of the global scope, or of
+    any scope if `scope_name` is None, are designated by their name only."""
+    return f"{scope_name}.{name}" if scope_name else name
+
+
+def split_qualified_name(qualified: str) -> tuple[str, str]:
+    """Split a qualified name into the name of the scope, `""` for the global scope, and the name of the variable."""
+    scope_name, _, name = qualified.rpartition(".")
+    return scope_name, name
+
+
+def is_qualified_name(qualified: str) -> bool:
+    """Whether `qualified` is a variable name, optionally qualified with the name of its scope."""
+    return all(part.isidentifier() for part in qualified.split("."))
+
+
+class AssignementRecord(NamedTuple):
+    """Name, scope name, annotation, value and comment of an assignment as source strings, and the span of its value.
+
+    The span is given in characters, from `start` included to `end` excluded, in the source the record was produced from,
+    and includes the parentheses surrounding the value. `indent` is the indentation of the statement, see `TemplateSlot`.
+    """
+
+    name: str
+    scope: str | None
+    annotation: str | None
+    value: str
+    comment: str | None
+    start: int
+    end: int
+    indent: str = ""
+
+    @property
+    def qualified_name(self) -> str:
+        return qualified_name(self.scope, self.name)
+
+    @property
+    def span(self) -> tuple[int, int]:
+        return self.start, self.end
+
+    def scope_as_string(self) -> str | None:
+        return self.scope
+
+    def value_as_string(self) -> str:
+        return self.value
+
+    def annotation_as_string(self) -> str | None:
+        return self.annotation
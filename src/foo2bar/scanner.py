@@ -0,0 +1,301 @@
+"""
+This module finds the substitutable assignments of the global scope of a script with the `tokenize` module, without
+building a libcst tree nor resolving scopes, which is an order of magnitude faster on large scripts.
+
+The scanner follows the rules of `extract_assignement` and `FirstAssignInScopeProvider`: a statement line of the
+global scope, be it at the top level or in the block of an `if`, `for`, `with`... statement, holding a single assignment
+to a name, which is the first assignment of this name with `=` in the global scope, and whose trailing comment does not
+say "no param". Statements in the bodies of functions and classes belong to other scopes, and are skipped.
+
+Whenever the scanner cannot tell with certainty what libcst would make of a script, e.g. on semicolons, one-line
+compound statements, `match` statements, bare annotations or assignment targets other than names, attributes and
+subscripts, it gives up, and `substitute_global` falls back to libcst. Scripts that Python cannot parse are left to
+libcst as well, so that they raise the same errors.
+"""
+
+import ast
+import io
+import keyword
+import tokenize
+from typing import Iterator
+
+from .matchers import NO_PARAM_PATTERN
+from .profiling import phase
+from .records import AssignementRecord
+from .template import SubstitutionTemplate, TemplateSlot, _is_canonical_expression
+
+GLOBAL_SCOPE = ""
+
+# statements opening a block in the same scope, and in a new scope
+BLOCK_KEYWORDS = frozenset({"if", "elif", "else", "for", "while", "try", "except", "finally", "with"})
+SCOPE_KEYWORDS = frozenset({"def", "class"})
+# statements that cannot hold an assignment with "="
+SIMPLE_KEYWORDS = frozenset({"import", "from", "pass", "break", "continue", "return", "raise", "global", "nonlocal", "del", "assert"})
+OPENING_BRACKETS = frozenset("([{")
+CLOSING_BRACKETS = frozenset(")]}")
+IGNORED_TOKENS = frozenset({tokenize.NL, tokenize.COMMENT})
+
+
+class UnsupportedSyntax(Exception):
+    """The script holds a construct that the scanner cannot analyze with certainty."""
+
+
+def _depth_zero_tokens(tokens: list[tokenize.TokenInfo]) -> Iterator[tuple[int, tokenize.TokenInfo]]:
+    """Yield the tokens that are not nested in brackets nor in the parameters of a lambda, with their index.
+
+    The colon ending the parameters of a lambda is not yielded, so that the colons yielded end the header of a compound
+    statement or introduce an annotation.
+    """
+    depth = 0
+    lambda_depths = []
+    for index, token in enumerate(tokens):
+        if token.type == tokenize.OP:
+            if token.string in OPENING_BRACKETS:
+                depth += 1
+                continue
+            if token.string in CLOSING_BRACKETS:
+                depth -= 1
+                if depth < 0:
+                    raise UnsupportedSyntax(f"Unbalanced bracket on line {token.start[0]}")
+                continue
+            if token.string == ":" and lambda_depths and lambda_depths[-1] == depth:
+                lambda_depths.pop()
+                depth -= 1
+                continue
+        elif token.type == tokenize.NAME and token.string == "lambda":
+            depth += 1
+            lambda_depths.append(depth)
+            continue
+        if depth == 0:
+            yield index, token
+
+
+def _is_name_target(tokens: list[tokenize.TokenInfo]) -> bool:
+    """Whether an assignment target is a name, rather than an attribute or a subscript.
+
+    Raises:
+        UnsupportedSyntax: The target is neither, e.g. a tuple or a parenthesized name.
+    """
+    first = tokens[0]
+    if first.type != tokenize.NAME or keyword.iskeyword(first.string):
+        raise UnsupportedSyntax(f"Unsupported assignment target on line {first.start[0]}")
+    if len(tokens) == 1:
+        return True
+    # attributes and subscripts of a name, of its attributes, of the results of calls...
+    depth = 0
+    trailer = None
+    for token in tokens[1:]:
+        string = token.string if token.type == tokenize.OP else None
+        if depth:
+            if string in OPENING_BRACKETS:
+                depth += 1
+            elif string in CLOSING_BRACKETS:
+                depth -= 1
+        elif string == "." and trailer != ".":
+            trailer = "."
+        elif token.type == tokenize.NAME and trailer == "." and not keyword.iskeyword(token.string):
+            trailer = "name"
+        elif string in ("(", "[") and trailer != ".":
+            depth += 1
+            trailer = string
+        else:
+            raise UnsupportedSyntax(f"Unsupported assignment target on line {first.start[0]}")
+    if depth or trailer not in ("name", "["):
+        raise UnsupportedSyntax(f"Unsupported assignment target on line {first.start[0]}")
+    return False
+
+
+class _GlobalScanner:
+    """Scan the logical lines of a script, tracking the blocks opened by compound statements."""
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.line_offsets = [0]
+        self.assigned_names: set[str] = set()
+        self.records: list[AssignementRecord] = []
+
+    def _readline(self, lines: Iterator[str]):
+        def readline() -> str:
+            line = next(lines, "")
+            if line:
+                self.line_offsets.append(self.line_offsets[-1] + len(line))
+            return line
+        return readline
+
+    def offset(self, position: tuple[int, int]) -> int:
+        row, column = position
+        return self.line_offsets[row - 1] + column
+
+    def scan(self) -> list[AssignementRecord]:
+        # the body of a def or class statement for every open block
+        blocks: list[bool] = []
+        scope_blocks = 0
+        opens_scope = False
+        line: list[tokenize.TokenInfo] = []
+        lines = iter(io.StringIO(self.source).readline, "")
+        for token in tokenize.generate_tokens(self._readline(lines)):
+            kind = token.type
+            if kind == tokenize.NEWLINE:
+                opens_scope = False
+                if not scope_blocks:
+                    opens_scope = self._scan_line(line)
+                line = []
+            elif kind == tokenize.INDENT:
+                blocks.append(opens_scope)
+                scope_blocks += opens_scope
+            elif kind == tokenize.DEDENT:
+                scope_blocks -= blocks.pop()
+            elif kind == tokenize.ERRORTOKEN:
+                raise UnsupportedSyntax(f"Unexpected token {token.string!r} on line {token.start[0]}")
+            elif line or kind not in IGNORED_TOKENS:
+                line.append(token)
+        return self.records
+
+    def _scan_line(self, line: list[tokenize.TokenInfo]) -> bool:
+        """Scan a logical line of the global scope.
+
+        Returns:
+            bool: Whether the line is the header of a function or class whose body is on the next lines.
+        """
+        comment = None
+        if line[-1].type == tokenize.COMMENT:
+            comment = line[-1].string
+            line = line[:-1]
+        tokens = [token for token in line if token.type not in IGNORED_TOKENS]
+        first = tokens[0]
+        if first.type == tokenize.OP and first.string == "@":
+            return False
+        if first.type == tokenize.NAME:
+            second = tokens[1] if len(tokens) > 1 else None
+            if first.string in SCOPE_KEYWORDS or (first.string == "async" and second is not None and second.string == "def"):
+                return self._scan_header(tokens, opens_scope=True)
+            if first.string in BLOCK_KEYWORDS or first.string == "async":
+                return self._scan_header(tokens, opens_scope=False)
+            if first.string in SIMPLE_KEYWORDS:
+                return False
+            # soft keywords may start a statement, or name a variable
+            if first.string == "type" and second is not None and second.type == tokenize.NAME:
+                raise UnsupportedSyntax(f"Unsupported 'type' statement on line {first.start[0]}")
+            if first.string in ("match", "case") and second is not None and second.string not in ("=", ":"):
+                if any(token.string == ":" for _, token in _depth_zero_tokens(tokens)):
+                    raise UnsupportedSyntax(f"Unsupported {first.string!r} statement on line {first.start[0]}")
+        self._scan_statement(tokens, comment)
+        return False
+
+    def _scan_header(self, tokens: list[tokenize.TokenInfo], opens_scope: bool) -> bool:
+        for index, token in _depth_zero_tokens(tokens):
+            if token.type == tokenize.OP and token.string == ":":
+                if index == len(tokens) - 1:
+                    return opens_scope
+                if opens_scope:
+                    # a one-line function or class, whose body is in another scope
+                    return False
+                raise UnsupportedSyntax(f"Unsupported one-line compound statement on line {token.start[0]}")
+        raise UnsupportedSyntax(f"Missing colon in the header on line {tokens[0].start[0]}")
+
+    def _scan_statement(self, tokens: list[tokenize.TokenInfo], comment: str | None) -> None:
+        equals, colon = [], None
+        for index, token in _depth_zero_tokens(tokens):
+            if token.type != tokenize.OP:
+                continue
+            if token.string == "=":
+                equals.append(index)
+            elif token.string == ":" and colon is None and not equals:
+                colon = index
+            elif token.string in (";", ":"):
+                raise UnsupportedSyntax(f"Unsupported {token.string!r} on line {token.start[0]}")
+        if not equals:
+            if colon is not None:
+                raise UnsupportedSyntax(f"Unsupported bare annotation on line {tokens[0].start[0]}")
+            # not an assignment
+            return
+
+        bounds = [-1, *equals, len(tokens)]
+        segments = [tokens[start + 1:end] for start, end in zip(bounds, bounds[1:])]
+        if not all(segments) or (colon is not None and (len(equals) > 1 or colon == 0 or colon + 1 == equals[0])):
+            raise UnsupportedSyntax(f"Unsupported assignment on line {tokens[0].start[0]}")
+        *targets, value = segments
+        annotation = None
+        if colon is not None:
+            annotation = targets[0][colon + 1:]
+            targets = [targets[0][:colon]]
+
+        names = [target[0].string if _is_name_target(target) else None for target in targets]
+        first_assignement = names[0] is not None and names[0] not in self.assigned_names
+        self.assigned_names.update(name for name in names if name is not None)
+        if len(targets) != 1 or not first_assignement:
+            return
+        if comment is not None and NO_PARAM_PATTERN.fullmatch(comment):
+            return
+        start, end = self.offset(value[0].start), self.offset(value[-1].end)
+        if annotation is not None:
+            annotation = self.source[self.offset(annotation[0].start):self.offset(annotation[-1].end)]
+        self.records.append(
+            AssignementRecord(
+                names[0], GLOBAL_SCOPE, annotation, self.source[start:end], comment, start, end,
+                tokens[0].line[:tokens[0].start[1]],
+            )
+        )
+
+
+def scan_global_assignements(source: str) -> list[AssignementRecord]:
+    """Find the substitutable assignments of the global scope of a script, like `CodeWrapper.analyze_records("")`.
+
+    Args:
+        source (str): The source of the script.
+
+    Raises:
+        UnsupportedSyntax: The script holds a construct that the scanner cannot analyze with certainty.
+
+    Returns:
+        list[AssignementRecord]: The assignments, in code order, with the span of their value in `source`.
+    """
+    # libcst and tokenize do not agree on these line separators
+    if source.startswith("﻿") or source.count("\r") != source.count("\r\n"):
+        raise UnsupportedSyntax("Unsupported byte order mark or line separator")
+    with phase("scan"):
+        try:
+            # tokenize accepts invalid code, which libcst rejects
+            ast.parse(source)
+            return _GlobalScanner(source).scan()
+        except (SyntaxError, ValueError, tokenize.TokenError) as e:
+            raise UnsupportedSyntax(str(e)) from e
+
+
+def try_substitute_global(source: str, mapping: dict[str, str]) -> tuple[str, dict[str, str]] | None:
+    """Substitute values in the global scope of a script with the scanner, like `substitute_assign_values_global`.
+
+    Returns:
+        tuple[str, dict[str, str]] | None: The substituted code and the items of `mapping` that were not substituted,
+            or None if the script or the values are not supported by the scanner.
+    """
+    # values that libcst would reformat, or reject, are left to libcst
+    if not all(isinstance(value, str) and _is_canonical_expression(value) for value in mapping.values()):
+        return None
+    try:
+        records = scan_global_assignements(source)
+    except UnsupportedSyntax:
+        return None
+    template = SubstitutionTemplate(source, [TemplateSlot(record.name, record.start, record.end, record.indent) for record in records])
+    return template.render(mapping)
+
+
+def substitute_global(source: str, mapping: dict[str, str]) -> tuple[str, dict[str, str]]:
+    """Substitute values in the global scope of a script, with the scanner if possible, and with libcst otherwise.
+
+    Args:
+        source (str): The source of the script.
+        mapping (dict[str, str]): Variable names mapped to the source of their new values.
+
+    Returns:
+        tuple[str, dict[str, str]]: The substituted code and the items of `mapping` that were not substituted.
+    """
+    result = try_substitute_global(source, mapping)
+    if result is not None:
+        return result
+
+    from .wrapper import CodeWrapper
+
+    wrapper = CodeWrapper(source)
+    remaining = wrapper.substitute_assign_values_global(mapping)
+    return wrapper.code, remaining
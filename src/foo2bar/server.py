@@ -0,0 +1,161 @@
+"""
+This module implements a long-running foo2bar server, answering command lines forwarded over a Unix domain socket.
+
+Starting foo2bar is dominated by importing libcst and RestrictedPython and by analyzing the script.
+A server started with `foo2bar serve` pays for imports once, and keeps the analysis of recently used scripts in memory.
+When `$FOO2BAR_SOCKET` points to the socket of a running server, the `foo2bar` command forwards its command line to it
+and prints its response, falling back to running locally if the server cannot be reached.
+
+Requests and responses are single lines of JSON: the client sends its command line and working directory,
+and the server answers with the exit status and the standard output and error of the command.
+Requests are handled one at a time, since running a command changes the working directory and redirects the standard streams.
+"""
+
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import traceback
+from argparse import ArgumentParser
+from pathlib import Path
+
+from foo2bar.logging import logger, stdout_handler
+
+SOCKET_ENV = "FOO2BAR_SOCKET"
+
+
+def default_socket_path() -> Path:
+    """`$FOO2BAR_SOCKET`, or `foo2bar.sock` in `$XDG_RUNTIME_DIR`, defaulting to a per-user file in the temporary directory."""
+    if socket_path := os.environ.get(SOCKET_ENV):
+        return Path(socket_path)
+    if runtime_dir := os.environ.get("XDG_RUNTIME_DIR"):
+        return Path(runtime_dir) / "foo2bar.sock"
+    return Path(tempfile.gettempdir()) / f"foo2bar-{os.getuid()}.sock"
+
+
+def _send_message(stream, message: dict) -> None:
+    stream.write(json.dumps(message).encode() + b"\n")
+    stream.flush()
+
+
+def _receive_message(stream) -> dict:
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed before receiving a message")
+    return json.loads(line)
+
+
+def forward(argv: list[str], socket_path: str | Path) -> int:
+    """Run a command line on the server listening on `socket_path`, and print its output.
+
+    Raises:
+        OSError: The server cannot be reached.
+
+    Returns:
+        int: The exit status of the command.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        with client.makefile("rwb") as stream:
+            _send_message(stream, {"argv": list(argv), "cwd": os.getcwd()})
+            response = _receive_message(stream)
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["status"]
+
+
+def run_captured(command, argv: list[str], cwd: str) -> dict:
+    """Run `command(argv)` from `cwd`, capturing its exit status, standard output and error, and its logs."""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    previous_cwd = os.getcwd()
+    previous_stream = stdout_handler.setStream(stderr)
+    try:
+        os.chdir(cwd)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                status = command(argv) or 0
+            except SystemExit as e:
+                if e.code is None or isinstance(e.code, int):
+                    status = e.code or 0
+                else:
+                    print(e.code, file=sys.stderr)
+                    status = 1
+            except Exception:
+                traceback.print_exc()
+                status = 1
+    finally:
+        stdout_handler.setStream(previous_stream)
+        os.chdir(previous_cwd)
+    return {"status": status, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        try:
+            request = _receive_message(self.rfile)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Invalid request: {e}")
+            return
+        response = run_captured(self.server.command, request["argv"], request["cwd"])
+        _send_message(self.wfile, response)
+
+
+class Server(socketserver.UnixStreamServer):
+    """Unix domain socket server running each request with `command`, which takes a command line and returns an exit status."""
+
+    def __init__(self, socket_path: str | Path, command) -> None:
+        self.socket_path = Path(socket_path)
+        self.command = command
+        self._remove_stale_socket()
+        # the socket is only accessible to the current user
+        previous_umask = os.umask(0o077)
+        try:
+            super().__init__(str(self.socket_path), _RequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+    def _remove_stale_socket(self) -> None:
+        if not self.socket_path.exists():
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(self.socket_path))
+            except ConnectionRefusedError:
+                self.socket_path.unlink()
+            else:
+                raise OSError(f"A server is already listening on {self.socket_path}")
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+
+def serve(argv: list[str] = None) -> None:
+    """Entry point of `foo2bar serve`."""
+    from .cache import AnalysisCache, MemoryAnalysisCache
+    from .cli import run
+
+    parser = ArgumentParser(prog="foo2bar serve", description="Answer foo2bar command lines forwarded over a Unix domain socket.")
+    parser.add_argument(
+        "--socket", type=Path, default=default_socket_path(),
+        help=f"path of the socket to listen on. Defaults to ${SOCKET_ENV}, or foo2bar.sock in $XDG_RUNTIME_DIR."
+    )
+    parser.add_argument("--max-scripts", type=int, default=128, help="number of script analyses to keep in memory.")
+    args = parser.parse_args(argv)
+
+    analyses = MemoryAnalysisCache(maxsize=args.max_scripts, fallback=AnalysisCache())
+
+    def command(argv: list[str]) -> int | None:
+        return run(argv, cache=analyses)
+
+    logger.setLevel("INFO")
+    with Server(args.socket, command) as server:
+        logger.info(f"Listening on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
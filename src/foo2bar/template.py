@@ -0,0 +1,166 @@
+"""
+This module defines substitution templates, which render variants of a script by splicing new values into its source.
+
+A template records the character span of every substitutable assignment value in the original source.
+Rendering a variant then only costs the parsing of the new values and the concatenation of the untouched source chunks,
+instead of a full traversal and code generation of the module. A variant can also be rendered as the list of `TextEdit`s
+to apply to the source, see `foo2bar.edits`.
+"""
+
+import re
+from typing import Iterable, Iterator, NamedTuple
+
+from .profiling import profiled
+
+# same line separators as libcst.metadata.PositionProvider
+NEWLINE_RE = re.compile(r"\r\n?|\n")
+
+
+class TemplateSlot(NamedTuple):
+    """Span of the value assigned to `name` in the template source, as `source[start:end]`, and the indentation of
+    the statement, by which libcst indents the continuation lines of multi-line values."""
+
+    name: str
+    start: int
+    end: int
+    indent: str = ""
+
+
+class TextEdit(NamedTuple):
+    """Replacement of `source[start:end]` by `replacement`, spans being given in characters."""
+
+    start: int
+    end: int
+    replacement: str
+
+
+def apply_edits(source: str, edits: Iterable[TextEdit]) -> str:
+    """Apply edits to `source`, given sorted by start and without overlapping."""
+    chunks = []
+    position = 0
+    for start, end, replacement in edits:
+        chunks.append(source[position:start])
+        chunks.append(replacement)
+        position = end
+    chunks.append(source[position:])
+    return "".join(chunks)
+
+
+def line_offsets(source: str) -> list[int]:
+    """Character offset of the start of every line in `source`. Line `n` (1-indexed) starts at index `n - 1`."""
+    return [0, *(match.end() for match in NEWLINE_RE.finditer(source))]
+
+
+def line_indent(source: str, position: int) -> str:
+    """Leading whitespace of the line of `source` holding `position`."""
+    line_start = max(source.rfind("\n", 0, position), source.rfind("\r", 0, position)) + 1
+    line = source[line_start:position]
+    return line[:len(line) - len(line.lstrip(" \t\f"))]
+
+
+def code_range_to_span(code_range: "metadata.CodeRange", offsets: list[int]) -> tuple[int, int]:
+    """Convert a libcst `CodeRange` into a `(start, end)` character span, given the line offsets of the source."""
+    start = offsets[code_range.start.line - 1] + code_range.start.column
+    end = offsets[code_range.end.line - 1] + code_range.end.column
+    return start, end
+
+
+def _is_canonical_expression(value: str) -> bool:
+    """Whether libcst renders the expression `value` as is once parsed.
+
+    This holds for valid expressions on a single line, without surrounding whitespace nor comments.
+    Python's own compiler is used to check validity, since it is much cheaper to import and to run than libcst's parser.
+    """
+    if value != value.strip() or "#" in value or NEWLINE_RE.search(value):
+        return False
+    try:
+        compile(value, "<value>", "eval")
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+def value_to_code(value: str, indent: str = "") -> str:
+    """Normalize the source of a substituted value the same way `Substitutor` does, in a statement indented by `indent`."""
+    if _is_canonical_expression(value):
+        return value
+
+    import libcst as cst
+    from .node_converter import expression_to_string
+
+    return expression_to_string(cst.parse_expression(value), indent)
+
+
+class SubstitutionTemplate:
+    def __init__(self, source: str, slots: Iterable[TemplateSlot]) -> None:
+        self._source = source
+        self._slots = sorted(slots, key=lambda slot: slot.start)
+        self._slots_by_name: dict[str, list[TemplateSlot]] = {}
+        for slot in self._slots:
+            self._slots_by_name.setdefault(slot.name, []).append(slot)
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    @property
+    def slots(self) -> list[TemplateSlot]:
+        return list(self._slots)
+
+    def names(self) -> list[str]:
+        return list(self._slots_by_name)
+
+    @profiled("render")
+    def render(self, mapping: dict[str, str]) -> tuple[str, dict[str, str]]:
+        """Splice the values of `mapping` into the template source.
+
+        Args:
+            mapping (dict[str, str]): Variable names mapped to the source of their new values.
+
+        Returns:
+            tuple[str, dict[str, str]]: The rendered code and the items of `mapping` that were not substituted.
+        """
+        edits, remaining = self._edits(mapping)
+        return apply_edits(self._source, edits), remaining
+
+    @profiled("render")
+    def render_edits(self, mapping: dict[str, str]) -> tuple[list[TextEdit], dict[str, str]]:
+        """Like `render`, returning the edits to apply to the template source instead of the rendered code.
+
+        Values left unchanged are not edited, so that the edits only hold what differs from the source.
+
+        Returns:
+            tuple[list[TextEdit], dict[str, str]]: The edits sorted by start, and the items of `mapping` that were not substituted.
+        """
+        edits, remaining = self._edits(mapping)
+        return [edit for edit in edits if self._source[edit.start:edit.end] != edit.replacement], remaining
+
+    def _edits(self, mapping: dict[str, str]) -> tuple[list[TextEdit], dict[str, str]]:
+        for value in mapping.values():
+            if not isinstance(value, str):
+                raise ValueError(f"All values in the mapping must be strings. Got {value} instead.")
+
+        edits = []
+        remaining = {}
+        for name, value in mapping.items():
+            slots = self._slots_by_name.get(name)
+            if not slots:
+                remaining[name] = value
+                continue
+            # values are only indented differently when continued on several lines
+            codes = {}
+            for slot in slots:
+                if slot.indent not in codes:
+                    codes[slot.indent] = value_to_code(value, slot.indent)
+                edits.append(TextEdit(slot.start, slot.end, codes[slot.indent]))
+        edits.sort()
+        return edits, remaining
+
+    def render_many(self, mappings: Iterable[dict[str, str]]) -> Iterator[str]:
+        """Lazily render one variant of the template per mapping."""
+        for mapping in mappings:
+            code, _ = self.render(mapping)
+            yield code
+
+    def __repr__(self):
+        return f"<SubstitutionTemplate of {self.names()!r}>"
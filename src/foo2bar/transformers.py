@@ -1,57 +1,181 @@
 
-from typing import Any, Mapping
+from functools import lru_cache
+from typing import Any, Iterable, Mapping
 
 import libcst as cst
-from libcst import matchers as m, metadata
 
-from .matchers import statement_matcher
-from .providers import FirstAssignInScopeProvider
+from .extractors import extract_assignement
+from .node_converter import try_resolve_scope_name
+from .providers import FirstAssignInScopeProvider, NestedScope, ScopeNestingProvider, SkipExpressionsMixin
+from .records import qualified_name
 
-class Substitutor(m.MatcherDecoratableTransformer):
-    METADATA_DEPENDENCIES = (metadata.ScopeProvider, FirstAssignInScopeProvider)
+# number of parsed values kept by parse_value
+PARSED_VALUES_CACHE_SIZE = 1024
+
+
+class SubstitutionValueError(ValueError):
+    """Some values of a substitution mapping are not strings or cannot be parsed as expressions."""
+
+    def __init__(self, errors: dict[str, Exception]) -> None:
+        self.errors = errors
+        details = "".join(f"\n  {name}: {error}" for name, error in errors.items())
+        super().__init__(f"Invalid value for {', '.join(map(repr, errors))}:{details}")
+
+
+@lru_cache(maxsize=PARSED_VALUES_CACHE_SIZE)
+def parse_value(value: str) -> cst.BaseExpression:
+    """Parse the source of a value, caching the node, since the same values are often substituted many times.
+
+    The node is shared: clone it before inserting it in a tree, where a node may only appear once.
+    """
+    return cst.parse_expression(value)
+
+
+def parse_values(mapping: dict[str, str]) -> dict[str, cst.BaseExpression]:
+    """Parse every value of a substitution mapping.
+
+    Raises:
+        SubstitutionValueError: Some values are not strings or cannot be parsed, reported all at once.
+    """
+    values, errors = {}, {}
+    for name, value in mapping.items():
+        if not isinstance(value, str):
+            errors[name] = ValueError(f"All values in the mapping must be strings. Got {value} instead. Maybe have a look at the `from_repr` method.")
+            continue
+        try:
+            values[name] = parse_value(value)
+        except Exception as e:
+            errors[name] = e
+    if errors:
+        raise SubstitutionValueError(errors)
+    return values
+
+
+def parse_scoped_values(mappings: Iterable[tuple[str | None, dict[str, str]]]) -> list[dict[str, cst.BaseExpression]]:
+    """Parse every value of several substitution mappings, given along with the name of their scope.
+
+    Raises:
+        SubstitutionValueError: Some values are not strings or cannot be parsed, reported all at once by qualified name, e.g. `MyClass.X`.
+    """
+    values, errors = [], {}
+    for scope_name, mapping in mappings:
+        try:
+            values.append(parse_values(mapping))
+        except SubstitutionValueError as e:
+            errors.update((qualified_name(scope_name, name), error) for name, error in e.errors.items())
+    if errors:
+        raise SubstitutionValueError(errors)
+    return values
+
+
+class Substitutor(SkipExpressionsMixin, cst.CSTTransformer):
+    """Substitute the values of the first assignments of names, in a single traversal of a module.
+
+    Substitutes either `mapping` in `scope`, or every mapping of `scopes` in its scope. The None scope stands for
+    every scope, where names are substituted unless they are also mapped in their own scope.
+    """
+
+    METADATA_DEPENDENCIES = (ScopeNestingProvider, FirstAssignInScopeProvider)
     
-    def __init__(self, mapping: dict[str, str], scope: metadata.Scope = None) -> None:
+    def __init__(
+        self,
+        mapping: dict[str, str] = None,
+        scope: NestedScope = None,
+        *,
+        scopes: Mapping[NestedScope | None, dict[str, str]] = None,
+    ) -> None:
         super().__init__()
+        if scopes is None:
+            scopes = {scope: mapping if mapping is not None else {}}
+        elif mapping is not None or scope is not None:
+            raise ValueError("Either substitute a mapping in a scope, or mappings in several scopes, not both")
         self.scope = scope
         self.mapping = mapping
-        self._check_if_values_are_strings()
-    
+        self.scopes = dict(scopes)
+        # names of the target scopes, to skip the bodies of functions and classes that cannot contain them
+        self._scope_names = {scope: None if scope is None else try_resolve_scope_name(scope) for scope in self.scopes}
+        # values are parsed upfront, so that invalid values are reported before visiting the module
+        parsed = parse_scoped_values((self._scope_names[scope], mapping) for scope, mapping in self.scopes.items())
+        self._values = dict(zip(self.scopes, parsed))
+        self._names = {name for mapping in self.scopes.values() for name in mapping}
+
     def retrieve_non_substituted(self):
-        return {k: v for k, v in self.mapping.items() if k in self._to_substitute}
+        """Items of `mapping` that were not substituted."""
+        return self.retrieve_non_substituted_by_scope()[self.scope]
+
+    def retrieve_non_substituted_by_scope(self) -> dict[NestedScope | None, dict[str, str]]:
+        """Items of every mapping that were not substituted, keyed by scope."""
+        return {
+            scope: {k: v for k, v in mapping.items() if k in self._to_substitute.get(scope, ())}
+            for scope, mapping in self.scopes.items()
+        }
     
     def visit_Module(self, node: cst.Module) -> bool:
-        self._to_substitute = set(self.mapping.keys())
+        # names left to substitute per scope. Scopes are dropped once done, except for the None scope
+        self._to_substitute = {
+            scope: set(mapping.keys())
+            for scope, mapping in self.scopes.items()
+            if scope is None or mapping
+        }
+        # names of the functions and classes being visited
+        self._definitions: list[str] = []
     
     @classmethod
-    def from_repr(cls, typed_mapping: Mapping[str, Any], scope: metadata.Scope = None) -> "Substitutor":
+    def from_repr(cls, typed_mapping: Mapping[str, Any], scope: NestedScope = None) -> "Substitutor":
         return cls({k:repr(v) for k, v in typed_mapping.items()}, scope)
     
-    def _check_if_values_are_strings(self):
-        for v in self.mapping.values():
-            if not isinstance(v, str):
-                raise ValueError(f"All values in the mapping must be strings. Got {v} instead. Maybe have a look at the `from_repr` method.")
-    
-    def _matches_scope(self, node: cst.CSTNode):
-        if self.scope is None:
-            return True
-        scope = self.get_metadata(metadata.ScopeProvider, node)
-        return scope == self.scope
-    
+    def on_visit(self, node: cst.CSTNode) -> bool:
+        # expressions are skipped by SkipExpressionsMixin
+        if isinstance(node, (cst.BaseExpression, cst.Module)):
+            return super().on_visit(node)
+        definition = isinstance(node, (cst.FunctionDef, cst.ClassDef))
+        if definition:
+            self._definitions.append(node.name.value)
+        if self._is_done():
+            return False
+        if definition and not self._may_contain_scope():
+            return False
+        return super().on_visit(node)
+
+    def on_leave(self, original_node: cst.CSTNode, updated_node: cst.CSTNode):
+        # nodes are left even when their visit returned False
+        if isinstance(original_node, (cst.FunctionDef, cst.ClassDef)):
+            self._definitions.pop()
+        return super().on_leave(original_node, updated_node)
+
+    def _is_done(self) -> bool:
+        """Whether every name was substituted, the rest of the module being left as is."""
+        # names are assigned once in a given scope, but may be assigned in every scope if none is given
+        return not self._to_substitute
+
+    def _may_contain_scope(self) -> bool:
+        """Whether the function or class being visited is, or contains, a target scope with names left to substitute."""
+        path = ".".join(self._definitions)
+        for scope in self._to_substitute:
+            scope_name = self._scope_names[scope]
+            if scope_name is None or scope_name == path or scope_name.startswith(path + "."):
+                return True
+        return False
+
     def visit_SimpleStatementLine(self, node: cst.SimpleStatementLine) -> bool:
-        self._current_data = m.extract(node, statement_matcher, metadata_resolver=self)
-        return self._current_data is not None and self._matches_scope(node) # stop traversal if did not match
-
-    def _leave_generic_assign(self, original_node: cst.Expr, updated_node: cst.Expr):
-        current_name = self._current_data["name"]
-        if current_name in self.mapping:
-            self._to_substitute.discard(current_name)
-            return updated_node.with_changes(value=cst.parse_expression(self.mapping[current_name]))
-        return updated_node
-
-    @m.call_if_inside(statement_matcher)
-    def leave_Assign(self, original_node: cst.Assign, updated_node: cst.Assign) -> cst.Assign:
-        return self._leave_generic_assign(original_node, updated_node)
-    
-    @m.call_if_inside(statement_matcher)
-    def leave_AnnAssign(self, original_node: cst.AnnAssign, updated_node: cst.AnnAssign) -> cst.AnnAssign:
-        return self._leave_generic_assign(original_node, updated_node)
\ No newline at end of file
+        return False # simple statements do not contain other statements
+
+    def leave_SimpleStatementLine(self, original_node: cst.SimpleStatementLine, updated_node: cst.SimpleStatementLine) -> cst.SimpleStatementLine:
+        if self._is_done():
+            return updated_node
+        data = extract_assignement(original_node, self.metadata[FirstAssignInScopeProvider])
+        if data is None or data.name not in self._names:
+            return updated_node
+        # names mapped in the scope of the statement take precedence over names mapped in every scope
+        scope = self.get_metadata(ScopeNestingProvider, original_node)
+        if scope not in self._to_substitute or data.name not in self.scopes[scope]:
+            scope = None
+            if None not in self._to_substitute or data.name not in self.scopes[None]:
+                return updated_node
+        names = self._to_substitute[scope]
+        names.discard(data.name)
+        if not names and scope is not None:
+            del self._to_substitute[scope]
+        new_value = self._values[scope][data.name].deep_clone()
+        statement = updated_node.body[0].with_changes(value=new_value)
+        return updated_node.with_changes(body=[statement])
\ No newline at end of file
@@ -1,30 +1,69 @@
-from typing import Self
+from bisect import bisect_left
+from typing import Iterable, Iterator, Mapping, Self
 from pathlib import Path
 
 from libcst import metadata, matchers as m
 import libcst as cst
 
-from .matchers import statement_matcher
-from .node_converter import node_to_string, try_resolve_scope_name
-from .transformers import Substitutor
+from .extractors import AssignementData, extract_assignement, extract_assignements
+from .node_converter import SourceRenderer, expression_to_string, node_to_string, resolve_scope_names, try_resolve_scope_name
+from .profiling import phase
+from .providers import FirstAssignInScopeProvider, NestedScope, ScopeNestingProvider
+from .records import AssignementRecord
+from .template import SubstitutionTemplate, TemplateSlot, TextEdit, line_indent
+from .transformers import Substitutor, parse_scoped_values
+
+
+# expressions binding names, which would change the scopes or the first assignments of the code
+SCOPE_CHANGING_EXPRESSION = m.OneOf(
+    m.Lambda(), m.ListComp(), m.SetComp(), m.DictComp(), m.GeneratorExp(), m.NamedExpr()
+)
+
+
+def resolve_metadata(metadata_wrapper: metadata.MetadataWrapper) -> None:
+    """Resolve the metadata needed to analyze and substitute assignments, timing every provider as its own phase.
+
+    Metadata is resolved again on every call: resolve it once per MetadataWrapper, as `CodeWrapper` does.
+    """
+    for provider in (ScopeNestingProvider, FirstAssignInScopeProvider):
+        with phase(f"metadata.{provider.__name__}"):
+            # MetadataWrapper.resolve visits the whole module for batchable providers after every round of dependencies,
+            # even when there is none, which doubles the cost of both providers. This relies on internals of the pinned
+            # libcst version, checked by tests/test_providers.py
+            metadata_wrapper._metadata[provider] = provider()._gen(metadata_wrapper)
+
+
+def changes_scopes(expression: cst.BaseExpression) -> bool:
+    """Whether substituting `expression` as an assignment value may change the scopes or the first assignments of the code."""
+    return m.matches(expression, SCOPE_CHANGING_EXPRESSION) or bool(m.findall(expression, SCOPE_CHANGING_EXPRESSION))
 
 
 class AssignementWrapper:
     def __init__(
-        self, node: cst.SimpleStatementLine, metadata_wrapper: metadata.MetadataWrapper
+        self,
+        node: cst.SimpleStatementLine,
+        metadata_wrapper: metadata.MetadataWrapper,
+        overrides: dict[cst.BaseExpression, cst.BaseExpression] = None,
+        data: AssignementData = None,
+        renderer: SourceRenderer = None,
+        scope_names: Mapping[NestedScope, str | None] = None,
     ) -> None:
         self._node = node
         self._metadata_wrapper = metadata_wrapper
-        self._scope = metadata_wrapper.resolve(metadata.ScopeProvider)[node]
-
-        # extract data
-        data = m.extract(node, statement_matcher, metadata_resolver=metadata_wrapper)
-        # mandatory fields
-        self._name = data["name"]
-        self._value = data["value"]
-        # optional fields
-        self._annotation = data.get("annotation")
-        self._comment = data.get("comment")
+        # names of the scopes of the module, if already resolved
+        self._scope_names = scope_names
+        # renders nodes as strings, by slicing the source of the module if available
+        self._renderer = renderer if renderer is not None else node_to_string
+        # values substituted by an incremental CodeWrapper, keyed by the value they replace
+        self._overrides = overrides if overrides is not None else {}
+        self._scope = metadata_wrapper.resolve(ScopeNestingProvider)[node]
+
+        # extract data, unless already extracted along with the node
+        if data is None:
+            data = extract_assignement(node, metadata_wrapper.resolve(FirstAssignInScopeProvider))
+            if data is None:
+                raise ValueError(f"Not a substitutable assignment: {node_to_string(node).strip()!r}")
+        self._name, self._annotation, self._value, self._comment = data
 
     @property
     def name(self):
@@ -36,88 +75,434 @@ class AssignementWrapper:
 
     @property
     def value(self):
-        return self._value
+        return self._overrides.get(self._value, self._value)
 
     @property
     def comment(self):
         return self._comment
 
     def scope_as_string(self) -> str:
+        if self._scope_names is not None:
+            return self._scope_names[self._scope]
         return try_resolve_scope_name(self._scope)
 
     def value_as_string(self) -> str:
-        return node_to_string(self._value)
+        return self._renderer(self.value)
 
     def annotation_as_string(self) -> str | None:
         if self._annotation is None:
             return None
-        return node_to_string(self._annotation)
+        return self._renderer(self._annotation)
+
+    def to_record(self, span: tuple[int, int], indent: str = "") -> AssignementRecord:
+        """Detach the assignment from its module, given the span of its value in the code and the indentation of
+        its statement."""
+        return AssignementRecord(
+            name=self.name,
+            scope=self.scope_as_string(),
+            annotation=self.annotation_as_string(),
+            value=self.value_as_string(),
+            comment=self.comment,
+            start=span[0],
+            end=span[1],
+            indent=indent,
+        )
 
     def __repr__(self):
         return f"<AssignementWrapper of {str(self)!r}>"
 
     def __str__(self):
-        return node_to_string(self._node).strip()
+        if self._value in self._overrides:
+            return node_to_string(self._node.deep_replace(self._value, self._overrides[self._value])).strip()
+        return self._renderer(self._node).strip()
+
+
+class _AssignementIndex:
+    """Named scopes and substitutable assignments of a module, gathered in a single traversal.
+
+    Several scopes may have the same name, e.g. classes defined in both branches of an `if` statement, so scopes are
+    listed per name. Assignments are kept in code order, overall and per scope name, and keyed by variable name per scope.
+    """
+
+    def __init__(self, metadata_wrapper: metadata.MetadataWrapper, overrides: dict, renderer: SourceRenderer) -> None:
+        # metadata is resolved by the CodeWrapper
+        # scopes of the module, in code order
+        scopes = dict.fromkeys(metadata_wrapper.resolve(ScopeNestingProvider).values())
+        self.scope_names: dict[NestedScope, str | None] = resolve_scope_names(scopes)
+        self.scopes: dict[str, list[NestedScope]] = {}
+        for scope in scopes:
+            if (scope_name := self.scope_names[scope]) is not None:
+                self.scopes.setdefault(scope_name, []).append(scope)
+        self.assignements: list[AssignementWrapper] = []
+        self.by_scope: dict[NestedScope, dict[str, AssignementWrapper]] = {
+            scope: {} for named_scopes in self.scopes.values() for scope in named_scopes
+        }
+        self.by_scope_name: dict[str, list[AssignementWrapper]] = {scope_name: [] for scope_name in self.scopes}
+        for node, data in extract_assignements(metadata_wrapper):
+            assignement = AssignementWrapper(node, metadata_wrapper, overrides, data, renderer, self.scope_names)
+            self.assignements.append(assignement)
+            scope_name = assignement.scope_as_string()
+            if scope_name is not None:
+                # only the first assignment of a name in a scope is matched, so names are unique per scope
+                self.by_scope[assignement._scope][assignement.name] = assignement
+                self.by_scope_name[scope_name].append(assignement)
 
 
 class CodeWrapper:
+    """Analyze and substitute the assignments of a piece of code.
+
+    In incremental mode, substituting values that cannot change the scopes of the code keeps the parsed module
+    and its metadata: new values are recorded as overrides of the values they replace, and spliced into the source
+    when the code is requested. Other substitutions rebuild the module, as in the default mode.
+
+    Args:
+        code (str): The code to wrap.
+        incremental (bool, optional): Whether to substitute values incrementally. Defaults to False.
+    """
+
     GLOBAL_SCOPE = ""
     ANY_SCOPE = None
 
-    def __init__(self, code: str) -> None:
-        self._update_wrapper(cst.parse_module(code))
+    def __init__(self, code: str, incremental: bool = False) -> None:
+        self.incremental = incremental
+        self._overrides: dict[cst.BaseExpression, cst.BaseExpression] = {}
+        # indentation of the statements of the overridden values
+        self._override_indents: dict[cst.BaseExpression, str] = {}
+        with phase("parse"):
+            module = cst.parse_module(code)
+        # parsing then generating code gives back the same code
+        self._update_wrapper(module, code, parsed=True)
 
     @classmethod
-    def from_file(cls, file_path: str | Path) -> Self:
-        file_path = Path(file_path)
-        return cls(file_path.read_text())
+    def from_file(cls, file_path: str | Path, incremental: bool = False) -> Self:
+        with phase("read"):
+            code = Path(file_path).read_text()
+        return cls(code, incremental)
 
-    def _get_scopes(self) -> dict[str, metadata.Scope]:
-        all_scopes = set(self.wrapper.resolve(metadata.ScopeProvider).values())
-        return {
-            scope_name: scope
-            for scope in all_scopes
-            if (scope_name := try_resolve_scope_name(scope)) is not None
-        }
+    def _get_scopes(self) -> dict[str, list[NestedScope]]:
+        return self._get_index().scopes
+
+    def _get_index(self) -> _AssignementIndex:
+        if self._index is None:
+            with phase("index"):
+                self._resolve_metadata()
+                self._index = _AssignementIndex(self.wrapper, self._overrides, self._renderer)
+        return self._index
 
     @property
     def code(self) -> str:
-        return node_to_string(self.wrapper.module)
-
-    def _update_wrapper(self, module: cst.Module):
-        self.wrapper = metadata.MetadataWrapper(module)
+        if self._code is None:
+            with phase("codegen"):
+                self._code = self._splice_overrides()[0]
+        return self._code
+
+    def _update_wrapper(self, module: cst.Module, source: str = None, parsed: bool = False):
+        # MetadataWrapper copies modules in case a node appears twice in the tree, which cannot happen with
+        # modules the wrapper just parsed, and owns
+        self.wrapper = metadata.MetadataWrapper(module, unsafe_skip_copy=parsed)
+        # metadata refers to the nodes of the copy, if any
+        self._renderer = SourceRenderer(self.wrapper.module, source)
+        self._code = None
+        self._overrides.clear()
+        self._override_indents.clear()
+        self._index = None
+        # metadata is resolved once per MetadataWrapper, later uses are not phases
+        self._metadata_resolved = False
+
+    def _resolve_metadata(self) -> None:
+        if not self._metadata_resolved:
+            resolve_metadata(self.wrapper)
+            self._metadata_resolved = True
+
+    def _splice_overrides(self) -> tuple[str, list[tuple[int, int, int]]]:
+        """Splice overridden values into the source of the module.
+
+        Returns:
+            tuple[str, list[tuple[int, int, int]]]: The code, and the start and end of every overridden span
+                in the source along with the shift of the code that follows it, sorted by start.
+        """
+        source = self._renderer.source
+        if not self._overrides:
+            return source, []
+        edits = sorted(
+            (*self._renderer.span(value), self._render_override(new_value, self._override_indents[value]))
+            for value, new_value in self._overrides.items()
+        )
+        parts, shifts = [], []
+        last_end = shift = 0
+        for start, end, new_value in edits:
+            parts += [source[last_end:start], new_value]
+            shift += len(new_value) - (end - start)
+            shifts.append((start, end, shift))
+            last_end = end
+        parts.append(source[last_end:])
+        return "".join(parts), shifts
+
+    def _render_override(self, new_value: cst.BaseExpression, indent: str) -> str:
+        """Render an overriding value like the substitutor does, in a statement indented by `indent`."""
+        code = self._renderer(new_value)
+        if indent and ("\n" in code or "\r" in code):
+            # libcst indents the lines of values continued within brackets like their statement
+            return expression_to_string(new_value, indent)
+        return code
 
     def list_scope_names(self) -> list[str]:
         return list(self._get_scopes().keys())
 
+    def list_class_scope_names(self) -> list[str]:
+        """Names of the classes nested in classes only, e.g. `Outer.Inner`, in code order."""
+        return [
+            scope_name for scope_name, scopes in self._get_scopes().items()
+            if all(scope.is_class_body() for scope in scopes)
+        ]
+
     def analyze_assigns(self, scope_name: str = None) -> list[AssignementWrapper]:
-        assignements = []
-        for match in m.findall(self.wrapper, statement_matcher):
-            assignement = AssignementWrapper(match, self.wrapper)
-            if scope_name is None or assignement.scope_as_string() == scope_name:
-                assignements.append(assignement)
-        return assignements
-
-    def _substitute_assign_values(
-        self, mapping: dict[str, str], scope: metadata.Scope = None
-    ) -> dict[str, str]:
-        substitutor = Substitutor(mapping, scope)
-        new_module = self.wrapper.visit(substitutor)
+        """The substitutable assignments of every scope named `scope_name`, or of all scopes, in code order."""
+        index = self._get_index()
+        if scope_name is self.ANY_SCOPE:
+            return list(index.assignements)
+        return list(index.by_scope_name.get(scope_name, []))
+
+    def get_assign(self, name: str, scope_name: str = GLOBAL_SCOPE) -> AssignementWrapper | None:
+        """The substitutable assignment of `name` in a scope, the first one if several scopes have this name, or None
+        if there is none."""
+        index = self._get_index()
+        for scope in index.scopes.get(scope_name, []):
+            if (assignement := index.by_scope[scope].get(name)) is not None:
+                return assignement
+        return None
+
+    def analyze_records(self, scope_name: str = None) -> list[AssignementRecord]:
+        """Like `analyze_assigns`, but returning records detached from the module, whose spans refer to `code`.
+
+        Bare annotations, e.g. `x: int` in a dataclass, have no value to substitute in place, and have no record.
+        """
+        assignements = self._analyze_valued_assigns(scope_name)
+        return [
+            assignement.to_record(span, indent)
+            for assignement, span, indent in zip(assignements, self.value_spans(assignements), self._indents(assignements))
+        ]
+
+    def _analyze_valued_assigns(self, scope_name: str = None) -> list[AssignementWrapper]:
+        """Like `analyze_assigns`, leaving out bare annotations."""
+        return [assignement for assignement in self.analyze_assigns(scope_name) if assignement.value is not None]
+
+    def _substitute_assign_values(self, mappings: dict[str | None, dict[str, str]]) -> dict[str | None, dict[str, str]]:
+        if self.incremental:
+            remaining = self._override_assign_values(mappings)
+            if remaining is not None:
+                return remaining
+            # materialize the overrides, so that the substitutor sees the current values
+            if self._overrides:
+                with phase("parse"):
+                    module = cst.parse_module(self.code)
+                self._update_wrapper(module, parsed=True)
+        substitutor, scopes = self._scoped_substitutor(mappings)
+        self._resolve_metadata()
+        with phase("substitute"):
+            new_module = self.wrapper.visit(substitutor)
         self._update_wrapper(new_module)
-        return substitutor.retrieve_non_substituted()
+        return self._retrieve_non_substituted(substitutor, scopes)
+
+    def _override_assign_values(
+        self, mappings: dict[str | None, dict[str, str]]
+    ) -> dict[str | None, dict[str, str]] | None:
+        """Record new values as overrides, leaving the module and its metadata untouched.
+
+        Returns:
+            dict[str | None, dict[str, str]] | None: The items of every mapping that were not substituted, or None if some
+                new value may change the scopes of the code, in which case nothing is substituted.
+        """
+        values = dict(zip(mappings, parse_scoped_values(mappings.items())))
+        index = self._get_index()
+        new_values, remaining = {}, {}
+        # names mapped in their own scope take precedence over names mapped in every scope
+        for scope_name in sorted(mappings, key=lambda scope_name: scope_name is not self.ANY_SCOPE):
+            mapping = mappings[scope_name]
+            if scope_name is self.ANY_SCOPE:
+                # assignments mapped in their own scope are left to that mapping
+                assignements = [
+                    assignement for assignement in index.assignements
+                    if assignement.name in mapping and not (
+                        (own_scope := assignement.scope_as_string()) is not None
+                        and assignement.name in mappings.get(own_scope, ())
+                    )
+                ]
+            else:
+                assignements = [
+                    scope_assignements[name]
+                    for scope in index.scopes[scope_name]
+                    for name in mapping
+                    if name in (scope_assignements := index.by_scope[scope])
+                ]
+            substituted = set()
+            indents = self._indents(assignements)
+            for assignement, indent in zip(assignements, indents):
+                new_value = values[scope_name][assignement.name]
+                # bare annotations gain a value, which only the substitutor inserts
+                if assignement.value is None or changes_scopes(new_value):
+                    return None
+                new_values[assignement._value] = (new_value, indent)
+                substituted.add(assignement.name)
+            remaining[scope_name] = {k: v for k, v in mapping.items() if k not in substituted}
+        for value, (new_value, indent) in new_values.items():
+            self._overrides[value] = new_value
+            self._override_indents[value] = indent
+        self._code = None
+        return {scope_name: remaining[scope_name] for scope_name in mappings}
 
     def substitute_assign_values(self, mapping: dict[str, str], scope_name: str = None):
-        if scope_name is self.ANY_SCOPE:
-            scope = None
-        else:
-            scope = self._get_scopes()[scope_name]
-        return self._substitute_assign_values(mapping, scope)
+        return self._substitute_assign_values({scope_name: mapping})[scope_name]
 
     def substitute_assign_values_global(self, mapping: dict[str, str]):
         return self.substitute_assign_values(
             scope_name=self.GLOBAL_SCOPE, mapping=mapping
         )
 
+    def substitute_assign_values_by_scope(self, mappings: dict[str | None, dict[str, str]]) -> dict[str | None, dict[str, str]]:
+        """Substitute values in several scopes at once, in a single traversal of the code.
+
+        Args:
+            mappings (dict[str | None, dict[str, str]]): Scope names, such as `""` for the global scope or `"Outer.Inner"`,
+                mapped to variable names mapped to the source of their new values. Names mapped to `ANY_SCOPE` are
+                substituted in every scope, unless mapped in their own scope as well.
+
+        Raises:
+            KeyError: Some scope does not exist, in which case nothing is substituted.
+            SubstitutionValueError: Some values are invalid, reported all at once by qualified name, e.g. `MyClass.X`.
+
+        Returns:
+            dict[str | None, dict[str, str]]: The items of every mapping that were not substituted, keyed by scope name.
+        """
+        # unknown scopes are reported before anything is substituted
+        for scope_name in mappings:
+            self._resolve_scopes(scope_name)
+        return self._substitute_assign_values(dict(mappings))
+
+    def _resolve_scopes(self, scope_name: str = None) -> list[NestedScope | None]:
+        """Every scope named `scope_name`, or `[None]` for any scope.
+
+        Raises:
+            KeyError: No scope has this name.
+        """
+        if scope_name is self.ANY_SCOPE:
+            return [None]
+        return self._get_scopes()[scope_name]
+
+    def _scoped_substitutor(
+        self, mappings: dict[str | None, dict[str, str]]
+    ) -> tuple[Substitutor, dict[str | None, list[NestedScope | None]]]:
+        """A `Substitutor` of every mapping in every scope of its name, along with these scopes."""
+        scopes = {scope_name: self._resolve_scopes(scope_name) for scope_name in mappings}
+        substitutor = Substitutor(scopes={
+            scope: mappings[scope_name] for scope_name, named_scopes in scopes.items() for scope in named_scopes
+        })
+        return substitutor, scopes
+
+    @staticmethod
+    def _retrieve_non_substituted(
+        substitutor: Substitutor, scopes: dict[str | None, list[NestedScope | None]]
+    ) -> dict[str | None, dict[str, str]]:
+        """Items of every mapping substituted in none of the scopes of its name, keyed by scope name."""
+        remaining = substitutor.retrieve_non_substituted_by_scope()
+        return {
+            scope_name: {
+                name: value for name, value in remaining[named_scopes[0]].items()
+                if all(name in remaining[scope] for scope in named_scopes[1:])
+            }
+            for scope_name, named_scopes in scopes.items()
+        }
+
+    def _render(self, mapping: dict[str, str], scope_name: str = GLOBAL_SCOPE) -> tuple[str, dict[str, str]]:
+        substitutor, scopes = self._scoped_substitutor({scope_name: mapping})
+        self._resolve_metadata()
+        with phase("substitute"):
+            new_module = self.wrapper.visit(substitutor)
+        with phase("codegen"):
+            return new_module.code, self._retrieve_non_substituted(substitutor, scopes)[scope_name]
+
+    def render(self, mapping: dict[str, str], scope_name: str = GLOBAL_SCOPE) -> tuple[str, dict[str, str]]:
+        """Render the code with substituted values, leaving the wrapped code untouched.
+
+        Args:
+            mapping (dict[str, str]): Variable names mapped to the source of their new values.
+            scope_name (str, optional): Scope in which to substitute. Defaults to the global scope.
+
+        Returns:
+            tuple[str, dict[str, str]]: The rendered code and the items of `mapping` that were not substituted.
+        """
+        if self._overrides:
+            # the module does not hold the overridden values
+            return self.compile_template(scope_name).render(mapping)
+        return self._render(mapping, scope_name)
+
+    def render_edits(self, mapping: dict[str, str], scope_name: str = GLOBAL_SCOPE) -> tuple[list[TextEdit], dict[str, str]]:
+        """Like `render`, returning the edits to apply to `code` instead of the rendered code, see `foo2bar.edits`.
+
+        Returns:
+            tuple[list[TextEdit], dict[str, str]]: The edits sorted by start, and the items of `mapping` that were not substituted.
+        """
+        return self.compile_template(scope_name).render_edits(mapping)
+
+    def compile_template(self, scope_name: str = GLOBAL_SCOPE) -> SubstitutionTemplate:
+        """Record the source span of every assignment value of a scope into a `SubstitutionTemplate`.
+
+        Args:
+            scope_name (str, optional): Scope in which to substitute. Defaults to the global scope.
+
+        Returns:
+            SubstitutionTemplate: A template rendering the current code with substituted values. Bare annotations have
+                no slot.
+        """
+        assignements = self._analyze_valued_assigns(scope_name)
+        slots = [
+            TemplateSlot(assignement.name, *span, indent)
+            for assignement, span, indent in zip(assignements, self.value_spans(assignements), self._indents(assignements))
+        ]
+        return SubstitutionTemplate(self.code, slots)
+
+    def _indents(self, assignements: Iterable[AssignementWrapper]) -> list[str]:
+        """Indentation of the statement of every assignment, the same in the source and in the current code."""
+        source = self._renderer.source
+        return [line_indent(source, self._renderer.span(assignement._node.body[0])[0]) for assignement in assignements]
+
+    def value_spans(self, assignements: Iterable[AssignementWrapper]) -> list[tuple[int, int]]:
+        """Character span of the value of every assignement in the current code, parentheses included.
+
+        Bare annotations have no value, and are left out.
+        """
+        spans = [self._renderer.span(assignement._value) for assignement in assignements if assignement._value is not None]
+        if not self._overrides:
+            return spans
+
+        # shift the spans in the source to the code where overridden values are spliced in
+        _, shifts = self._splice_overrides()
+        starts = [start for start, _, _ in shifts]
+        shifted_spans = []
+        for start, end in spans:
+            index = bisect_left(starts, start)
+            start_shift = shifts[index - 1][2] if index > 0 else 0
+            overridden = index < len(shifts) and shifts[index][0] == start
+            end_shift = shifts[index][2] if overridden else start_shift
+            shifted_spans.append((start + start_shift, end + end_shift))
+        return shifted_spans
+
+    def render_many(
+        self, mappings: Iterable[dict[str, str]], scope_name: str = GLOBAL_SCOPE
+    ) -> Iterator[str]:
+        """Lazily render one variant of the code per mapping.
+
+        The code is analyzed only once, and every variant is rendered by splicing new values into the source.
+
+        Args:
+            mappings (Iterable[dict[str, str]]): Mappings of variable names to the source of their new values.
+            scope_name (str, optional): Scope in which to substitute. Defaults to the global scope.
+
+        Yields:
+            str: The rendered code for each mapping, in order.
+        """
+        return self.compile_template(scope_name).render_many(mappings)
+
 
 def _test():
     my_wrapper = CodeWrapper.from_file("test_data/test_script.py")
@@ -0,0 +1,111 @@
+import asyncio
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from textwrap import dedent
+
+from foo2bar.aio import AsyncWorkerPool
+from foo2bar.bench import synthetic_script
+from foo2bar.cache import AnalysisCache
+from foo2bar.wrapper import CodeWrapper
+
+CODE = dedent("""\
+x = 10  # comment
+y = [1, 2]
+class C:
+    x = 20
+""")
+
+
+class TestAsyncWorkerPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = AsyncWorkerPool(max_workers=2)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.script = Path(self.tmp_dir.name) / "script.py"
+        self.script.write_text(CODE)
+
+    async def asyncTearDown(self):
+        self.pool.close()
+        self.tmp_dir.cleanup()
+
+    async def test_substitute(self):
+        code, remaining = await self.pool.substitute_assign_values_global(CODE, {"x": "1", "z": "2"})
+        self.assertEqual(code, CODE.replace("x = 10", "x = 1"))
+        self.assertEqual(remaining, {"z": "2"})
+        code, _ = await self.pool.substitute_assign_values(CODE, {"x": "1"}, "C")
+        self.assertEqual(code, CODE.replace("x = 20", "x = 1"))
+        code, _ = await self.pool.substitute_assign_values(CODE, {"x": "1"})
+        self.assertEqual(code.count("x = 1"), 2)
+
+    async def test_substitute_file(self):
+        expected = CodeWrapper(CODE)
+        expected.substitute_assign_values_global({"y": "()"})
+        self.assertEqual(await self.pool.substitute_file_global(self.script, {"y": "()"}), (expected.code, {}))
+
+    async def test_analyze_file(self):
+        cache = AnalysisCache(self.tmp_dir.name)
+        analysis = await self.pool.analyze_file(self.script, cache)
+        self.assertEqual(analysis.source, CODE)
+        self.assertEqual([a.name for a in analysis.analyze_assigns(analysis.GLOBAL_SCOPE)], ["x", "y"])
+        self.assertIsNotNone(cache.get(CODE))
+
+    async def test_render_many(self):
+        analysis = await self.pool.analyze_file(self.script)
+        mappings = [{"x": str(value)} for value in range(10)]
+        variants = await self.pool.render_many(analysis.compile_template(), mappings, chunksize=3)
+        self.assertEqual(variants, [CODE.replace("x = 10", f"x = {value}") for value in range(10)])
+
+    async def test_render_many_error(self):
+        analysis = await self.pool.analyze_file(self.script)
+        with self.assertRaises(ExceptionGroup):
+            await self.pool.render_many(analysis.compile_template(), [{"x": "1"}, {"x": 2}], chunksize=1)
+
+    async def test_event_loop_not_blocked(self):
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.001)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        # warm up the pool, so that ticks are counted during the substitution only
+        await self.pool.substitute_assign_values_global("x = 1\n", {})
+        ticks = 0
+        await self.pool.substitute_assign_values_global(synthetic_script(2000), {"epochs_0": "1"})
+        ticker.cancel()
+        self.assertGreater(ticks, 10)
+
+
+class TestConcurrency(unittest.IsolatedAsyncioTestCase):
+    async def test_bounded_and_cancelled(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def blocking(name):
+            calls.append(name)
+            started.set()
+            release.wait(5)
+            return name
+
+        with ThreadPoolExecutor(4) as executor:
+            pool = AsyncWorkerPool(max_concurrency=1, executor=executor)
+            first = asyncio.create_task(pool.run(blocking, "first"))
+            second = asyncio.create_task(pool.run(blocking, "second"))
+            await asyncio.to_thread(started.wait, 5)
+            # the second job waits for the first one, and is never submitted once cancelled
+            second.cancel()
+            release.set()
+            self.assertEqual(await first, "first")
+            with self.assertRaises(asyncio.CancelledError):
+                await second
+            self.assertEqual(await pool.run(blocking, "third"), "third")
+            pool.close()
+        self.assertEqual(calls, ["first", "third"])
+
+
+if __name__ == "__main__":
+    unittest.main()
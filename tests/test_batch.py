@@ -0,0 +1,132 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from textwrap import dedent
+
+from foo2bar.batch import (
+    MANIFEST_NAME,
+    GridError,
+    collect_scripts,
+    expand_grid,
+    is_script_collection,
+    parse_grid_option,
+    split_values,
+    substitute_files,
+    sweep,
+    variant_file_names,
+)
+from foo2bar.wrapper import CodeWrapper
+
+
+class TestGrid(unittest.TestCase):
+    def test_split_values(self):
+        self.assertEqual(split_values("1,2,4"), ["1", "2", "4"])
+        self.assertEqual(split_values("1, (2, 3), 'a,b', [4, 5]"), ["1", "(2, 3)", "'a,b'", "[4, 5]"])
+        with self.assertRaises(GridError):
+            split_values("1,,2")
+        with self.assertRaises(GridError):
+            split_values("(1, 2")
+
+    def test_parse_grid_option(self):
+        self.assertEqual(parse_grid_option("lr=0.1,0.01"), ("lr", ["0.1", "0.01"]))
+        self.assertEqual(parse_grid_option("Model.lr=0.1"), ("Model.lr", ["0.1"]))
+        with self.assertRaises(GridError):
+            parse_grid_option("lr")
+        with self.assertRaises(GridError):
+            parse_grid_option("not a name=1")
+
+    def test_expand_grid(self):
+        combinations = expand_grid({"x": ["1", "2"], "lr": ["0.1", "0.01"]})
+        self.assertEqual(combinations, [
+            {"x": "1", "lr": "0.1"},
+            {"x": "1", "lr": "0.01"},
+            {"x": "2", "lr": "0.1"},
+            {"x": "2", "lr": "0.01"},
+        ])
+        self.assertEqual(expand_grid({}), [{}])
+
+    def test_variant_file_names(self):
+        self.assertEqual(variant_file_names(Path("dir/job.py"), 2), ["job_0.py", "job_1.py"])
+        self.assertEqual(variant_file_names(Path("job.py"), 11)[:2], ["job_00.py", "job_01.py"])
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.sample_code = dedent("""\
+        x = 10  # comment
+        lr: float = 0.5
+        """)
+        self.template = CodeWrapper(self.sample_code).compile_template()
+        self.mappings = expand_grid({"x": ["1", "2"], "lr": ["0.1", "0.01"]})
+
+    def _check_sweep(self, max_workers: int):
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest = sweep(self.template, self.mappings, output_dir, "job.py", max_workers=max_workers)
+            self.assertEqual(list(manifest), ["job_0.py", "job_1.py", "job_2.py", "job_3.py"])
+            self.assertEqual(json.loads((Path(output_dir) / MANIFEST_NAME).read_text()), manifest)
+            for file_name, mapping in manifest.items():
+                self.assertEqual((Path(output_dir) / file_name).read_text(), self.template.render(mapping)[0])
+
+    def test_sweep_in_process(self):
+        self._check_sweep(max_workers=1)
+
+    def test_sweep_process_pool(self):
+        self._check_sweep(max_workers=2)
+
+    def test_sweep_edits(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest = sweep(self.template, self.mappings, output_dir, "job.py", max_workers=1, output_format="json-edits")
+            self.assertEqual(list(manifest)[0], "job_0.py.json")
+            self.assertEqual(json.loads((Path(output_dir) / "job_0.py.json").read_text()), [[4, 6, "1"], [30, 33, "0.1"]])
+            manifest = sweep(self.template, self.mappings, output_dir, "job.py", max_workers=1, output_format="patch")
+            self.assertTrue((Path(output_dir) / "job_3.py.patch").read_text().startswith("--- a/job.py\n+++ b/job.py\n"))
+            with self.assertRaises(ValueError):
+                sweep(self.template, self.mappings, output_dir, "job.py", output_format="zip")
+
+
+class TestSubstituteFiles(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.jobs_dir = self.tmp_dir / "jobs"
+        (self.jobs_dir / "nested").mkdir(parents=True)
+        (self.jobs_dir / "first.py").write_text("x = 1  # comment\ny = 2\n")
+        (self.jobs_dir / "nested" / "second.py").write_text("x = 3\n")
+        (self.jobs_dir / "notes.txt").write_text("x = 4\n")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_is_script_collection(self):
+        self.assertTrue(is_script_collection(self.jobs_dir))
+        self.assertTrue(is_script_collection(self.jobs_dir / "*.py"))
+        self.assertFalse(is_script_collection(self.jobs_dir / "first.py"))
+
+    def test_collect_scripts_directory(self):
+        base_dir, scripts = collect_scripts(self.jobs_dir)
+        self.assertEqual(base_dir, self.jobs_dir)
+        self.assertEqual(scripts, [self.jobs_dir / "first.py", self.jobs_dir / "nested" / "second.py"])
+
+    def test_collect_scripts_glob(self):
+        base_dir, scripts = collect_scripts(self.jobs_dir / "**" / "s*.py")
+        self.assertEqual(base_dir, self.jobs_dir)
+        self.assertEqual(scripts, [self.jobs_dir / "nested" / "second.py"])
+
+    def _check_substitute_files(self, max_workers: int):
+        base_dir, scripts = collect_scripts(self.jobs_dir)
+        output_dir = self.tmp_dir / "out"
+        remainings = substitute_files(scripts, {"x": "10", "y": "20"}, output_dir, base_dir, max_workers=max_workers)
+        self.assertEqual(remainings, {scripts[0]: {}, scripts[1]: {"y": "20"}})
+        self.assertEqual((output_dir / "first.py").read_text(), "x = 10  # comment\ny = 20\n")
+        self.assertEqual((output_dir / "nested" / "second.py").read_text(), "x = 10\n")
+
+    def test_substitute_files_in_process(self):
+        self._check_substitute_files(max_workers=1)
+
+    def test_substitute_files_process_pool(self):
+        self._check_substitute_files(max_workers=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
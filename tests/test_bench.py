@@ -0,0 +1,86 @@
+import io
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from pathlib import Path
+from unittest import mock
+
+import libcst as cst
+
+from foo2bar.bench import synthetic_script
+from foo2bar.bench import evaluation, extraction, literals, scanner, substitution, suite
+from foo2bar.wrapper import CodeWrapper
+
+
+class TestBench(unittest.TestCase):
+    def test_synthetic_script(self):
+        code = synthetic_script(100)
+        cst.parse_module(code)
+        self.assertEqual(code.count("\n"), 100)
+        assigns = CodeWrapper(code).analyze_assigns("")
+        self.assertEqual(len(assigns), 20)
+
+    def test_extraction_benchmark(self):
+        self.assertEqual(set(extraction.benchmark(40, repeat=1)), {"matcher", "extractor"})
+
+    def test_evaluation_benchmark(self):
+        self.assertEqual(set(evaluation.benchmark(5, repeat=1)), {"uncached", "cached", "warm"})
+
+    def test_literals_benchmark(self):
+        self.assertEqual(set(literals.benchmark(40, repeat=1)), {"restricted", "code", "nodes"})
+
+    def test_substitution_benchmark(self):
+        code = substitution.parameters_then_functions(100)
+        self.assertEqual(len(CodeWrapper(code).analyze_assigns("")), substitution.PARAMETERS)
+        self.assertEqual(set(substitution.benchmark(100, repeat=1)), {"full", "pruned"})
+
+    def test_scanner_benchmark(self):
+        self.assertEqual(set(scanner.benchmark(100, repeat=1)), {"libcst", "scanner"})
+
+
+class TestSuite(unittest.TestCase):
+    def test_templated_script(self):
+        code = suite.templated_script(1000)
+        self.assertAlmostEqual(code.count("\n"), 1000, delta=10)
+        wrapper = CodeWrapper(code)
+        # every tenth parameter is marked as "no param"
+        self.assertEqual(len(wrapper.analyze_assigns("")), 18)
+        self.assertIn("Scope4.run", wrapper.list_scope_names())
+        small = CodeWrapper(suite.templated_script(100, parameters=0, scopes=2))
+        self.assertEqual(small.analyze_assigns(""), [])
+        self.assertEqual(len(small.analyze_assigns()), 6)
+
+    def test_compare(self):
+        baseline = {"results": {"100": {"from_file": 0.01, "code": 0.0001}}}
+        results = {"results": {"100": {"from_file": 0.02, "code": 0.0005, "startup": 1.0}, "1000": {"code": 1.0}}}
+        self.assertEqual(suite.compare(results, baseline), [suite.Regression("100", "from_file", 0.01, 0.02)])
+        self.assertEqual(suite.compare(results, baseline, tolerance=1.5), [])
+
+    def test_run_suite_up_to_100k_lines(self):
+        self.assertEqual(suite.SIZES[-1], 100_000)
+        with mock.patch.object(suite, "benchmark", return_value={}) as benchmark:
+            results = suite.run_suite(repeat=3, startup=False)
+        self.assertEqual(list(results["results"]), ["100", "1000", "10000", "100000"])
+        self.assertEqual([call.args[:2] for call in benchmark.call_args_list], [(100, 3), (1000, 3), (10000, 3), (100_000, 1)])
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory, redirect_stderr(io.StringIO()) as stderr:
+            output = Path(directory) / "results.json"
+            self.assertEqual(suite.main(["--sizes", "100", "--repeat", "1", "--no-startup", "--output", str(output)]), 0)
+            results = json.loads(output.read_text())
+            self.assertEqual(set(results["results"]["100"]), {
+                "from_file", "analyze_assigns", "list_scope_names", "substitute_assign_values_global", "code",
+                "parse_arguments",
+            })
+            # every step is slower than a baseline taking no time
+            baseline = Path(directory) / "baseline.json"
+            results["results"]["100"] = {step: 0.0 for step in results["results"]["100"]}
+            baseline.write_text(json.dumps(results))
+            args = ["--sizes", "100", "--repeat", "1", "--no-startup", "--output", str(output), "--baseline", str(baseline)]
+            self.assertEqual(suite.main(args), 1)
+        self.assertIn("Regression: from_file on 100 lines", stderr.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
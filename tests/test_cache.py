@@ -0,0 +1,176 @@
+import tempfile
+import unittest
+from pathlib import Path
+from textwrap import dedent
+from unittest import mock
+
+from foo2bar.cache import AnalysisCache, MemoryAnalysisCache, ScriptAnalysis, analyze_file
+from foo2bar.records import AssignementRecord
+from foo2bar.wrapper import CodeWrapper
+
+
+class TestScriptAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.sample_code = dedent("""\
+        x = 10  # comment
+        y: int = (20)
+        class MyClass:
+            a = 40  # in class
+        """)
+        self.wrapper = CodeWrapper(self.sample_code)
+        self.analysis = ScriptAnalysis.from_wrapper(self.wrapper)
+
+    def test_from_wrapper(self):
+        self.assertEqual(self.analysis.source, self.sample_code)
+        self.assertEqual(self.analysis.assignements, [
+            AssignementRecord("x", "", None, "10", "# comment", 4, 6),
+            AssignementRecord("y", "", "int", "(20)", None, 27, 31),
+            AssignementRecord("a", "MyClass", None, "40", "# in class", 55, 57, "    "),
+        ])
+
+    def test_bare_annotations_have_no_record(self):
+        wrapper = CodeWrapper(dedent("""\
+        lr = 0.1
+        @dataclass
+        class P:
+            name: str
+            size: int = 3
+        """))
+        analysis = ScriptAnalysis.from_wrapper(wrapper)
+        self.assertEqual([a.qualified_name for a in analysis.assignements], ["lr", "P.size"])
+        self.assertEqual(analysis.compile_scoped_template().render({"P.size": "4"})[0], wrapper.code.replace("3", "4"))
+
+    def test_class_scopes(self):
+        self.assertEqual(self.analysis.class_scopes, ["MyClass"])
+        wrapper = CodeWrapper(dedent("""\
+        class Outer:
+            class Inner:
+                def method(self):
+                    class Local:
+                        pass
+        def f():
+            class Local:
+                pass
+        """))
+        self.assertEqual(ScriptAnalysis.from_wrapper(wrapper).class_scopes, ["Outer", "Outer.Inner"])
+
+    def test_analyze_assigns(self):
+        self.assertEqual([a.name for a in self.analysis.analyze_assigns("")], ["x", "y"])
+        self.assertEqual([a.name for a in self.analysis.analyze_assigns("MyClass")], ["a"])
+        self.assertEqual(len(self.analysis.analyze_assigns()), 3)
+
+    def test_assignement_strings(self):
+        assignement = self.analysis.analyze_assigns("")[1]
+        wrapped = self.wrapper.analyze_assigns("")[1]
+        self.assertEqual(assignement.scope_as_string(), wrapped.scope_as_string())
+        self.assertEqual(assignement.value_as_string(), wrapped.value_as_string())
+        self.assertEqual(assignement.annotation_as_string(), wrapped.annotation_as_string())
+
+    def test_compile_template(self):
+        for scope_name in ["", "MyClass"]:
+            mapping = {"x": "1", "y": "2", "a": "3"}
+            self.assertEqual(
+                self.analysis.compile_template(scope_name).render(mapping),
+                self.wrapper.compile_template(scope_name).render(mapping),
+            )
+
+    def test_compile_scoped_template(self):
+        template = self.analysis.compile_scoped_template()
+        self.assertEqual(template.names(), ["x", "y", "MyClass.a"])
+        code, remaining = template.render({"x": "1", "MyClass.a": "3", "a": "4"})
+        wrapper = CodeWrapper(self.sample_code)
+        self.assertEqual(wrapper.substitute_assign_values_by_scope({"": {"x": "1", "a": "4"}, "MyClass": {"a": "3"}}), {"": {"a": "4"}, "MyClass": {}})
+        self.assertEqual(code, wrapper.code)
+        self.assertEqual(remaining, {"a": "4"})
+
+    def test_compile_scoped_template_indents_values(self):
+        code, _ = self.analysis.compile_scoped_template().render({"MyClass.a": "[1,\n 2]"})
+        wrapper = CodeWrapper(self.sample_code)
+        wrapper.substitute_assign_values({"a": "[1,\n 2]"}, "MyClass")
+        self.assertEqual(code, wrapper.code)
+        self.assertIn("    a = [1,\n     2]  # in class\n", code)
+
+
+class TestAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = AnalysisCache(self._tmp_dir.name)
+        self.script = Path(self._tmp_dir.name) / "script.py"
+        self.script.write_text("x = 10  # comment\n")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_key(self):
+        self.assertEqual(self.cache.key("x = 1"), self.cache.key("x = 1"))
+        self.assertNotEqual(self.cache.key("x = 1"), self.cache.key("x = 2"))
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get("x = 1"))
+
+    def test_analyze_stores_entry(self):
+        analysis = self.cache.analyze_file(self.script)
+        cached = self.cache.get(self.script.read_text())
+        self.assertIsNotNone(cached)
+        self.assertEqual(cached.assignements, analysis.assignements)
+
+    def test_entry_stores_class_scopes(self):
+        self.script.write_text("class A:\n    x = 1\ndef f():\n    y = 2\n")
+        self.cache.analyze_file(self.script)
+        self.assertEqual(self.cache.get(self.script.read_text()).class_scopes, ["A"])
+
+    def test_analyze_skips_parsing_when_cached(self):
+        expected = self.cache.analyze_file(self.script)
+        with mock.patch("foo2bar.wrapper.CodeWrapper", side_effect=AssertionError("parsed again")):
+            self.assertEqual(analyze_file(self.script, self.cache).assignements, expected.assignements)
+
+    def test_changed_script_is_analyzed_again(self):
+        self.cache.analyze_file(self.script)
+        self.script.write_text("x = 10  # comment\ny = 5\n")
+        self.assertEqual([a.name for a in self.cache.analyze_file(self.script).assignements], ["x", "y"])
+
+    def test_unreadable_entry_is_ignored(self):
+        source = self.script.read_text()
+        (Path(self._tmp_dir.name) / f"{self.cache.key(source)}.json").write_text("{not json")
+        self.assertIsNone(self.cache.get(source))
+        self.assertEqual([a.name for a in self.cache.analyze(source).assignements], ["x"])
+
+
+class TestMemoryAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.cache = MemoryAnalysisCache(maxsize=2)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _write_script(self, name: str, code: str) -> Path:
+        script = self.tmp_dir / name
+        script.write_text(code)
+        return script
+
+    def test_same_file_is_analyzed_once(self):
+        script = self._write_script("a.py", "x = 1\n")
+        analysis = self.cache.analyze_file(script)
+        self.assertIs(self.cache.analyze_file(script), analysis)
+
+    def test_modified_file_is_analyzed_again(self):
+        script = self._write_script("a.py", "x = 1\n")
+        self.cache.analyze_file(script)
+        self._write_script("a.py", "x = 1\ny = 2\n")
+        self.assertEqual([a.name for a in self.cache.analyze_file(script).assignements], ["x", "y"])
+        self.assertEqual(len(self.cache), 1)
+
+    def test_least_recently_used_is_evicted(self):
+        scripts = [self._write_script(f"{name}.py", "x = 1\n") for name in "abc"]
+        first = self.cache.analyze_file(scripts[0])
+        self.cache.analyze_file(scripts[1])
+        self.cache.analyze_file(scripts[0])
+        self.cache.analyze_file(scripts[2])
+        self.assertEqual(len(self.cache), 2)
+        self.assertIs(self.cache.analyze_file(scripts[0]), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from textwrap import dedent
+
+from foo2bar.cache import MemoryAnalysisCache
+from foo2bar.cli import parse_arguments, run
+
+
+class TestScopedOptions(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.script = Path(self._tmp_dir.name) / "script.py"
+        self.script.write_text(dedent("""\
+        x = 1
+        class Outer:
+            x = 2
+            class Inner:
+                x = 3
+        f = lambda: 0
+        """))
+        self.cache = MemoryAnalysisCache()
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _run(self, *argv: str) -> str:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            run([str(self.script), *argv], cache=self.cache)
+        return output.getvalue()
+
+    def test_options(self):
+        arguments = parse_arguments([str(self.script), "raw", "--Outer.Inner.x", "4"], cache=self.cache)["arguments"]
+        self.assertEqual(list(arguments), ["x", "f", "Outer.x", "Outer.Inner.x"])
+        self.assertEqual(arguments["Outer.Inner.x"], "4")
+
+    def test_function_locals_are_no_options(self):
+        self.script.write_text(dedent("""\
+        class MyClass:
+            X = 1
+            def method(self):
+                y = 2
+        def my_function():
+            s = 3
+            class Local:
+                z = 4
+        """))
+        arguments = parse_arguments([str(self.script), "raw"], cache=self.cache)["arguments"]
+        self.assertEqual(list(arguments), ["MyClass.X"])
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            parse_arguments([str(self.script), "raw", "--my_function.s", "5"], cache=self.cache)
+
+    def test_bare_annotations(self):
+        self.script.write_text("from dataclasses import dataclass\nlr = 0.1\n@dataclass\nclass P:\n    name: str\n")
+        code = self._run("raw", "--lr", "0.2")
+        self.assertEqual(code, "from dataclasses import dataclass\nlr = 0.2\n@dataclass\nclass P:\n    name: str\n\n")
+
+    def test_classes_of_the_same_name_share_options(self):
+        self.script.write_text("if a:\n    class C:\n        x = 1\nelse:\n    class C:\n        x = 2\n")
+        code = self._run("raw", "--C.x", "3")
+        self.assertEqual(code, "if a:\n    class C:\n        x = 3\nelse:\n    class C:\n        x = 3\n\n")
+
+    def test_substitute_scopes(self):
+        code = self._run("raw", "--x", "10", "--Outer.x", "20", "--Outer.Inner.x", "30")
+        self.assertEqual(code, "x = 10\nclass Outer:\n    x = 20\n    class Inner:\n        x = 30\nf = lambda: 0\n\n")
+        code = self._run("typed", "--Outer.Inner.x", "30")
+        self.assertIn("        x = 30\n", code)
+        self.assertIn("    x = 2\n", code)
+
+    def test_formats(self):
+        diff = self._run("raw", "--Outer.x", "20", "--format", "diff")
+        path = self.script.as_posix()
+        self.assertEqual(diff.splitlines()[:3], [f"--- {path}", f"+++ {path}", "@@ -1,6 +1,6 @@"])
+        self.assertIn("\n-    x = 2\n+    x = 20\n", diff)
+        patch = self._run("raw", "--Outer.x", "20", "--format", "patch")
+        self.assertEqual(patch.splitlines()[:2], [f"--- a/{path.lstrip('/')}", f"+++ b/{path.lstrip('/')}"])
+        self.assertEqual(patch.splitlines()[2:], diff.splitlines()[2:])
+        edits = self._run("raw", "--x", "10", "--Outer.x", "20", "--format", "json-edits")
+        self.assertEqual(json.loads(edits), [[4, 5, "10"], [27, 28, "20"]])
+
+    def test_sweep_scopes(self):
+        output_dir = Path(self._tmp_dir.name) / "out"
+        self._run("sweep", "--grid", "Outer.x=20,21", "--Outer.Inner.x", "30", "--output-dir", str(output_dir))
+        variant = (output_dir / "script_1.py").read_text()
+        self.assertIn("    x = 21\n", variant)
+        self.assertIn("        x = 30\n", variant)
+
+
+class TestReservedOptions(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.script = self.tmp_dir / "script.py"
+        self.cache = MemoryAnalysisCache()
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def _run(self, code: str, *argv: str) -> str:
+        self.script.write_text(code)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            run([str(self.script), *argv], cache=self.cache)
+        return output.getvalue()
+
+    def test_variable_named_like_an_option_is_skipped(self):
+        with self.assertLogs("foo2bar", "WARNING") as logs:
+            code = self._run("jobs = 4\ngrid = 1\nx = 1\n", "raw", "--x", "2", "--jobs", "1")
+        self.assertEqual(code, "jobs = 4\ngrid = 1\nx = 2\n\n")
+        self.assertIn("'jobs'", logs.output[0])
+        self.assertIn("'grid'", logs.output[1])
+
+    def test_variable_named_format(self):
+        with self.assertLogs("foo2bar", "WARNING") as logs:
+            edits = self._run('format = "csv"\nf = 1\n', "raw", "--f", "2", "--format", "json-edits")
+        self.assertIn("'format'", logs.output[0])
+        self.assertEqual(json.loads(edits), [[19, 20, "2"]])
+
+    def test_options_are_not_abbreviated(self):
+        code = self._run("g = 1\nj = 2\n", "raw", "--g", "5", "--j", "6")
+        self.assertEqual(code, "g = 5\nj = 6\n\n")
+        output_dir = self.tmp_dir / "out"
+        self._run("g = 1\nj = 2\n", "sweep", "--grid", "g=3,4", "--j", "7", "-j", "1", "--output-dir", str(output_dir))
+        self.assertEqual((output_dir / "script_1.py").read_text(), "g = 4\nj = 7\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
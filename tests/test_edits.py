@@ -0,0 +1,68 @@
+import difflib
+import json
+import unittest
+from pathlib import Path
+
+from foo2bar.bench import synthetic_script
+from foo2bar.edits import NO_NEWLINE_MARKER, format_edits, split_lines, unified_diff
+from foo2bar.template import TextEdit, apply_edits
+from foo2bar.wrapper import CodeWrapper
+
+TEST_SCRIPT = Path(__file__).parent.parent / "test_data" / "test_script.py"
+
+
+class TestUnifiedDiff(unittest.TestCase):
+    def assertDiffsLikeDifflib(self, source: str, mapping: dict[str, str]):
+        edits, _ = CodeWrapper(source).compile_template(None).render_edits(mapping)
+        code = apply_edits(source, edits)
+        for context in [0, 1, 3]:
+            expected = "".join(difflib.unified_diff(split_lines(source), split_lines(code), "a", "b", n=context))
+            diff = unified_diff(source, edits, "a", "b", context).replace("\n" + NO_NEWLINE_MARKER, "")
+            self.assertEqual(diff, expected, (mapping, context))
+
+    def test_like_difflib(self):
+        source = synthetic_script(100)
+        self.assertDiffsLikeDifflib(source, {"learning_rate_4": "1", "epochs_12": "[1,\n 2]", "options_10": "{}"})
+        self.assertDiffsLikeDifflib(source, {"scale": "(\n3\n)", "batch_size_1": "2"})
+        self.assertDiffsLikeDifflib(TEST_SCRIPT.read_text(), {"s": "'a'", "x": "1", "my_lambda": "0"})
+        self.assertDiffsLikeDifflib("a = 1\nb = 2\r\n\n\nc = 3\n", {"a": "0", "b": "[\n0]", "c": "0"})
+
+    def test_no_changes(self):
+        source = "x = 1\n"
+        self.assertEqual(unified_diff(source, [], "a", "b"), "")
+        self.assertEqual(unified_diff(source, [TextEdit(4, 5, "1")], "a", "b"), "")
+
+    def test_no_newline_at_end_of_file(self):
+        diff = unified_diff("x = 1\ny = 2", [TextEdit(10, 11, "3")], "a", "b")
+        self.assertEqual(diff, f"--- a\n+++ b\n@@ -1,2 +1,2 @@\n x = 1\n-y = 2\n{NO_NEWLINE_MARKER}+y = 3\n{NO_NEWLINE_MARKER}")
+
+
+class TestFormatEdits(unittest.TestCase):
+    def setUp(self):
+        self.source = "x = 1\ny = 2\n"
+        self.edits = [TextEdit(4, 5, "10")]
+
+    def test_full(self):
+        self.assertEqual(format_edits(self.source, self.edits), "x = 10\ny = 2\n")
+
+    def test_diff(self):
+        self.assertEqual(
+            format_edits(self.source, self.edits, "diff", Path("jobs/job.py")),
+            "--- jobs/job.py\n+++ jobs/job.py\n@@ -1,2 +1,2 @@\n-x = 1\n+x = 10\n y = 2\n",
+        )
+
+    def test_patch(self):
+        self.assertTrue(format_edits(self.source, self.edits, "patch", "jobs/job.py").startswith("--- a/jobs/job.py\n+++ b/jobs/job.py\n"))
+
+    def test_json_edits(self):
+        edits = json.loads(format_edits(self.source, self.edits, "json-edits"))
+        self.assertEqual(edits, [[4, 5, "10"]])
+        self.assertEqual(apply_edits(self.source, [TextEdit(*edit) for edit in edits]), "x = 10\ny = 2\n")
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            format_edits(self.source, self.edits, "zip")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,17 @@
+import ast
 import unittest
 
+import libcst as cst
 from libcst._exceptions import ParserSyntaxError
 
 from foo2bar.evallib import (
     SafeEvaluationError,
+    annotation_cache_clear,
+    annotation_cache_info,
     annotation_eval,
+    eval_cache_clear,
+    eval_cache_info,
+    literal_eval_node,
     safe_eval,
     safe_type_eval,
     try_safe_type_eval,
@@ -27,11 +34,80 @@ class TestEvalLib(unittest.TestCase):
             annotation_eval("from pathlib import Path; print(Path('requirements.txt').read_text())")
 
     def test_safe_eval(self):
+        self.assertEqual(safe_eval("[1, -2, {'a': None}]"), [1, -2, {'a': None}])
         self.assertEqual(safe_eval("1 + 1"), 2)
         self.assertEqual(safe_eval("'a' + 'b'"), 'ab')
         with self.assertRaises(SafeEvaluationError):
             safe_eval("import os")
 
+    def test_safe_eval_cache(self):
+        eval_cache_clear()
+        self.assertEqual(safe_eval("abs(-2)"), 2)
+        self.assertEqual(safe_eval("abs(-2)"), 2)
+        # literals are not compiled
+        self.assertEqual(safe_eval("[1, 2]"), [1, 2])
+        for _ in range(2):
+            with self.assertRaises(SafeEvaluationError):
+                safe_eval("import os")
+        info = eval_cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (2, 2, 2))
+
+    def test_safe_eval_assignment_expression(self):
+        self.assertEqual(safe_eval("(x := 2) * x"), 4)
+        with self.assertRaises(SafeEvaluationError):
+            safe_eval("x")
+
+    def test_literal_eval_node(self):
+        literals = [
+            "1", "-1.5", "+3", "0x1f", "2j", "1 + 2j", "-1 - 2j", "'a' 'b'", "b'x'", r"r'\d'", '"""a\nb"""',
+            "[1, (2, 3), {'a': None}]", "{1, 2}", "()", "(1,)", "{}", "True", "None", "((1))", "-(1)",
+        ]
+        for literal in literals:
+            self.assertEqual(literal_eval_node(cst.parse_expression(literal)), ast.literal_eval(literal))
+        for expression in ["--1", "-True", "[*a]", "{**a}", "f'{x}'", "x", "1 + 1", "not True", "abs(-1)"]:
+            with self.assertRaises(ValueError):
+                literal_eval_node(cst.parse_expression(expression))
+
+    def test_safe_eval_node(self):
+        self.assertEqual(safe_eval(cst.parse_expression("[1, -2]")), [1, -2])
+        self.assertEqual(safe_eval(cst.parse_expression("abs(-2)")), 2)
+        self.assertEqual(safe_type_eval(cst.parse_expression("{'a': 1}")), dict)
+        self.assertIsNone(try_safe_type_eval(cst.parse_expression("open('file')")))
+
+    def test_annotation_eval_node(self):
+        self.assertEqual(annotation_eval(cst.parse_expression("dict[str, list[int]]")), dict[str, list[int]])
+        with self.assertRaises(ValueError):
+            annotation_eval(cst.parse_expression("list[exit()]"))
+        self.assertEqual(annotation_eval(cst.parse_expression("T"), {"T": float}), float)
+
+    def test_annotation_cache(self):
+        annotation_cache_clear()
+        for _ in range(3):
+            self.assertEqual(annotation_eval("list[str]"), list[str])
+            self.assertEqual(annotation_eval(cst.parse_expression("int")), int)
+            with self.assertRaises(NameError):
+                annotation_eval("Path")
+        info = annotation_cache_info()
+        self.assertEqual((info["code"].hits, info["code"].misses), (4, 2))
+        self.assertEqual((info["nodes"].hits, info["nodes"].misses), (2, 1))
+        # locals are not cached
+        self.assertEqual(annotation_eval("T", {"T": int}), int)
+
+    def test_cached_errors_are_new(self):
+        annotation_cache_clear()
+        errors = []
+        for annotation in ["Path", "Path", "list[", "list["]:
+            try:
+                annotation_eval(annotation)
+            except Exception as e:
+                errors.append(e)
+        self.assertEqual([type(error) for error in errors], [NameError, NameError, cst.ParserSyntaxError, cst.ParserSyntaxError])
+        self.assertIsNot(errors[0], errors[1])
+        self.assertIsNot(errors[2], errors[3])
+        self.assertEqual(str(errors[2]), str(errors[3]))
+        self.assertIsNone(errors[1].__context__)
+        self.assertEqual(annotation_eval("T", {"T": str}), str)
+
     def test_safe_type_eval(self):
         self.assertEqual(safe_type_eval("1 + 1"), int)
         self.assertEqual(safe_type_eval("'a' + 'b'"), str)
@@ -0,0 +1,68 @@
+import unittest
+from pathlib import Path
+from textwrap import dedent
+
+import libcst as cst
+from libcst import matchers as m, metadata
+
+from foo2bar.extractors import AssignementData, extract_assignement, extract_assignements
+from foo2bar.matchers import statement_matcher
+from foo2bar.providers import FirstAssignInScopeProvider
+
+TEST_SCRIPT = Path(__file__).parent.parent / "test_data" / "test_script.py"
+
+
+class TestExtractors(unittest.TestCase):
+    @staticmethod
+    def _wrap_code(code: str) -> metadata.MetadataWrapper:
+        return metadata.MetadataWrapper(cst.parse_module(code))
+
+    def assertExtractsLikeMatcher(self, code: str):
+        wrapper = self._wrap_code(code)
+        expected = [
+            AssignementData(data["name"], data.get("annotation"), data["value"], data.get("comment"))
+            for data in m.extractall(wrapper, statement_matcher)
+        ]
+        self.assertEqual([data for _, data in extract_assignements(wrapper)], expected)
+
+    def test_like_matcher(self):
+        self.assertExtractsLikeMatcher(dedent("""\
+        x = 10  # valid comment
+        y : int = 20  # No Param here
+        z: str
+        a = b = 1
+        c = 2; d = 3
+        e.f = 4
+        g[0] = 5
+        h += 6
+        x = 7
+        if True:
+            i = 8  # in a block
+        def f(j=9):
+            k = (lambda: 10)()
+        class C:
+            x = 11
+        """))
+
+    def test_test_script_like_matcher(self):
+        self.assertExtractsLikeMatcher(TEST_SCRIPT.read_text())
+
+    def test_extract_assignement(self):
+        wrapper = self._wrap_code("x: int = 10  # comment\nx = 20\n")
+        first_assigns = wrapper.resolve(FirstAssignInScopeProvider)
+        first, second = wrapper.module.body
+        data = extract_assignement(first, first_assigns)
+        self.assertEqual(data.name, "x")
+        self.assertEqual(data.annotation.value, "int")
+        self.assertEqual(data.value.value, "10")
+        self.assertEqual(data.comment, "# comment")
+        self.assertIsNone(extract_assignement(second, first_assigns))
+
+    def test_statement_lines_in_code_order(self):
+        wrapper = self._wrap_code("a = 1\nclass C:\n    b = 2\nc = 3\n")
+        nodes = [node for node, _ in extract_assignements(wrapper)]
+        self.assertEqual([cst.Module(body=[node]).code for node in nodes], ["a = 1\n", "b = 2\n", "c = 3\n"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent / "src"
+
+# slow to import, and only needed to analyze scripts or evaluate non-literal expressions
+HEAVY_MODULES = ["libcst", "libcst.matchers", "RestrictedPython"]
+
+
+def import_times(code: str, env: dict[str, str] = None) -> dict[str, int]:
+    """Run `code` with `python -X importtime`, and return the cumulative import time of every imported module in microseconds."""
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR), **(env or {})}
+    env.pop("FOO2BAR_SOCKET", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def assertNotImported(self, times: dict[str, int]):
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times)
+
+    def test_import_cli(self):
+        self.assertNotImported(import_times("import foo2bar.cli"))
+
+    def test_import_matchers(self):
+        # matchers are built on first access
+        self.assertNotIn("libcst.matchers", import_times("import foo2bar.matchers"))
+
+    def test_import_evallib(self):
+        self.assertNotImported(import_times("import foo2bar.evallib"))
+
+    def test_cached_raw_substitution(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            script = Path(tmp_dir) / "script.py"
+            output = Path(tmp_dir) / "output.py"
+            script.write_text("x = 10  # comment\ny = [1, 2]\nz = abs(-3)\n")
+            code = f"from foo2bar.cli import main; main([{str(script)!r}, 'raw', '--x', '20', '-o', {str(output)!r}])"
+            env = {"FOO2BAR_CACHE_DIR": tmp_dir}
+            # the first run analyzes the script and fills the cache
+            self.assertIn("libcst", import_times(code, env))
+            self.assertNotImported(import_times(code, env))
+            self.assertEqual(output.read_text(), "x = 20  # comment\ny = [1, 2]\nz = abs(-3)\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
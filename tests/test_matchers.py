@@ -1,9 +1,13 @@
+import contextlib
+import io
 import unittest
+from pathlib import Path
 from textwrap import dedent
 
 import libcst as cst
 from libcst import matchers as m, metadata
 
+from foo2bar import matchers
 from foo2bar.matchers import statement_matcher
 
 
@@ -81,6 +85,11 @@ class TestMatchers(unittest.TestCase):
         matches = self._extract_all(code)
         self.assertEqual(len(matches), 1)
 
+    def test_module_test(self):
+        with contextlib.chdir(Path(__file__).parent.parent), contextlib.redirect_stdout(io.StringIO()) as stdout:
+            matchers._test()
+        self.assertIn("'my_list'", stdout.getvalue())
+
 
 if __name__ == "__main__":
     unittest.main()
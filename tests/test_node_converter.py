@@ -1,14 +1,23 @@
 import unittest
+import unittest.mock
+from pathlib import Path
+
 import libcst as cst
 from libcst import metadata
 
+from foo2bar.bench import synthetic_script
 from foo2bar.node_converter import (
+    SourceRenderer,
     node_to_string,
     scope_name_is_resolvable,
     try_resolve_scope_name,
     resolve_scope_name,
+    resolve_scope_names,
     UnnamedScopeError
 )
+from foo2bar.template import code_range_to_span, line_offsets
+
+TEST_DATA = Path(__file__).parent.parent / "test_data"
 
 SAMPLE_STATEMENTS = [
     "pass",
@@ -92,7 +101,62 @@ class TestNodeConverter(unittest.TestCase):
             scope = self.get_variable_scope(var_name)
             with self.assertRaises(UnnamedScopeError):
                 resolve_scope_name(scope)
-        
+
+    def test_resolve_scope_names(self):
+        names = resolve_scope_names(self.scopes.values())
+        for var_name, scope_name in SCOPE_NAMES.items():
+            self.assertEqual(names[self.get_variable_scope(var_name)], scope_name)
+        self.assertEqual(set(names), set(self.scopes.values()))
+
+
+
+class TestSourceRenderer(unittest.TestCase):
+    def setUp(self):
+        self.code = "x = ( 1 +\n  2)  # comment\nclass A:\n    # leading comment\n    y: 'int' = 3\n    z = [\n  4]\n"
+        self.wrapper = cst.MetadataWrapper(cst.parse_module(self.code), unsafe_skip_copy=True)
+        self.renderer = SourceRenderer(self.wrapper.module, self.code)
+
+    def test_like_node_to_string(self):
+        for node in self.wrapper.resolve(metadata.WhitespaceInclusivePositionProvider):
+            if isinstance(node, cst.BaseExpression):
+                self.assertEqual(self.renderer(node), node_to_string(node))
+            elif isinstance(node, cst.SimpleStatementLine):
+                self.assertEqual(self.renderer(node).strip(), node_to_string(node).strip())
+
+    def test_slices_source(self):
+        value = self.wrapper.module.body[0].body[0].value
+        self.assertEqual(self.renderer.span(value), (4, 14))
+        with unittest.mock.patch("foo2bar.node_converter.node_to_string") as node_to_string_mock:
+            self.assertEqual(self.renderer(value), "( 1 +\n  2)")
+            self.assertIs(self.renderer(value), self.renderer(value))
+        node_to_string_mock.assert_not_called()
+
+    def test_spans_like_positions(self):
+        offsets = line_offsets(self.code)
+        for node, code_range in self.wrapper.resolve(metadata.WhitespaceInclusivePositionProvider).items():
+            self.assertEqual(self.renderer.span(node), code_range_to_span(code_range, offsets))
+
+    def test_spans_like_positions_on_corpus(self):
+        # the spans are recorded with internals of libcst, whose version is pinned (see tests/test_providers.py)
+        for code in [(TEST_DATA / "test_script.py").read_text(), synthetic_script(200)]:
+            with self.subTest(lines=code.count("\n")):
+                wrapper = cst.MetadataWrapper(cst.parse_module(code), unsafe_skip_copy=True)
+                renderer, positions = SourceRenderer(wrapper.module), wrapper.resolve(metadata.WhitespaceInclusivePositionProvider)
+                self.assertEqual(renderer.source, code)
+                # positions count the newline dropped at the end of a module without a trailing newline
+                offsets = line_offsets(code + wrapper.module.default_newline)
+                spans = {node: code_range_to_span(code_range, offsets) for node, code_range in positions.items()}
+                self.assertEqual(
+                    {node: renderer.span(node) for node in positions},
+                    {node: (min(start, len(code)), min(end, len(code))) for node, (start, end) in spans.items()},
+                )
+
+    def test_generated_source(self):
+        renderer = SourceRenderer(self.wrapper.module)
+        self.assertEqual(renderer.source, self.code)
+
+    def test_foreign_node(self):
+        self.assertEqual(self.renderer(cst.parse_expression("[1,  2]")), "[1,  2]")
 
 
 if __name__ == "__main__":
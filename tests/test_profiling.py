@@ -0,0 +1,135 @@
+import contextlib
+import io
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from foo2bar.cli import profiling_requested, run
+from foo2bar.profiling import current_profile, phase, profile, profiled
+from foo2bar.wrapper import CodeWrapper
+
+
+class TestProfile(unittest.TestCase):
+    def test_phases_recorded_within_profile_only(self):
+        with phase("outside"):
+            pass
+        with profile() as collected:
+            self.assertIs(current_profile(), collected)
+            for _ in range(2):
+                with phase("outer"):
+                    with phase("inner"):
+                        pass
+        self.assertIsNone(current_profile())
+        stats = collected.to_dict()
+        self.assertEqual(list(stats["phases"]), ["inner", "outer"])
+        self.assertEqual(stats["phases"]["outer"]["calls"], 2)
+        self.assertGreaterEqual(stats["phases"]["outer"]["seconds"], stats["phases"]["inner"]["seconds"])
+        self.assertGreaterEqual(stats["seconds"], stats["phases"]["outer"]["seconds"])
+        self.assertNotIn("peak_memory", stats["phases"]["outer"])
+
+    def test_phase_recorded_on_error(self):
+        with profile() as collected, self.assertRaises(ValueError):
+            with phase("failing"):
+                raise ValueError()
+        self.assertEqual(collected.phases["failing"]["calls"], 1)
+
+    def test_peak_memory(self):
+        with profile(memory=True) as collected:
+            with phase("outer"):
+                with phase("allocate"):
+                    data = bytearray(1_000_000)
+                    del data
+                with phase("small"):
+                    pass
+        phases = collected.to_dict()["phases"]
+        self.assertGreaterEqual(phases["allocate"]["peak_memory"], 1_000_000)
+        # the peak of inner phases is kept for the outer phase
+        self.assertGreaterEqual(phases["outer"]["peak_memory"], 1_000_000)
+        self.assertLess(phases["small"]["peak_memory"], 1_000_000)
+
+    def test_profiles_per_thread(self):
+        def work():
+            with profile() as collected:
+                with phase("thread"):
+                    pass
+            results.append(collected)
+
+        results = []
+        with profile() as collected:
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+        self.assertEqual(collected.phases, {})
+        self.assertEqual(list(results[0].phases), ["thread"])
+
+    def test_profiled(self):
+        @profiled("double")
+        def double(x):
+            return 2 * x
+
+        with profile() as collected:
+            self.assertEqual(double(2), 4)
+        self.assertEqual(collected.phases["double"]["calls"], 1)
+        self.assertEqual(double.__name__, "double")
+
+    def test_wrapper_phases(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            script = Path(tmp_dir) / "script.py"
+            script.write_text("x = 1\ndef f():\n    y = 2\n")
+            with profile() as collected:
+                wrapper = CodeWrapper.from_file(script)
+                wrapper.analyze_assigns()
+                wrapper.substitute_assign_values_global({"x": "3"})
+                wrapper.code
+        self.assertEqual(
+            set(collected.phases),
+            {"read", "parse", "index", "metadata.ScopeNestingProvider", "metadata.FirstAssignInScopeProvider", "extract",
+             "substitute", "codegen", "codegen.spans"},
+        )
+        self.assertEqual(collected.phases["metadata.ScopeNestingProvider"]["calls"], 1)
+
+
+class TestProfileOption(unittest.TestCase):
+    def test_profiling_requested(self):
+        self.assertEqual(profiling_requested(["script.py", "raw"]), (False, False))
+        self.assertEqual(profiling_requested(["script.py", "raw", "--profile"]), (True, False))
+        self.assertEqual(profiling_requested(["--profile-memory", "script.py", "raw"]), (True, True))
+        # abbreviations and values of script options do not request profiling
+        self.assertEqual(profiling_requested(["script.py", "raw", "--profile-mem"]), (False, False))
+        self.assertEqual(profiling_requested(["script.py", "raw", "--name=--profile"]), (False, False))
+
+    def test_variable_named_profile(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            script = Path(tmp_dir) / "script.py"
+            script.write_text("profile = 1\nname = 2\n")
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                run([str(script), "raw", "--name", "'--profile'", "--no-cache"])
+        self.assertEqual(stdout.getvalue(), "profile = 1\nname = '--profile'\n\n")
+        self.assertNotIn('"phases"', stderr.getvalue())
+
+    def test_profiling_error_is_raised(self):
+        with mock.patch("foo2bar.cli.profile") as profile_mock:
+            profile_mock.return_value.__enter__.side_effect = RuntimeError("tracing failed")
+            with self.assertRaisesRegex(RuntimeError, "tracing failed"):
+                run(["script.py", "raw", "--profile-memory"])
+
+    def test_profile_printed_to_stderr(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            script = Path(tmp_dir) / "script.py"
+            script.write_text("x = 10  # comment\ny = abs(-2)\n")
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                run([str(script), "typed", "--x", "20", "--no-cache", "--profile-memory"])
+        self.assertEqual(stdout.getvalue(), "x = 20  # comment\ny = abs(-2)\n\n")
+        phases = json.loads(stderr.getvalue()[stderr.getvalue().index("{"):])["phases"]
+        for name in ["argparse", "analyze", "parse", "options", "safe_eval", "render"]:
+            self.assertIn(name, phases)
+        self.assertIn("peak_memory", phases["parse"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import re
+import unittest
+from importlib import metadata as importlib_metadata
+from pathlib import Path
+from textwrap import dedent
+
+import libcst as cst
+from libcst import metadata
+
+from foo2bar.bench import synthetic_script
+from foo2bar.node_converter import UnnamedScopeError, resolve_scope_name, resolve_scope_names
+from foo2bar.providers import FirstAssignInScopeProvider, NestedScope, ScopeNestingProvider
+from foo2bar.wrapper import resolve_metadata
+
+TEST_SCRIPT = Path(__file__).parent.parent / "test_data" / "test_script.py"
+PYPROJECT = Path(__file__).parent.parent / "pyproject.toml"
+
+SAMPLE_CODE = dedent("""\
+x = [y for y in z]
+f = lambda: (w := 1)
+@decorator(lambda: 0)
+class A(Base, metaclass=Meta):
+    a = 1
+    a = 2
+    class B:
+        b = 1
+    def method(self, k=lambda: 0):
+        if k:
+            c = 1
+        else:
+            c = 2
+if x: y = 1
+y = 2
+def generic[T](t: T):
+    d = t
+""")
+
+
+class TestScopeNestingProvider(unittest.TestCase):
+    def assertScopesLikeLibcst(self, code: str):
+        wrapper = metadata.MetadataWrapper(cst.parse_module(code), unsafe_skip_copy=True)
+        scopes = wrapper.resolve(metadata.ScopeProvider)
+        nested_scopes = wrapper.resolve(ScopeNestingProvider)
+        names = resolve_scope_names(scopes.values())
+        nested_names = resolve_scope_names(nested_scopes.values())
+        for node, scope in nested_scopes.items():
+            if isinstance(node, (cst.BaseStatement, cst.BaseSmallStatement, cst.Name)):
+                self.assertEqual(nested_names[scope], names[scopes[node]], node)
+        # named scopes are listed in the same order
+        self.assertEqual(
+            [name for name in dict.fromkeys(map(names.get, scopes.values())) if name is not None],
+            [name for name in dict.fromkeys(map(nested_names.get, nested_scopes.values())) if name is not None],
+        )
+
+    def test_like_libcst(self):
+        for code in [SAMPLE_CODE, TEST_SCRIPT.read_text(), synthetic_script(200)]:
+            self.assertScopesLikeLibcst(code)
+
+    def test_scopes(self):
+        wrapper = metadata.MetadataWrapper(cst.parse_module(SAMPLE_CODE))
+        scopes = wrapper.resolve(ScopeNestingProvider)
+        module_scope = scopes[wrapper.module]
+        self.assertEqual(module_scope.kind, NestedScope.GLOBAL)
+        self.assertEqual(resolve_scope_name(module_scope), "")
+        kinds = {scope.kind for scope in scopes.values()}
+        self.assertEqual(kinds, {NestedScope.GLOBAL, NestedScope.CLASS, NestedScope.FUNCTION})
+        # type parameters are in an unnamed scope between the function and the module
+        generic_body = wrapper.module.body[-1].body.body[0]
+        self.assertEqual(scopes[generic_body].parent.kind, NestedScope.ANNOTATION)
+        with self.assertRaises(UnnamedScopeError):
+            resolve_scope_name(scopes[generic_body])
+
+    def test_expressions_not_visited(self):
+        wrapper = metadata.MetadataWrapper(cst.parse_module("x = f(a, b)\n"))
+        scopes = wrapper.resolve(ScopeNestingProvider)
+        assign = wrapper.module.body[0].body[0]
+        self.assertIn(assign.targets[0].target, scopes)
+        self.assertNotIn(assign.value, scopes)
+        self.assertNotIn(assign.value.args[0].value, scopes)
+
+
+class TestFirstAssignInScopeProvider(unittest.TestCase):
+    def test_first_assigns(self):
+        wrapper = metadata.MetadataWrapper(cst.parse_module(SAMPLE_CODE))
+        first_assigns = wrapper.resolve(FirstAssignInScopeProvider)
+        self.assertEqual(
+            [(target.value, first) for target, first in first_assigns.items()],
+            [("x", True), ("f", True), ("a", True), ("a", False), ("b", True), ("c", True), ("c", False), ("y", True),
+             ("y", False), ("d", True)],
+        )
+
+
+class TestResolveMetadata(unittest.TestCase):
+    def test_pinned_libcst(self):
+        # resolve_metadata relies on internals of MetadataWrapper, which are only checked against the pinned version
+        pinned = re.search(r'"libcst==([^"]+)"', PYPROJECT.read_text()).group(1)
+        self.assertEqual(importlib_metadata.version("libcst"), pinned)
+
+    def test_like_metadata_wrapper_resolve(self):
+        for code in [SAMPLE_CODE, TEST_SCRIPT.read_text(), synthetic_script(50)]:
+            wrapper = metadata.MetadataWrapper(cst.parse_module(code), unsafe_skip_copy=True)
+            resolve_metadata(wrapper)
+            reference = metadata.MetadataWrapper(wrapper.module, unsafe_skip_copy=True)
+            self.assertEqual(
+                dict(wrapper.resolve(FirstAssignInScopeProvider)), dict(reference.resolve(FirstAssignInScopeProvider))
+            )
+            scopes, reference_scopes = wrapper.resolve(ScopeNestingProvider), reference.resolve(ScopeNestingProvider)
+            self.assertEqual(scopes.keys(), reference_scopes.keys())
+            names, reference_names = resolve_scope_names(scopes.values()), resolve_scope_names(reference_scopes.values())
+            for node, scope in scopes.items():
+                self.assertEqual((scope.kind, names[scope]), (reference_scopes[node].kind, reference_names[reference_scopes[node]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
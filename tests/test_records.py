@@ -0,0 +1,65 @@
+import pickle
+import unittest
+from textwrap import dedent
+
+from foo2bar.records import AssignementRecord, is_qualified_name, qualified_name, split_qualified_name
+from foo2bar.wrapper import CodeWrapper
+
+
+class TestAssignementRecord(unittest.TestCase):
+    def setUp(self):
+        self.sample_code = dedent("""\
+        x = 10  # comment
+        y: int = (20)
+        class MyClass:
+            a = 40  # in class
+        """)
+        self.wrapper = CodeWrapper(self.sample_code)
+        self.records = self.wrapper.analyze_records()
+
+    def test_analyze_records(self):
+        self.assertEqual(self.records, [
+            AssignementRecord("x", "", None, "10", "# comment", 4, 6),
+            AssignementRecord("y", "", "int", "(20)", None, 27, 31),
+            AssignementRecord("a", "MyClass", None, "40", "# in class", 55, 57, "    "),
+        ])
+        self.assertEqual(self.wrapper.analyze_records("MyClass"), self.records[2:])
+
+    def test_like_wrapper(self):
+        for record, assignement in zip(self.records, self.wrapper.analyze_assigns()):
+            self.assertEqual(record.name, assignement.name)
+            self.assertEqual(record.comment, assignement.comment)
+            self.assertEqual(record.scope_as_string(), assignement.scope_as_string())
+            self.assertEqual(record.value_as_string(), assignement.value_as_string())
+            self.assertEqual(record.annotation_as_string(), assignement.annotation_as_string())
+
+    def test_span(self):
+        code = self.wrapper.code
+        self.assertEqual([code[slice(*record.span)] for record in self.records], ["10", "(20)", "40"])
+
+    def test_span_after_incremental_substitution(self):
+        wrapper = CodeWrapper(self.sample_code, incremental=True)
+        wrapper.substitute_assign_values({"x": "1000"})
+        code = wrapper.code
+        self.assertEqual([code[slice(*record.span)] for record in wrapper.analyze_records()], ["1000", "(20)", "40"])
+
+    def test_qualified_name(self):
+        self.assertEqual([record.qualified_name for record in self.records], ["x", "y", "MyClass.a"])
+        self.assertEqual(qualified_name("Outer.Inner", "X"), "Outer.Inner.X")
+        self.assertEqual(qualified_name(None, "X"), "X")
+        self.assertEqual(split_qualified_name("Outer.Inner.X"), ("Outer.Inner", "X"))
+        self.assertEqual(split_qualified_name("X"), ("", "X"))
+        self.assertTrue(is_qualified_name("Outer.Inner.X"))
+        self.assertFalse(is_qualified_name("Outer..X"))
+        self.assertFalse(is_qualified_name("not a name"))
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.records[0].value = "1"
+
+    def test_pickle(self):
+        self.assertEqual(pickle.loads(pickle.dumps(self.records)), self.records)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from foo2bar.batch import substitute_file
+from foo2bar.bench import synthetic_script
+from foo2bar.bench.suite import templated_script
+from foo2bar.scanner import UnsupportedSyntax, scan_global_assignements, substitute_global, try_substitute_global
+from foo2bar.transformers import SubstitutionValueError
+from foo2bar.wrapper import CodeWrapper
+
+TEST_SCRIPT = Path(__file__).parent.parent / "test_data" / "test_script.py"
+
+SUPPORTED = [
+    "x = 1\nx = 2\n",
+    "x: int = 1  # comment\n",
+    "x = y = 1\nx = 3\ny = 4\n",
+    "a.b = 1\nb = 2\na[0] = 3\na = 4\nf().x = 5\n",
+    "x.y: int = 1\nx = 2\n",
+    "x = lambda a=1: a\ny = {k: lambda: 1 for k in z}\n",
+    "if a:\n    x = 1\nelse:\n    x = 2\nfor i in range(3):\n    k = i\n",
+    "try:\n    t = 1\nexcept E as e:\n    t = 2\nfinally:\n    u = 3\nwith a as b:\n    c = 1\n",
+    "def f(\n    a=1,\n):\n    b = 2\nb = 3\nasync def g():\n    c = 1\nc = 2\n",
+    "class A:\n    x = 1\n    def g(self):\n        y = 2\ny = 3  # no param\nz = 4  # NO PARAM here\nx = 5\n",
+    "if True:\n    class A:\n        w = 1\n    w = 2\n",
+    "@dec\ndef f(a=1):\n    pass\nq = f\n",
+    "def f(): x = 1\nclass A: y = 1\nx = 2\ny = 3\n",
+    "match = 1\nmatch(x)\ntype = 2\ntype(x)\n",
+    "x = (1,\n     # comment\n     2)  # trailing\ny = 1 + \\\n    2\n",
+    "x = 1,\ny = (1)\nz = '''a\nb'''\n",
+    "x = 1\r\ny = 2\r\n",
+    "x += 1\nx = 2\nglobal y\ny = 1\nprint(z=1)\nz = 2",
+]
+
+UNSUPPORTED = [
+    "if a: x = 1\n",
+    "x = 1; y = 2\n",
+    "x: int\nx = 1\n",
+    "a, b = 1, 2\n",
+    "(x) = 1\n",
+    "match x:\n    case 1:\n        y = 1\n",
+    "\ufeffx = 1\n",
+    "x = 1\ry = 2\n",
+    "x =\n",
+]
+
+
+def substitute_with_libcst(source: str, mapping: dict[str, str]) -> tuple[str, dict[str, str]]:
+    wrapper = CodeWrapper(source)
+    remaining = wrapper.substitute_assign_values_global(mapping)
+    return wrapper.code, remaining
+
+
+class TestScanner(unittest.TestCase):
+    def assertScansLikeLibcst(self, source: str):
+        records = scan_global_assignements(source)
+        self.assertEqual(records, CodeWrapper(source).analyze_records(""))
+        mapping = {record.name: "(1, 2)" for record in records[::2]}
+        mapping["unknown"] = "3"
+        self.assertEqual(try_substitute_global(source, mapping), substitute_with_libcst(source, mapping))
+
+    def test_corpus(self):
+        for source in [TEST_SCRIPT.read_text(), synthetic_script(300), templated_script(300)]:
+            self.assertScansLikeLibcst(source)
+
+    def test_supported(self):
+        for source in SUPPORTED:
+            with self.subTest(source=source):
+                self.assertScansLikeLibcst(source)
+
+    def test_unsupported(self):
+        for source in UNSUPPORTED:
+            with self.subTest(source=source), self.assertRaises(UnsupportedSyntax):
+                scan_global_assignements(source)
+
+    def test_test_script(self):
+        records = scan_global_assignements(TEST_SCRIPT.read_text())
+        self.assertEqual(
+            [record.name for record in records],
+            ["u", "x", "y", "s", "z", "my_list", "my_typed_list", "g", "my_lambda"],
+        )
+        self.assertEqual(records[1].annotation, "int")
+        self.assertEqual(records[1].comment, "# this is a comment")
+
+
+class TestFallback(unittest.TestCase):
+    def test_unsupported_script(self):
+        code = "x = 1; y = 2\nx = 3\n"
+        self.assertIsNone(try_substitute_global(code, {"x": "4"}))
+        self.assertEqual(substitute_global(code, {"x": "4"}), substitute_with_libcst(code, {"x": "4"}))
+
+    def test_reformatted_values(self):
+        code = "x = 1\n"
+        for value in ["(2 +\n 3)", "2  # comment"]:
+            with self.subTest(value=value):
+                self.assertIsNone(try_substitute_global(code, {"x": value}))
+                self.assertEqual(substitute_global(code, {"x": value}), substitute_with_libcst(code, {"x": value}))
+
+    def test_invalid_value(self):
+        with self.assertRaises(SubstitutionValueError):
+            substitute_global("x = 1\n", {"x": "2 +"})
+
+    def test_libcst_not_used(self):
+        with mock.patch("foo2bar.wrapper.CodeWrapper") as wrapper:
+            self.assertEqual(substitute_global("x = 1\n", {"x": "2"}), ("x = 2\n", {}))
+        wrapper.assert_not_called()
+
+    def test_substitute_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            script, output = Path(tmp_dir) / "script.py", Path(tmp_dir) / "out" / "script.py"
+            script.write_text(TEST_SCRIPT.read_text())
+            self.assertEqual(substitute_file(script, output, {"x": "1", "w": "2"}), {"w": "2"})
+            expected, _ = substitute_with_libcst(TEST_SCRIPT.read_text(), {"x": "1"})
+            self.assertEqual(output.read_text(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
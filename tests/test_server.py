@@ -0,0 +1,94 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from foo2bar.cache import MemoryAnalysisCache
+from foo2bar.cli import run
+from foo2bar.logging import logger
+from foo2bar.server import Server, forward, run_captured
+
+
+def echo_command(argv: list[str]) -> int:
+    if argv == ["fail"]:
+        raise RuntimeError("failed")
+    if argv == ["exit"]:
+        sys.exit(3)
+    print(" ".join(argv))
+    print(os.getcwd(), file=sys.stderr)
+    logger.warning("logged")
+    return 0
+
+
+class TestRunCaptured(unittest.TestCase):
+    def test_output(self):
+        with tempfile.TemporaryDirectory() as cwd:
+            response = run_captured(echo_command, ["a", "b"], cwd)
+            self.assertEqual(response["status"], 0)
+            self.assertEqual(response["stdout"], "a b\n")
+            self.assertIn(str(Path(cwd).resolve()), response["stderr"])
+            self.assertIn("logged", response["stderr"])
+
+    def test_exit_status(self):
+        self.assertEqual(run_captured(echo_command, ["exit"], os.getcwd())["status"], 3)
+
+    def test_exception(self):
+        response = run_captured(echo_command, ["fail"], os.getcwd())
+        self.assertEqual(response["status"], 1)
+        self.assertIn("RuntimeError: failed", response["stderr"])
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        self.socket_path = self.tmp_dir / "foo2bar.sock"
+        self.analyses = MemoryAnalysisCache()
+        self.server = Server(self.socket_path, lambda argv: run(argv, cache=self.analyses))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self._tmp_dir.cleanup()
+
+    def _forward(self, argv: list[str]) -> tuple[int, str]:
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+            status = forward(argv, self.socket_path)
+        return status, stdout.getvalue()
+
+    def test_forward(self):
+        script = self.tmp_dir / "script.py"
+        script.write_text("x = 10  # comment\n")
+        status, stdout = self._forward([str(script), "raw", "--x", "20", "--no-cache"])
+        self.assertEqual(status, 0)
+        self.assertEqual(stdout, "x = 20  # comment\n\n")
+
+    def test_forward_keeps_analyses_in_memory(self):
+        script = self.tmp_dir / "script.py"
+        script.write_text("x = 10\n")
+        self._forward([str(script), "raw", "--x", "20"])
+        self._forward([str(script), "raw", "--x", "30"])
+        self.assertEqual(len(self.analyses), 1)
+
+    def test_forward_error(self):
+        status, _ = self._forward([str(self.tmp_dir / "missing.py"), "unknown_mode"])
+        self.assertEqual(status, 2)
+
+    def test_socket_in_use(self):
+        with self.assertRaises(OSError):
+            Server(self.socket_path, echo_command)
+
+    def test_socket_removed_on_close(self):
+        self.assertTrue(self.socket_path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
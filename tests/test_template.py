@@ -0,0 +1,96 @@
+import unittest
+from pathlib import Path
+from textwrap import dedent
+
+import libcst as cst
+
+from foo2bar.node_converter import node_to_string
+from foo2bar.template import SubstitutionTemplate, TemplateSlot, apply_edits, line_offsets, value_to_code
+from foo2bar.wrapper import CodeWrapper
+
+TEST_SCRIPT = Path(__file__).parent.parent / "test_data" / "test_script.py"
+
+
+class TestSubstitutionTemplate(unittest.TestCase):
+    def setUp(self):
+        self.sample_code = dedent("""\
+        x = (1 +
+            2)  # comment
+        y: int = ( 20 ) # another comment
+        s = "é"; t = 3
+        u = "ü"
+        v = 4  # no param
+        class MyClass:
+            x = 40
+        """)
+        self.wrapper = CodeWrapper(self.sample_code)
+
+    def assertRendersLikeSubstitution(self, code: str, mapping: dict[str, str], scope_name: str = ""):
+        template = CodeWrapper(code).compile_template(scope_name)
+        wrapper = CodeWrapper(code)
+        expected_remaining = wrapper.substitute_assign_values(mapping, scope_name)
+        self.assertEqual(template.render(mapping), (wrapper.code, expected_remaining))
+
+    def test_value_to_code(self):
+        values = ["1", "-1.5", "'a # b'", "[1,  2]", "{'a': None}", "(1)", "lambda x: x", "f'{a!r}'", "1 ", "(1,\n 2)", "# c\n2"]
+        for value in values:
+            self.assertEqual(value_to_code(value), node_to_string(cst.parse_expression(value)))
+        for value in ["1 +", " 1", "import os", "a = 1"]:
+            with self.assertRaises(cst.ParserSyntaxError):
+                value_to_code(value)
+
+    def test_line_offsets(self):
+        self.assertEqual(line_offsets("a\nbc\r\nd\re"), [0, 2, 6, 8])
+
+    def test_slots(self):
+        template = self.wrapper.compile_template()
+        values = {slot.name: template.source[slot.start:slot.end] for slot in template.slots}
+        self.assertEqual(values, {"x": "(1 +\n    2)", "y": "( 20 )", "u": '"ü"'})
+
+    def test_render(self):
+        code, remaining = self.wrapper.compile_template().render({"x": "10", "u": "'a'", "foo": "1"})
+        self.assertIn("x = 10  # comment\n", code)
+        self.assertIn("u = 'a'\n", code)
+        self.assertIn("    x = 40\n", code)
+        self.assertEqual(remaining, {"foo": "1"})
+
+    def test_render_edits(self):
+        template = self.wrapper.compile_template()
+        mapping = {"x": "10", "y": "( 20 )", "u": "'a'", "foo": "1"}
+        edits, remaining = template.render_edits(mapping)
+        # unchanged values are not edited
+        self.assertEqual(
+            [(template.source[start:end], replacement) for start, end, replacement in edits],
+            [("(1 +\n    2)", "10"), ('"ü"', "'a'")],
+        )
+        self.assertEqual(remaining, {"foo": "1"})
+        self.assertEqual(apply_edits(template.source, edits), template.render(mapping)[0])
+
+    def test_render_values_must_be_strings(self):
+        with self.assertRaises(ValueError):
+            self.wrapper.compile_template().render({"x": 10})
+
+    def test_render_like_substitution(self):
+        self.assertRendersLikeSubstitution(self.sample_code, {"x": "[1,\n 2]", "y": "(5)", "u": "None"})
+        self.assertRendersLikeSubstitution(self.sample_code, {"x": "3"}, "MyClass")
+        self.assertRendersLikeSubstitution(self.sample_code.replace("\n", "\r\n"), {"x": "3", "u": "1"})
+        # libcst indents the continuation lines of values like their statement
+        self.assertRendersLikeSubstitution(self.sample_code, {"x": "[1,\n 2]"}, "MyClass")
+        code = "if a:\n    x = 1\nelse:\n  if b:\n      x = 2\n  y = \\\n    3\n"
+        for value in ["[1,\n 2]", "f(  # comment\n\n  a)", "'''a\n b'''"]:
+            with self.subTest(value=value):
+                self.assertRendersLikeSubstitution(code, {"x": value, "y": value})
+
+    def test_render_test_script_like_substitution(self):
+        code = TEST_SCRIPT.read_text()
+        self.assertRendersLikeSubstitution(code, {"x": "1", "s": "'s'", "my_list": "[]", "g": "0", "foo": "2"})
+        self.assertRendersLikeSubstitution(code, {"X": "12"}, "MyClass")
+
+    def test_render_many(self):
+        template = SubstitutionTemplate("a = 1\nb = 2\n", [TemplateSlot("b", 10, 11), TemplateSlot("a", 4, 5)])
+        variants = list(template.render_many([{"a": "3"}, {"a": "4", "b": "5"}]))
+        self.assertEqual(variants, ["a = 3\nb = 2\n", "a = 4\nb = 5\n"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+from unittest import mock
+from textwrap import dedent
+
+import libcst as cst
+from libcst import metadata
+
+from foo2bar.extractors import extract_assignement
+from foo2bar.node_converter import try_resolve_scope_name
+from foo2bar.providers import ScopeNestingProvider
+from foo2bar.transformers import SubstitutionValueError, Substitutor, parse_value
+
+
+class TestSubstitutor(unittest.TestCase):
+    def setUp(self):
+        self.module = cst.parse_module(dedent("""\
+        x = 1
+        y = 2
+        def f():
+            z = 3
+        """))
+
+    def _substitute(self, mapping: dict[str, str]) -> cst.Module:
+        substitutor = Substitutor(mapping)
+        return metadata.MetadataWrapper(self.module).visit(substitutor)
+
+    def test_invalid_values_reported_together(self):
+        with self.assertRaises(SubstitutionValueError) as context:
+            Substitutor({"x": "1 +", "y": "2", "z": 3})
+        self.assertEqual(set(context.exception.errors), {"x", "z"})
+        self.assertIn("'x', 'z'", str(context.exception))
+        self.assertIsInstance(context.exception, ValueError)
+
+    def test_parsed_values_are_shared(self):
+        self.assertIs(parse_value("'cuda'"), parse_value("'cuda'"))
+
+    def test_same_value_inserted_as_distinct_nodes(self):
+        module = self._substitute({"x": "[0.1]", "z": "[0.1]"})
+        self.assertEqual(module.code, "x = [0.1]\ny = 2\ndef f():\n    z = [0.1]\n")
+        x_value = module.body[0].body[0].value
+        z_value = module.body[2].body.body[0].body[0].value
+        self.assertIsNot(x_value, z_value)
+        self.assertIsNot(x_value, parse_value("[0.1]"))
+        # metadata is keyed by node, hence wrong for nodes appearing twice in a tree
+        positions = metadata.MetadataWrapper(module, unsafe_skip_copy=True).resolve(metadata.PositionProvider)
+        self.assertEqual((positions[x_value].start.line, positions[z_value].start.line), (1, 4))
+
+
+class TestScopePruning(unittest.TestCase):
+    def setUp(self):
+        self.wrapper = metadata.MetadataWrapper(cst.parse_module(dedent("""\
+        x = 1
+        def f():
+            x = 2
+            def g():
+                x = 3
+            class f:
+                x = 4
+        class C:
+            x = 5
+            def f(self):
+                x = 6
+        y = 7
+        """)), unsafe_skip_copy=True)
+        self.scopes = {
+            try_resolve_scope_name(scope): scope
+            for scope in set(self.wrapper.resolve(ScopeNestingProvider).values())
+        }
+
+    def _substitute(self, mapping: dict[str, str], scope_name: str | None) -> tuple[str, int]:
+        """Substitute in the named scope, returning the code and the number of statement lines inspected."""
+        substitutor = Substitutor(mapping, None if scope_name is None else self.scopes[scope_name])
+        with mock.patch("foo2bar.transformers.extract_assignement", wraps=extract_assignement) as extract:
+            code = self.wrapper.visit(substitutor).code
+        return code, extract.call_count
+
+    def test_substitutes_in_target_scope_only(self):
+        for scope_name, value in [("", "1"), ("f", "2"), ("f.g", "3"), ("f.f", "4"), ("C", "5"), ("C.f", "6")]:
+            code, _ = self._substitute({"x": "0"}, scope_name)
+            self.assertEqual(code.count("x = 0"), 1, scope_name)
+            self.assertNotIn(f"x = {value}", code, scope_name)
+
+    def test_any_scope_is_not_pruned(self):
+        code, inspected = self._substitute({"x": "0"}, None)
+        self.assertEqual(code.count("x = 0"), 6)
+        self.assertEqual(inspected, 7)
+
+    def test_bodies_outside_target_scope_are_skipped(self):
+        _, inspected = self._substitute({"y": "0"}, "")
+        self.assertEqual(inspected, 2)
+        _, inspected = self._substitute({"z": "0"}, "C.f")
+        self.assertEqual(inspected, 4)
+
+    def test_substitutes_in_several_scopes(self):
+        scopes = {self.scopes[""]: {"x": "0", "y": "8"}, self.scopes["f.f"]: {"x": "-4"}, self.scopes["C.f"]: {"x": "-6", "w": "0"}}
+        substitutor = Substitutor(scopes=scopes)
+        with mock.patch("foo2bar.transformers.extract_assignement", wraps=extract_assignement) as extract:
+            code = self.wrapper.visit(substitutor).code
+        for substituted in ["x = 0", "y = 8", "x = -4", "x = -6", "x = 2", "x = 3", "x = 5"]:
+            self.assertIn(substituted, code)
+        # the body of f.g is skipped
+        self.assertEqual(extract.call_count, 6)
+        self.assertEqual(
+            substitutor.retrieve_non_substituted_by_scope(),
+            {self.scopes[""]: {}, self.scopes["f.f"]: {}, self.scopes["C.f"]: {"w": "0"}},
+        )
+
+    def test_own_scope_takes_precedence(self):
+        substitutor = Substitutor(scopes={None: {"x": "0"}, self.scopes["C"]: {"x": "-5"}})
+        code = self.wrapper.visit(substitutor).code
+        self.assertEqual(code.count("x = 0"), 5)
+        self.assertIn("x = -5", code)
+
+    def test_invalid_values_reported_by_qualified_name(self):
+        with self.assertRaises(SubstitutionValueError) as context:
+            Substitutor(scopes={self.scopes[""]: {"x": "1 +"}, self.scopes["C.f"]: {"x": "2 +", "y": "3"}})
+        self.assertEqual(set(context.exception.errors), {"x", "C.f.x"})
+        with self.assertRaises(ValueError):
+            Substitutor({"x": "0"}, scopes={None: {"x": "0"}})
+
+    def test_stops_once_everything_is_substituted(self):
+        code, inspected = self._substitute({"x": "0"}, "")
+        self.assertTrue(code.startswith("x = 0\n"))
+        self.assertEqual(inspected, 1)
+        code, inspected = self._substitute({"x": "0"}, "f")
+        self.assertIn("    x = 0\n", code)
+        self.assertEqual(inspected, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 from textwrap import dedent
+import gc
 import unittest
+import weakref
 from pathlib import Path
+from unittest import mock
 
 import libcst as cst
+from libcst import metadata
 
 from foo2bar.wrapper import CodeWrapper, AssignementWrapper
 
@@ -54,6 +58,64 @@ class TestCodeWrapper(unittest.TestCase):
         self.assertEqual(len(assigns), 1)
         self.assertEqual(assigns[0].name, "b")
 
+    def test_list_scope_names_in_code_order(self):
+        self.assertEqual(self.wrapper.list_scope_names(), ["", "MyClass", "MyClass.method", "IgnoreThemAll"])
+
+    def test_get_assign(self):
+        self.assertEqual(self.wrapper.get_assign("x").value_as_string(), "10")
+        self.assertEqual(self.wrapper.get_assign("a", "MyClass").value_as_string(), "40")
+        self.assertIsNone(self.wrapper.get_assign("a"))
+        self.assertIsNone(self.wrapper.get_assign("s", "IgnoreThemAll"))
+        self.assertIsNone(self.wrapper.get_assign("x", "Unknown"))
+
+    def test_analyze_assigns_unknown_scope(self):
+        self.assertEqual(self.wrapper.analyze_assigns("Unknown"), [])
+
+    def test_only_parsed_modules_skip_copy(self):
+        with mock.patch("foo2bar.wrapper.metadata.MetadataWrapper", wraps=metadata.MetadataWrapper) as wrapper_mock:
+            wrapper = CodeWrapper(self.sample_code)
+            wrapper.substitute_assign_values_global({"x": "100"})
+        self.assertEqual([call.kwargs["unsafe_skip_copy"] for call in wrapper_mock.call_args_list], [True, False])
+        self.assertEqual(wrapper.analyze_assigns("")[0].value_as_string(), "100")
+        self.assertEqual(wrapper.compile_template("").render({"x": "1"})[0], wrapper.render({"x": "1"})[0])
+
+    def test_index_is_reused_until_substitution(self):
+        self.assertIs(self.wrapper.get_assign("z"), self.wrapper.analyze_assigns("")[2])
+        self.wrapper.substitute_assign_values_global({"z": "300"})
+        self.assertEqual(self.wrapper.get_assign("z").value_as_string(), "300")
+
+    def test_duplicate_scope_names(self):
+        code = dedent("""\
+        if fast:
+            class Config:
+                lr = 0.1
+        else:
+            class Config:
+                lr = 0.01
+                epochs = 10
+        """)
+        wrapper = CodeWrapper(code)
+        self.assertEqual([a.value_as_string() for a in wrapper.analyze_assigns("Config")], ["0.1", "0.01", "10"])
+        self.assertEqual(wrapper.get_assign("lr", "Config").value_as_string(), "0.1")
+        self.assertEqual(wrapper.get_assign("epochs", "Config").value_as_string(), "10")
+        mapping = {"lr": "1", "epochs": "2"}
+        self.assertEqual(wrapper.compile_template("Config").render(mapping), wrapper.render(mapping, "Config"))
+        for incremental in [False, True]:
+            with self.subTest(incremental=incremental):
+                wrapper = CodeWrapper(code, incremental=incremental)
+                remaining = wrapper.substitute_assign_values_by_scope({"Config": {"lr": "1", "epochs": "2", "missing": "3"}})
+                self.assertEqual(remaining, {"Config": {"missing": "3"}})
+                self.assertEqual(wrapper.code, code.replace("0.1", "1").replace("0.01", "1").replace("10", "2"))
+
+    def test_scopes_released_with_wrapper(self):
+        wrapper = CodeWrapper(self.sample_code)
+        wrapper.substitute_assign_values({"a": "1"}, "MyClass")
+        self.assertEqual(wrapper.analyze_assigns("MyClass")[0].scope_as_string(), "MyClass")
+        scope = weakref.ref(wrapper._get_scopes()["MyClass"][0])
+        del wrapper
+        gc.collect()
+        self.assertIsNone(scope())
+
     def test_substitute_assign_values_global(self):
         self.wrapper.substitute_assign_values_global({"x": "100", "y": "200"})
         code = self.wrapper.code
@@ -71,6 +133,154 @@ class TestCodeWrapper(unittest.TestCase):
         code = self.wrapper.code
         self.assertIn("b = 500", code)
 
+    def test_substitute_assign_values_by_scope(self):
+        remaining = self.wrapper.substitute_assign_values_by_scope({
+            "": {"x": "100", "foo": "1"},
+            "MyClass": {"a": "400"},
+            "MyClass.method": {"b": "500"},
+        })
+        self.assertEqual(remaining, {"": {"foo": "1"}, "MyClass": {}, "MyClass.method": {}})
+        code = self.wrapper.code
+        for substituted in ["x = 100  # comment", "a = 400", "b = 500"]:
+            self.assertIn(substituted, code)
+
+    def test_substitute_assign_values_by_unknown_scope(self):
+        with self.assertRaises(KeyError):
+            self.wrapper.substitute_assign_values_by_scope({"": {"x": "100"}, "Missing": {"a": "1"}})
+        self.assertEqual(self.wrapper.code, self.sample_code)
+
+    def test_render(self):
+        code, remaining = self.wrapper.render({"x": "100", "foo": "1"})
+        self.assertIn("x = 100  # comment", code)
+        self.assertEqual(remaining, {"foo": "1"})
+        # the wrapped code is left untouched
+        self.assertEqual(self.wrapper.code, self.sample_code)
+
+    def test_render_edits(self):
+        edits, remaining = self.wrapper.render_edits({"a": "400", "foo": "1"}, "MyClass")
+        self.assertEqual(remaining, {"foo": "1"})
+        self.assertEqual([(self.sample_code[start:end], replacement) for start, end, replacement in edits], [("40", "400")])
+
+    def test_render_many(self):
+        mappings = [{"x": "1"}, {"x": "2", "y": "3"}, {}]
+        variants = list(self.wrapper.render_many(mappings))
+        self.assertEqual(len(variants), 3)
+        self.assertIn("x = 1  # comment", variants[0])
+        self.assertIn("x = 2  # comment", variants[1])
+        self.assertIn("y: int = 3 # another comment", variants[1])
+        self.assertEqual(variants[2], self.sample_code)
+
+    def test_render_many_matches_substitution(self):
+        mapping = {"a": "400"}
+        rendered = next(self.wrapper.render_many([mapping], "MyClass"))
+        self.wrapper.substitute_assign_values(mapping, "MyClass")
+        self.assertEqual(rendered, self.wrapper.code)
+
+
+class TestIncrementalCodeWrapper(unittest.TestCase):
+    def setUp(self):
+        self.sample_code = dedent("""\
+        x = (10)  # comment
+        y: int = 20 # another comment
+        class MyClass:
+            x = 40
+            def method(self):
+                y = 50
+        z = x
+        """)
+        self.wrapper = CodeWrapper(self.sample_code, incremental=True)
+        self.reference = CodeWrapper(self.sample_code)
+
+    def assertSubstitutesLikeReference(self, mapping: dict[str, str], scope_name: str = None):
+        self.assertEqual(
+            self.wrapper.substitute_assign_values(mapping, scope_name),
+            self.reference.substitute_assign_values(mapping, scope_name),
+        )
+        self.assertEqual(self.wrapper.code, self.reference.code)
+
+    def test_chained_substitutions(self):
+        metadata_wrapper = self.wrapper.wrapper
+        self.assertSubstitutesLikeReference({"x": "[1,\n 2]", "foo": "1"}, "")
+        self.assertSubstitutesLikeReference({"y": "'é'"}, "MyClass.method")
+        self.assertSubstitutesLikeReference({"x": "3", "y": "(4)"})
+        # continuation lines are indented like the statement of the value
+        self.assertSubstitutesLikeReference({"x": "[1,\n 2]"}, "MyClass")
+        self.assertSubstitutesLikeReference({"y": "f(  # comment\n  a)"}, "MyClass.method")
+        self.assertIn("    x = [1,\n     2]\n", self.wrapper.code)
+        template = self.wrapper.compile_template("MyClass")
+        self.assertEqual(template.render({"x": "[3,\n 4]"}), self.reference.render({"x": "[3,\n 4]"}, "MyClass"))
+        # the module and its metadata are kept
+        self.assertIs(self.wrapper.wrapper, metadata_wrapper)
+
+    def test_substitute_assign_values_by_scope(self):
+        metadata_wrapper = self.wrapper.wrapper
+        for mappings in [
+            {"": {"x": "1", "foo": "2"}, "MyClass": {"x": "3"}, "MyClass.method": {"y": "4"}},
+            {None: {"x": "5", "y": "6"}, "MyClass": {"x": "7"}},
+        ]:
+            self.assertEqual(
+                self.wrapper.substitute_assign_values_by_scope(mappings),
+                self.reference.substitute_assign_values_by_scope(mappings),
+            )
+            self.assertEqual(self.wrapper.code, self.reference.code)
+        self.assertIs(self.wrapper.wrapper, metadata_wrapper)
+        self.assertIn("    x = 7\n", self.wrapper.code)
+        mappings = {"": {"x": "lambda: 0"}, "MyClass": {"x": "8"}}
+        self.assertEqual(
+            self.wrapper.substitute_assign_values_by_scope(mappings),
+            self.reference.substitute_assign_values_by_scope(mappings),
+        )
+        self.assertEqual(self.wrapper.code, self.reference.code)
+
+    def test_bare_annotation_gains_a_value(self):
+        for incremental in [False, True]:
+            with self.subTest(incremental=incremental):
+                wrapper = CodeWrapper("x: int\ny = 1\n", incremental=incremental)
+                self.assertEqual(wrapper.substitute_assign_values_global({"x": "9", "y": "2"}), {})
+                self.assertEqual(wrapper.code, "x: int = 9\ny = 2\n")
+
+    def test_names_mapped_in_their_own_scope_are_left_to_it(self):
+        mappings = {None: {"x": "5", "y": "6"}, "C": {"x": "7"}}
+        for incremental in [False, True]:
+            with self.subTest(incremental=incremental):
+                wrapper = CodeWrapper("class C:\n    x = 1\ny = 2\n", incremental=incremental)
+                self.assertEqual(wrapper.substitute_assign_values_by_scope(mappings), {None: {"x": "5"}, "C": {}})
+                self.assertEqual(wrapper.code, "class C:\n    x = 7\ny = 6\n")
+
+    def test_analyze_assigns_after_substitution(self):
+        self.wrapper.substitute_assign_values({"x": "100"}, "")
+        assigns = self.wrapper.analyze_assigns("")
+        self.assertEqual(assigns[0].value_as_string(), "100")
+        self.assertEqual(str(assigns[0]), "x = 100  # comment")
+        self.assertEqual(assigns[1].value_as_string(), "20")
+
+    def test_scope_changing_value(self):
+        metadata_wrapper = self.wrapper.wrapper
+        self.assertSubstitutesLikeReference({"y": "1"})
+        self.assertSubstitutesLikeReference({"x": "(z := 1)"}, "")
+        self.assertIsNot(self.wrapper.wrapper, metadata_wrapper)
+        self.assertEqual(
+            [str(a) for a in self.wrapper.analyze_assigns(None)],
+            [str(a) for a in self.reference.analyze_assigns(None)],
+        )
+        self.assertSubstitutesLikeReference({"x": "[i for i in range(3)]", "y": "lambda: 0"}, "")
+
+    def test_render_after_substitution(self):
+        self.assertSubstitutesLikeReference({"x": "1000"}, "")
+        mapping = {"y": "2", "foo": "3"}
+        self.assertEqual(self.wrapper.render(mapping), self.reference.render(mapping))
+        self.assertEqual(
+            list(self.wrapper.render_many([{"x": "1"}, {"y": "2"}], "MyClass")),
+            list(self.reference.render_many([{"x": "1"}, {"y": "2"}], "MyClass")),
+        )
+
+    def test_value_spans_after_substitution(self):
+        self.wrapper.substitute_assign_values({"x": "1000", "y": "2"}, "")
+        code = self.wrapper.code
+        assigns = self.wrapper.analyze_assigns(None)
+        values = [code[start:end] for start, end in self.wrapper.value_spans(assigns)]
+        self.assertEqual(values, ["1000", "2", "40", "50", "x"])
+
 
 class TestAssignementWrapper(unittest.TestCase):
     def setUp(self):